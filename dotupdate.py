@@ -9,13 +9,29 @@ copying only contents into existing directories to avoid overwrites.
 
 import os
 import sys
+import json
+import re
+import errno
 import time
 import shutil
-import filecmp
+import array
+import struct
+import stat as stat_module
+import hashlib
+import functools
 import argparse
+import posixpath
+import itertools
+import threading
 import subprocess
 from pathlib import Path
-from typing import List, Set, Optional, Dict, Any
+from contextlib import contextmanager
+from typing import (List, Set, Optional, Dict, Any, Callable, Iterable, Iterator, NamedTuple,
+                    TYPE_CHECKING)
+
+if TYPE_CHECKING:
+    # Imported lazily at runtime; named here for annotations only
+    from concurrent.futures import Future, ThreadPoolExecutor
 
 
 class Colors:
@@ -30,9 +46,28 @@ class Colors:
     BOLD = '\033[1m'
 
 
+_output = threading.local()
+
+
 def log(message: str, color: str = Colors.RESET):
-    """Print colored log message"""
-    print(f"{color}{message}{Colors.RESET}")
+    """Print colored log message (or buffer it, inside captured_output)"""
+    line = f"{color}{message}{Colors.RESET}"
+    buffer = getattr(_output, 'buffer', None)
+    if buffer is not None:
+        buffer.append(line)
+    else:
+        print(line)
+
+
+@contextmanager
+def captured_output() -> Iterator[List[str]]:
+    """Collect log lines from the current thread instead of printing them"""
+    previous = getattr(_output, 'buffer', None)
+    _output.buffer = []
+    try:
+        yield _output.buffer
+    finally:
+        _output.buffer = previous
 
 
 def log_error(message: str):
@@ -55,12 +90,392 @@ def log_warning(message: str):
     log(f"⚠ {message}", Colors.YELLOW)
 
 
+def format_bytes(size: int) -> str:
+    """Human-readable byte count"""
+    for unit in ('B', 'KiB', 'MiB'):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+class Profiler:
+    """
+    Records timed spans (phases and per-item work) with I/O counters:
+    bytes read and written by dotupdate itself, stat and directory-listing
+    calls, and subprocesses spawned. Disabled by default, when every hook is a
+    cheap no-op. Span counters are deltas of process-wide totals, so spans that
+    run concurrently (jobs > 1) can share attribution.
+    """
+
+    COUNTERS = ('read', 'written', 'stat', 'listdir', 'spawned')
+
+    def __init__(self):
+        self.enabled = False
+        self.spans: List[Dict[str, Any]] = []
+        self.totals = dict.fromkeys(self.COUNTERS, 0)
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._originals: Dict[str, Any] = {}
+
+    def enable(self):
+        """Start recording and hook the os/subprocess entry points being counted"""
+        if self.enabled:
+            return
+        self.enabled = True
+        self._origin = time.perf_counter()
+        for name, field in (('stat', 'stat'), ('lstat', 'stat'),
+                            ('listdir', 'listdir'), ('scandir', 'listdir')):
+            self._wrap(os, name, field)
+        self._wrap(subprocess.Popen, '__init__', 'spawned')
+
+    def disable(self):
+        """Stop recording and restore the hooked functions"""
+        for (owner, name), original in self._originals.items():
+            setattr(owner, name, original)
+        self._originals.clear()
+        self.enabled = False
+
+    def _wrap(self, owner, name: str, field: str):
+        original = getattr(owner, name)
+        self._originals[(owner, name)] = original
+
+        def counted(*args, **kwargs):
+            self.add(field)
+            return original(*args, **kwargs)
+        setattr(owner, name, counted)
+
+    def add(self, field: str, amount: int = 1):
+        """Bump a counter (no-op while disabled)"""
+        if self.enabled:
+            with self._lock:
+                self.totals[field] += amount
+
+    @contextmanager
+    def span(self, name: str, category: str = 'phase'):
+        """Time the enclosed block and record counter deltas for it"""
+        if not self.enabled:
+            yield
+            return
+        with self._lock:
+            before = dict(self.totals)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self.spans.append({
+                    'name': name,
+                    'cat': category,
+                    'thread': threading.current_thread().name,
+                    'tid': threading.get_ident(),
+                    'start': start - self._origin,
+                    'duration': end - start,
+                    'counters': {key: self.totals[key] - before[key] for key in self.COUNTERS},
+                })
+
+    def traced(self, category: str):
+        """Decorator for DotfileSync methods: one span per call, named after the item"""
+        def decorate(method):
+            @functools.wraps(method)
+            def wrapper(obj, item_path, *args, **kwargs):
+                if not self.enabled:
+                    return method(obj, item_path, *args, **kwargs)
+                with self.span(item_path, category):
+                    return method(obj, item_path, *args, **kwargs)
+            return wrapper
+        return decorate
+
+    def print_summary(self, top_items: int = 10):
+        """Print phase spans in order, then the slowest items"""
+        phases = [s for s in self.spans if s['cat'] == 'phase']
+        items = sorted((s for s in self.spans if s['cat'] != 'phase'),
+                       key=lambda s: s['duration'], reverse=True)[:top_items]
+
+        log(f"\n{'='*50}", Colors.HEADER)
+        log("PROFILE", Colors.HEADER + Colors.BOLD)
+        log(f"{'='*50}\n", Colors.HEADER)
+        header = (f"{'span':34s} {'ms':>9s} {'read':>10s} {'written':>10s} "
+                  f"{'stats':>8s} {'listdirs':>8s} {'procs':>6s}")
+        for title, spans in (('Phases', sorted(phases, key=lambda s: s['start'])),
+                             (f'Slowest items (top {top_items})', items)):
+            if not spans:
+                continue
+            log(title, Colors.BOLD)
+            log(header, Colors.BOLD)
+            for span in spans:
+                c = span['counters']
+                label = span['name'] if span['cat'] == 'phase' else f"{span['cat']}: {span['name']}"
+                log(f"{label[:34]:34s} {span['duration'] * 1000:9.1f} "
+                    f"{format_bytes(c['read']):>10s} {format_bytes(c['written']):>10s} "
+                    f"{c['stat']:8d} {c['listdir']:8d} {c['spawned']:6d}")
+            log("")
+        t = self.totals
+        log(f"Total: {format_bytes(t['read'])} read, {format_bytes(t['written'])} written, "
+            f"{t['stat']} stat(s), {t['listdir']} listing(s), {t['spawned']} process(es)")
+
+    def write_trace(self, path: Path, fmt: str = 'chrome'):
+        """
+        Write recorded spans to a file: 'chrome' is the Trace Event format
+        (chrome://tracing, Perfetto), 'json' a plain list of spans plus totals.
+        """
+        if fmt == 'json':
+            data = {'spans': self.spans, 'totals': self.totals}
+        else:
+            events = [{
+                'name': span['name'],
+                'cat': span['cat'],
+                'ph': 'X',
+                'ts': round(span['start'] * 1e6, 1),
+                'dur': round(span['duration'] * 1e6, 1),
+                'pid': os.getpid(),
+                'tid': span['tid'],
+                'args': span['counters'],
+            } for span in self.spans]
+            threads = {span['tid']: span['thread'] for span in self.spans}
+            events += [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid,
+                        'args': {'name': name}} for tid, name in threads.items()]
+            data = {'traceEvents': events, 'displayTimeUnit': 'ms'}
+        path.write_text(json.dumps(data, indent=1))
+
+
+PROFILER = Profiler()
+
+
+# Temp files are created next to their destination so os.replace stays on one
+# filesystem; the prefix keeps leftovers from a killed run out of discovery.
+TEMP_PREFIX = '.dotupdate-tmp-'
+_temp_counter = itertools.count()
+
+
+def temp_path_for(dest: Path) -> Path:
+    """A unique temp path in dest's directory"""
+    return dest.with_name(f'{TEMP_PREFIX}{os.getpid()}-{next(_temp_counter)}-{dest.name[:64]}')
+
+
+@contextmanager
+def atomic_target(dest: Path) -> Iterator[Path]:
+    """
+    Yield a temp path to write instead of dest. When the block finishes it is
+    renamed over dest in one step, so readers (and a killed run) only ever see
+    the old or the new content; on error the temp file is removed.
+    """
+    tmp = temp_path_for(dest)
+    try:
+        yield tmp
+        os.replace(tmp, dest)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def atomic_write_bytes(path: Path, data: bytes):
+    """Replace path's content atomically"""
+    with atomic_target(path) as tmp:
+        tmp.write_bytes(data)
+
+
+class FsyncBatch:
+    """
+    Files written since the last flush, made durable together: every file is
+    fsync'ed, then every directory holding one is fsync'ed once, so a
+    directory of N copies costs one directory sync rather than N.
+    Disabled batches ignore everything (writes are still atomic, just not
+    forced to disk).
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.files: List[Path] = []
+        self._lock = threading.Lock()
+
+    def add(self, path: Path):
+        if self.enabled:
+            with self._lock:
+                self.files.append(path)
+
+    @staticmethod
+    def _fsync(path) -> None:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def flush(self):
+        """fsync the pending files, then their directories"""
+        with self._lock:
+            files, self.files = self.files, []
+        directories = set()
+        try:
+            for path in files:
+                # A symlink has no data of its own; its directory entry covers it
+                if not path.is_symlink():
+                    self._fsync(path)
+                directories.add(path.parent)
+            for directory in directories:
+                self._fsync(directory)
+        except OSError as e:
+            log_warning(f"Could not flush synced files to disk: {e}")
+
+
+class IgnoreRule(NamedTuple):
+    """One compiled ignore pattern"""
+    pattern: str                   # without the '!' and trailing '/'
+    negate: bool                   # '!pattern' re-includes
+    anchored: bool                 # matched from the repo root, not at any depth
+    dir_only: bool                 # 'pattern/' only matches directories
+    regex: Optional['re.Pattern']  # None for literal patterns (no glob characters)
+
+
+def glob_to_regex(pattern: str) -> str:
+    """
+    Translate a gitignore-style glob to a regex body: '*' and '?' stay within
+    one path component, '**' spans components, '[...]' is a character class.
+    """
+    out = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith('**/', i):
+            out.append('(?:.*/)?')
+            i += 3
+            continue
+        if pattern.startswith('**', i):
+            out.append('.*')
+            i += 2
+            continue
+        if c == '*':
+            out.append('[^/]*')
+        elif c == '?':
+            out.append('[^/]')
+        elif c == '[' and pattern.find(']', i + 2) != -1:
+            # A ']' right after '[' (or '[!') is part of the class
+            end = pattern.find(']', i + 3 if pattern[i + 1:i + 2] == '!' else i + 2)
+            if end == -1:
+                out.append(re.escape(c))
+                i += 1
+                continue
+            body = pattern[i + 1:end]
+            if body.startswith('!'):
+                body = '^' + body[1:]
+            out.append('[' + body.replace('\\', '\\\\') + ']')
+            i = end
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return ''.join(out)
+
+
+class IgnoreRules:
+    """
+    Compiled gitignore-style ignore rules. Path rules (ignore_items) are
+    anchored at the repo root; name rules (ignore_names) match at any depth.
+    Both accept globs ('*', '?', '[...]', '**'), a trailing '/' for
+    directories only and a leading '!' to re-include; the last matching rule
+    wins. Literal rules are plain set lookups, and without negations all
+    glob rules are folded into a single regex. Callers test each entry before
+    descending, so an ignored directory is never walked.
+    """
+
+    def __init__(self, items: Iterable[str] = (), names: Iterable[str] = ()):
+        self.items = self._ordered(items)
+        self.names = self._ordered(names)
+        self.rules = ([self._compile(p, anchored=True) for p in self.items]
+                      + [self._compile(p, anchored=False) for p in self.names])
+        self.has_negation = any(rule.negate for rule in self.rules)
+
+        # Fast path (no negations): literal lookups plus one combined regex per kind
+        self._paths: Dict[bool, Set[str]] = {False: set(), True: set()}
+        self._names: Dict[bool, Set[str]] = {False: set(), True: set()}
+        globs: Dict[bool, List[str]] = {False: [], True: []}
+        for rule in self.rules:
+            if rule.regex is not None:
+                globs[rule.dir_only].append(rule.regex.pattern)
+            elif rule.anchored:
+                self._paths[rule.dir_only].add(rule.pattern)
+            else:
+                self._names[rule.dir_only].add(rule.pattern)
+        self._globs = {dir_only: re.compile('|'.join(f'(?:{p})' for p in patterns))
+                       if patterns else None for dir_only, patterns in globs.items()}
+
+    @staticmethod
+    def _ordered(patterns: Iterable[str]) -> List[str]:
+        """Keep list order (it matters for negation); sets have none, so sort them"""
+        if isinstance(patterns, (set, frozenset)):
+            patterns = sorted(patterns)
+        return list(dict.fromkeys(p.strip() for p in patterns if p and p.strip()))
+
+    @staticmethod
+    def _compile(raw: str, anchored: bool) -> IgnoreRule:
+        negate = raw.startswith('!')
+        pattern = raw[1:] if negate else raw
+        dir_only = pattern.endswith('/')
+        pattern = pattern.strip('/') if anchored else pattern.rstrip('/')
+        if not anchored and pattern.startswith('/'):
+            # A leading slash anchors a name rule, as in .gitignore
+            anchored, pattern = True, pattern.lstrip('/')
+        if not anchored and '/' not in pattern and not re.search(r'[*?\[]', pattern):
+            return IgnoreRule(pattern, negate, False, dir_only, None)
+        if anchored and not re.search(r'[*?\[]', pattern):
+            return IgnoreRule(pattern, negate, True, dir_only, None)
+        prefix = '' if anchored else '(?:.*/)?'
+        regex = re.compile(f'{prefix}{glob_to_regex(pattern)}\\Z')
+        return IgnoreRule(pattern, negate, anchored, dir_only, regex)
+
+    @staticmethod
+    def _rule_matches(rule: IgnoreRule, rel_path: str, name: str) -> bool:
+        if rule.regex is not None:
+            return rule.regex.match(rel_path) is not None
+        return (rel_path if rule.anchored else name) == rule.pattern
+
+    def match(self, rel_path: str, is_dir: bool = False) -> bool:
+        """True if rel_path (relative to the repo root) is ignored"""
+        name = rel_path.rpartition('/')[2]
+        if self.has_negation:
+            for rule in reversed(self.rules):
+                if (not rule.dir_only or is_dir) and self._rule_matches(rule, rel_path, name):
+                    return not rule.negate
+            return False
+        for dir_only in ((False, True) if is_dir else (False,)):
+            if rel_path in self._paths[dir_only] or name in self._names[dir_only]:
+                return True
+            glob = self._globs[dir_only]
+            if glob is not None and glob.match(rel_path):
+                return True
+        return False
+
+    def fingerprint(self) -> str:
+        """Stable fingerprint of the rules, for caches built under them"""
+        payload = json.dumps([self.items, self.names])
+        return hashlib.blake2b(payload.encode(), digest_size=8).hexdigest()
+
+    def gitignore_lines(self) -> List[str]:
+        """The rules written as .gitignore patterns with the same meaning"""
+        lines = []
+        for rule in self.rules:
+            pattern = rule.pattern
+            if rule.anchored:
+                pattern = '/' + pattern
+            elif '/' in pattern and not pattern.startswith('**/'):
+                pattern = '**/' + pattern
+            if rule.dir_only:
+                pattern += '/'
+            lines.append(('!' if rule.negate else '') + pattern)
+        return lines
+
+
 _GITIGNORE_SECTION = '# dotupdate managed'
 
 
-def sync_gitignore(repo_dir: Path, ignore_items: Set[str]):
+def sync_gitignore(repo_dir: Path, rules: IgnoreRules):
     """
-    Ensure all ignore_items appear in the managed section of .gitignore.
+    Ensure all ignore rules appear in the managed section of .gitignore,
+    written so git reads them the same way dotupdate does.
     Rebuilds the section on every run so removals from config are reflected.
     Everything above the section marker is user-owned and never modified.
     """
@@ -73,15 +488,15 @@ def sync_gitignore(repo_dir: Path, ignore_items: Set[str]):
         user_part = content.rstrip()
 
     user_patterns = {
-        line.strip().rstrip('/')
+        line.strip().strip('/')
         for line in user_part.splitlines()
         if line.strip() and not line.startswith('#')
     }
 
-    managed = sorted(
-        item.rstrip('/') for item in ignore_items
-        if item.rstrip('/') not in user_patterns
-    )
+    managed = [
+        line for line in rules.gitignore_lines()
+        if line.strip('/') not in user_patterns
+    ]
 
     new_content = (
         user_part + '\n\n' + _GITIGNORE_SECTION + '\n' + '\n'.join(managed) + '\n'
@@ -90,51 +505,361 @@ def sync_gitignore(repo_dir: Path, ignore_items: Set[str]):
     if new_content == content:
         return
 
-    gitignore_path.write_text(new_content)
+    with atomic_target(gitignore_path) as tmp:
+        tmp.write_text(new_content)
+        if gitignore_path.exists():
+            shutil.copymode(gitignore_path, tmp)
+    PROFILER.add('written', len(new_content.encode()))
     log_success(f".gitignore managed section updated ({len(managed)} entries)")
 
 
-def load_yaml_config(config_path: Path) -> Dict[str, Any]:
+class ConfigError(Exception):
+    """A config file that cannot be parsed or fails validation"""
+
+    def __init__(self, path: Path, line: int, message: str):
+        super().__init__(f"{path}:{line}: {message}" if line else f"{path}: {message}")
+        self.path = path
+        self.line = line
+
+
+def _parse_scalar(text: str, path: Path, line: int) -> Any:
+    """A YAML scalar: quoted string, int, bool, null or bare string"""
+    if text[:1] in ('"', "'"):
+        if len(text) < 2 or text[-1] != text[0]:
+            raise ConfigError(path, line, f"unterminated string {text}")
+        return text[1:-1]
+    if text.startswith('['):
+        if not text.endswith(']'):
+            raise ConfigError(path, line, f"unterminated list {text}")
+        inner = text[1:-1].strip()
+        return [_parse_scalar(part.strip(), path, line) for part in inner.split(',')] if inner else []
+    lowered = text.lower()
+    if lowered in ('true', 'yes', 'on'):
+        return True
+    if lowered in ('false', 'no', 'off'):
+        return False
+    if lowered in ('null', '~', ''):
+        return None
+    try:
+        return int(text)
+    except ValueError:
+        return text
+
+
+def _strip_comment(text: str) -> str:
+    """Drop a trailing '# comment' that is not inside quotes"""
+    quote = None
+    for i, c in enumerate(text):
+        if quote:
+            if c == quote:
+                quote = None
+        elif c in ('"', "'"):
+            quote = c
+        elif c == '#' and (i == 0 or text[i - 1].isspace()):
+            return text[:i].rstrip()
+    return text.rstrip()
+
+
+def parse_yaml(text: str, path: Path) -> tuple:
     """
-    Load YAML config file without external dependencies.
-    Simple parser for basic YAML lists.
+    Parse the YAML subset dotupdate configs use: nested block mappings,
+    block lists of scalars, [flow, lists], quoted strings, ints, bools and
+    comments. Returns (data, lines), where lines maps each key path (a tuple)
+    to its line number for error reporting.
     """
-    config = {'ignore_items': [], 'ignore_names': []}
-
-    if not config_path.exists():
+    rows = []
+    for number, raw in enumerate(text.splitlines(), 1):
+        if '\t' in raw[:len(raw) - len(raw.lstrip())]:
+            raise ConfigError(path, number, "tabs are not allowed for indentation")
+        content = _strip_comment(raw)
+        if content.strip():
+            rows.append((number, len(content) - len(content.lstrip()), content.strip()))
+
+    lines: Dict[tuple, int] = {}
+    position = 0
+
+    def block(indent: int, key_path: tuple) -> Any:
+        if rows[position][2].startswith('-'):
+            return sequence(indent, key_path)
+        return mapping(indent, key_path)
+
+    def sequence(indent: int, key_path: tuple) -> list:
+        nonlocal position
+        values = []
+        while position < len(rows) and rows[position][1] == indent and rows[position][2].startswith('-'):
+            number, _, content = rows[position]
+            item = content[1:].strip()
+            if not content.startswith('- ') and content != '-':
+                raise ConfigError(path, number, f"expected '- value', got {content}")
+            if ':' in item and not item[:1] in ('"', "'"):
+                raise ConfigError(path, number, "mappings inside lists are not supported")
+            lines[key_path + (len(values),)] = number
+            values.append(_parse_scalar(item, path, number))
+            position += 1
+        return values
+
+    def mapping(indent: int, key_path: tuple) -> dict:
+        nonlocal position
+        values = {}
+        while position < len(rows) and rows[position][1] == indent:
+            number, _, content = rows[position]
+            key, sep, rest = content.partition(':')
+            key = key.strip().strip('"').strip("'")
+            if not sep or not key or content.startswith('-'):
+                raise ConfigError(path, number, f"expected 'key: value', got {content}")
+            if rest and not rest[0].isspace():
+                raise ConfigError(path, number, f"expected a space after ':' in {content}")
+            if key in values:
+                raise ConfigError(path, number, f"duplicate key '{key}'")
+            lines[key_path + (key,)] = number
+            position += 1
+            rest = rest.strip()
+            if rest:
+                values[key] = _parse_scalar(rest, path, number)
+            elif position < len(rows) and (rows[position][1] > indent or (
+                    rows[position][1] == indent and rows[position][2].startswith('-'))):
+                values[key] = block(rows[position][1], key_path + (key,))
+            else:
+                values[key] = None
+        return values
+
+    if not rows:
+        return {}, lines
+    data = block(rows[0][1], ())
+    if position < len(rows):
+        number, _, content = rows[position]
+        raise ConfigError(path, number, f"unexpected indentation at {content}")
+    if not isinstance(data, dict):
+        raise ConfigError(path, rows[0][0], "the top level must be a mapping")
+    return data, lines
+
+
+class ItemOptions(NamedTuple):
+    """Per-item settings from the config's items: section"""
+    direction: str = 'auto'               # 'auto', 'to_repo' (home wins) or 'to_home' (repo wins)
+    copy_backend: Optional[str] = None    # None: the global backend
+    compare: str = 'content'              # 'content' (digests) or 'stat' (size + mtime only)
+    jobs: Optional[int] = None            # comparison workers for this item; None: global
+    deploy: str = 'copy'                  # 'copy', 'link' (home is a symlink) or 'farm' (per-file links)
+
+
+class Config:
+    """Validated dotupdate configuration, with includes merged in"""
+
+    VERSION = 2
+    DIRECTIONS = ('auto', 'to_repo', 'to_home')
+    COMPARE_MODES = ('content', 'stat')
+    DEPLOY_MODES = ('copy', 'link', 'farm')
+
+    def __init__(self):
+        self.ignore_items: List[str] = []
+        self.ignore_names: List[str] = []
+        self.jobs: Optional[int] = None
+        self.copy_backend: Optional[str] = None
+        self.items: Dict[str, ItemOptions] = {}
+        self.sources: List[str] = []
+        self._rules: Optional[IgnoreRules] = None
+
+    def options(self, item_path: str) -> ItemOptions:
+        return self.items.get(item_path, ItemOptions())
+
+    @property
+    def rules(self) -> IgnoreRules:
+        """The ignore lists compiled once, and kept with the config in load_config's memo"""
+        if self._rules is None:
+            self._rules = IgnoreRules(self.ignore_items, self.ignore_names)
+        return self._rules
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'ignore_items': self.ignore_items, 'ignore_names': self.ignore_names,
+            'jobs': self.jobs, 'copy_backend': self.copy_backend,
+            'items': {item: options._asdict() for item, options in self.items.items()},
+            'sources': self.sources,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Config':
+        config = cls()
+        config.ignore_items = data['ignore_items']
+        config.ignore_names = data['ignore_names']
+        config.jobs = data['jobs']
+        config.copy_backend = data['copy_backend']
+        config.items = {item: ItemOptions(**options) for item, options in data['items'].items()}
+        config.sources = data['sources']
         return config
 
-    try:
-        with open(config_path, 'r') as f:
-            in_list = False
-            current_key = None
+    def merge(self, data: Dict[str, Any], lines: Dict[tuple, int], path: Path):
+        """Validate one parsed file and layer it over what is already loaded"""
+        def fail(key_path: tuple, message: str):
+            raise ConfigError(path, lines.get(key_path, 0), message)
+
+        def string_list(key: str) -> List[str]:
+            value = data.get(key)
+            if value is None:
+                return []
+            if isinstance(value, str):
+                value = [value]
+            if not isinstance(value, list):
+                fail((key,), f"'{key}' must be a list")
+            for index, entry in enumerate(value):
+                if not isinstance(entry, str):
+                    fail((key, index), f"'{key}' entries must be strings, got {entry!r}")
+            return value
+
+        def choice(key_path: tuple, value: Any, allowed) -> str:
+            if value not in allowed:
+                fail(key_path, f"'{key_path[-1]}' must be one of {', '.join(allowed)}, got {value!r}")
+            return value
+
+        def positive(key_path: tuple, value: Any) -> int:
+            if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+                fail(key_path, f"'{key_path[-1]}' must be a positive integer, got {value!r}")
+            return value
+
+        known = ('ignore_items', 'ignore_names', 'include', 'jobs', 'copy_backend', 'items')
+        for key in data:
+            if key not in known:
+                fail((key,), f"unknown key '{key}' (expected one of {', '.join(known)})")
+
+        self.ignore_items += string_list('ignore_items')
+        self.ignore_names += string_list('ignore_names')
+        string_list('include')
+        if data.get('jobs') is not None:
+            self.jobs = positive(('jobs',), data['jobs'])
+        if data.get('copy_backend') is not None:
+            self.copy_backend = choice(('copy_backend',), data['copy_backend'], COPY_BACKEND_NAMES)
+
+        items = data.get('items') or {}
+        if not isinstance(items, dict):
+            fail(('items',), "'items' must be a mapping of item path to options")
+        for item, options in items.items():
+            options = options or {}
+            if not isinstance(options, dict):
+                fail(('items', item), f"options for '{item}' must be a mapping")
+            current = self.items.get(item.rstrip('/'), ItemOptions())._asdict()
+            for key, value in options.items():
+                key_path = ('items', item, key)
+                if key == 'direction':
+                    current[key] = choice(key_path, value, self.DIRECTIONS)
+                elif key == 'copy_backend':
+                    current[key] = choice(key_path, value, COPY_BACKEND_NAMES)
+                elif key == 'compare':
+                    current[key] = choice(key_path, value, self.COMPARE_MODES)
+                elif key == 'deploy':
+                    current[key] = choice(key_path, value, self.DEPLOY_MODES)
+                elif key == 'jobs':
+                    current[key] = positive(key_path, value)
+                else:
+                    fail(key_path, f"unknown item option '{key}' "
+                                   f"(expected one of {', '.join(ItemOptions._fields)})")
+            self.items[item.rstrip('/')] = ItemOptions(**current)
 
-            for line in f:
-                line = line.rstrip()
 
-                # Skip comments and empty lines
-                if not line or line.strip().startswith('#'):
-                    continue
+def _config_host() -> str:
+    """Short host name substituted for {host} in include paths"""
+    return os.uname().nodename.split('.')[0]
 
-                # Check for key (no leading spaces, ends with colon)
-                if line and not line[0].isspace() and ':' in line:
-                    key = line.split(':')[0].strip()
-                    current_key = key
-                    in_list = True
-                    continue
 
-                # Check for list item (starts with spaces and dash)
-                if in_list and line.strip().startswith('-'):
-                    item = line.strip()[1:].strip()
-                    # Remove quotes if present
-                    item = item.strip('"').strip("'")
-                    if current_key in ('ignore_items', 'ignore_names'):
-                        config[current_key].append(item)
+def _read_config(config_path: Path) -> tuple:
+    """
+    Parse and validate a config and its includes, depth-first.
+    Include paths are relative to the including file and may use {host};
+    an include that does not exist is skipped, so per-host overlays only
+    apply where they are present. Returns (Config, watched paths), where
+    watched lists every file read plus every missing overlay, so creating
+    one is noticed.
+    """
+    config = Config()
+    watched: List[str] = []
 
-        return config
-    except Exception as e:
+    def visit(path: Path):
+        watched.append(str(path))
+        if not path.exists() or str(path) in config.sources:
+            return
+        data, lines = parse_yaml(path.read_text(), path)
+        config.merge(data, lines, path)
+        config.sources.append(str(path))
+        includes = data.get('include') or []
+        for include in [includes] if isinstance(includes, str) else includes:
+            # Only {host} is substituted; any other braces are part of the file name
+            visit((path.parent / include.replace('{host}', _config_host())).resolve())
+
+    visit(config_path.resolve())
+    return config, watched
+
+
+def _config_stamp(watched: List[str]) -> List[Any]:
+    """The host plus (path, mtime_ns, size) of each watched file (None if missing)"""
+    stamp: List[Any] = [_config_host()]
+    for source in watched:
+        try:
+            st = os.stat(source)
+            stamp.append([source, st.st_mtime_ns, st.st_size])
+        except OSError:
+            stamp.append([source, None])
+    return stamp
+
+
+# Configs parsed in this process: resolved path -> (Config, watched, stamp)
+_config_memo: Dict[str, tuple] = {}
+
+
+def load_config(config_path: Path) -> Config:
+    """
+    Load and validate a dotupdate config (and its includes).
+    Parsed configs are cached in memory and, for configs at the root of a
+    git repo, in .git/dotupdate/config.json, keyed on each source file's
+    mtime and size, so repeated runs (every Makefile target) skip parsing
+    and validation. Raises ConfigError naming the offending file and line.
+    """
+    config_path = Path(config_path)
+    memo_key = str(config_path.resolve())
+    memo = _config_memo.get(memo_key)
+    if memo and _config_stamp(memo[1]) == memo[2]:
+        return memo[0]
+
+    cache_path = (state_dir(config_path.parent) / 'config.json'
+                  if (config_path.parent / '.git').exists() else None)
+    config = None
+    if cache_path is not None:
+        try:
+            cached = json.loads(cache_path.read_text())
+            if (cached.get('version') == Config.VERSION
+                    and _config_stamp(cached['watched']) == cached['stamp']):
+                config, watched, stamp = (Config.from_dict(cached['config']),
+                                          cached['watched'], cached['stamp'])
+        except (OSError, ValueError, KeyError, TypeError):
+            config = None
+
+    if config is None:
+        config, watched = _read_config(config_path)
+        stamp = _config_stamp(watched)
+        if cache_path is not None and config.sources:
+            try:
+                cache_path.parent.mkdir(parents=True, exist_ok=True)
+                atomic_write_bytes(cache_path, json.dumps({
+                    'version': Config.VERSION, 'watched': watched,
+                    'stamp': stamp, 'config': config.to_dict(),
+                }).encode())
+            except OSError:
+                pass
+
+    _config_memo[memo_key] = (config, watched, stamp)
+    return config
+
+
+def load_yaml_config(config_path: Path) -> Dict[str, Any]:
+    """
+    Load the ignore lists from a config file (compatibility wrapper around
+    load_config). Errors are reported and yield empty lists.
+    """
+    try:
+        config = load_config(config_path)
+    except (ConfigError, OSError) as e:
         log_warning(f"Could not load config file: {e}")
-        return config
+        return {'ignore_items': [], 'ignore_names': []}
+    return {'ignore_items': list(config.ignore_items), 'ignore_names': list(config.ignore_names)}
 
 
 def prompt_yes_no(question: str, default: bool = False) -> bool:
@@ -158,12 +883,56 @@ def prompt_yes_no(question: str, default: bool = False) -> bool:
             return default
 
 
+class PendingMessage:
+    """
+    A commit message being generated on a background thread: the digest it
+    is generated from, the future for its result, the deadline it runs to,
+    and the claude process once started, so that a generation nobody needs
+    any more can be killed.
+    """
+
+    def __init__(self, digest: str, deadline: float):
+        from concurrent.futures import Future
+        self.digest = digest
+        self.future = Future()
+        self.deadline = deadline
+        self.cancelled = threading.Event()
+        self._proc: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+
+    def attach(self, proc: subprocess.Popen) -> bool:
+        """Record the claude process; False if the generation was cancelled first"""
+        with self._lock:
+            if self.cancelled.is_set():
+                return False
+            self._proc = proc
+            return True
+
+    def cancel(self):
+        """Stop the generation, killing and reaping claude if it is running"""
+        with self._lock:
+            self.cancelled.set()
+            proc = self._proc
+        if proc is not None and proc.poll() is None:
+            proc.kill()
+            proc.wait()
+
+
 class GitSync:
     """Handles git repository synchronization"""
 
-    def __init__(self, repo_dir: Path):
+    MESSAGE_CACHE_SIZE = 50
+
+    def __init__(self, repo_dir: Path, message_budget: float = 60.0, defer_push: bool = False):
         self.repo_dir = repo_dir
         self.stashed = False
+        self.pulled = False
+        # With defer_push, pushes are only flagged here and left to the caller (see push)
+        self.defer_push = defer_push
+        self.push_pending = False
+        # Seconds a commit message may take, counted from when generation starts
+        self.message_budget = message_budget
+        self._pending_messages: Dict[str, PendingMessage] = {}
 
     def _run_git(self, args: List[str], check: bool = True, capture: bool = False) -> Optional[str]:
         """Execute git command"""
@@ -191,9 +960,31 @@ class GitSync:
         status = self._run_git(["status", "--porcelain"], capture=True)
         return bool(status)
 
-    def stash_changes(self) -> bool:
-        """Stash local changes if any exist"""
-        if not self.has_changes():
+    def branch_status(self) -> Dict[str, Any]:
+        """
+        Read branch, upstream, ahead/behind counts and worktree cleanliness
+        from a single 'git status --porcelain=v2 --branch' call.
+        """
+        output = self._run_git(["status", "--porcelain=v2", "--branch"], capture=True)
+        info = {'branch': None, 'upstream': None, 'ahead': None, 'behind': None, 'dirty': False}
+        for line in output.splitlines():
+            if line.startswith('# branch.head '):
+                info['branch'] = line.split(' ', 2)[2]
+            elif line.startswith('# branch.upstream '):
+                info['upstream'] = line.split(' ', 2)[2]
+            elif line.startswith('# branch.ab '):
+                ahead, behind = line.split()[2:4]
+                info['ahead'] = int(ahead.lstrip('+'))
+                info['behind'] = int(behind.lstrip('-'))
+            elif not line.startswith('#'):
+                info['dirty'] = True
+        return info
+
+    def stash_changes(self, dirty: Optional[bool] = None) -> bool:
+        """Stash local changes if any exist (pass dirty to skip the check)"""
+        if dirty is None:
+            dirty = self.has_changes()
+        if not dirty:
             log_info("Working directory is clean")
             return False
 
@@ -210,99 +1001,234 @@ class GitSync:
             return
 
         log_info("Reapplying stashed changes...")
+        self.stashed = False
         try:
             self._run_git(["stash", "pop", "--index"])
             log_success("Stashed changes reapplied")
         except subprocess.CalledProcessError:
             log_warning("Could not auto-reapply stash (conflicts?). Use 'git stash pop' manually.")
 
-    def sync(self) -> bool:
-        """Synchronize with remote repository"""
+    def fetch_age(self) -> Optional[float]:
+        """Seconds since the last fetch (FETCH_HEAD mtime), or None if never fetched"""
+        try:
+            return time.time() - (git_dir(self.repo_dir) / 'FETCH_HEAD').stat().st_mtime
+        except OSError:
+            return None
+
+    def fetch_is_fresh(self, window: float) -> bool:
+        """True if the last fetch happened less than window seconds ago"""
+        age = self.fetch_age()
+        return window > 0 and age is not None and age < window
+
+    def fetch(self, fetch_window: float = 0, quiet: bool = False) -> bool:
+        """
+        Fetch from the remote unless the last fetch is within fetch_window
+        seconds. quiet keeps git's progress off the terminal, for fetching
+        while other steps are printing. Returns True if a fetch ran.
+        """
+        if self.fetch_is_fresh(fetch_window):
+            return False
+        with PROFILER.span('git fetch'):
+            self._run_git(["fetch", "--quiet"] if quiet else ["fetch"], capture=quiet)
+        return True
+
+    def sync(self, fetch_window: float = 0, fetched: bool = False) -> bool:
+        """
+        Synchronize with remote repository.
+        An up-to-date run costs two git processes (fetch + status); local
+        changes are only stashed when a rebase pull is actually needed.
+        Skips the fetch if the last one is within fetch_window seconds, or if
+        the caller already ran fetch() (fetched=True).
+        """
         log(f"\n{'='*50}", Colors.HEADER)
         log("GIT SYNCHRONIZATION", Colors.HEADER + Colors.BOLD)
         log(f"{'='*50}\n", Colors.HEADER)
 
-        # Stash changes
-        self.stash_changes()
-
-        try:
-            # Fetch remote
+        # Fetch remote (unless the caller already did)
+        if fetched:
+            log_info("Using the fetch started with discovery")
+        elif self.fetch_is_fresh(fetch_window):
+            log_info(f"Skipping fetch (last fetch {self.fetch_age():.0f}s ago)")
+        else:
             log_info("Fetching from remote...")
-            self._run_git(["fetch"])
+            self.fetch()
 
-            # Get branch info
-            current_branch = self._run_git(["symbolic-ref", "--short", "HEAD"], capture=True)
+        status = self.branch_status()
+        current_branch = status['branch']
 
-            # Check if upstream is configured
-            try:
-                self._run_git(["rev-parse", "--verify", "@{u}"], capture=True)
-            except subprocess.CalledProcessError:
-                log_warning(f"No upstream configured for branch '{current_branch}'")
-                return False
+        if current_branch in (None, '(detached)'):
+            log_warning("HEAD is detached - skipping git sync")
+            return False
 
-            # Compare local and remote
-            local_rev = self._run_git(["rev-parse", "@"], capture=True)
-            remote_rev = self._run_git(["rev-parse", "@{u}"], capture=True)
-            base_rev = self._run_git(["merge-base", "@", "@{u}"], capture=True)
+        # Check if upstream is configured
+        if not status['upstream']:
+            log_warning(f"No upstream configured for branch '{current_branch}'")
+            return False
+        if status['ahead'] is None:
+            log_warning(f"Upstream '{status['upstream']}' of '{current_branch}' no longer exists")
+            return False
 
-            if local_rev == remote_rev:
-                log_success("Already up to date with remote")
-            elif local_rev == base_rev:
-                log_info("Remote has updates. Pulling with rebase...")
+        # Compare local and remote
+        ahead, behind = status['ahead'], status['behind']
+        if not ahead and not behind:
+            log_success("Already up to date with remote")
+        elif not ahead:
+            log_info("Remote has updates. Pulling with rebase...")
+            self.stash_changes(dirty=status['dirty'])
+            try:
                 self._run_git(["pull", "--rebase"])
+                self.pulled = True
                 log_success("Successfully pulled and rebased")
-            elif remote_rev == base_rev:
+            finally:
+                self.pop_stash()
+        elif not behind:
+            if self.defer_push:
+                log_info("Local is ahead of remote. Pushing in the background...")
+                self.push_pending = True
+            else:
                 log_info("Local is ahead of remote. Pushing...")
                 self._run_git(["push"])
                 log_success("Successfully pushed")
-            else:
-                log_warning("Branches have diverged - manual intervention required")
-                log_info("Run: git pull --rebase")
-                return False
-
-            return True
+        else:
+            log_warning("Branches have diverged - manual intervention required")
+            log_info("Run: git pull --rebase")
+            return False
 
-        finally:
-            self.pop_stash()
+        return True
 
-    def generate_commit_message(self) -> Optional[str]:
+    def staged_fingerprint(self) -> Optional[str]:
         """
-        Ask the local 'claude' CLI to write a commit message from the staged diff.
-        Returns None if claude is unavailable or produces no usable message.
-        Changes must already be staged.
+        Identity of the staged change set: a hash over each staged path and its
+        new blob id (deletions as '-'). None if nothing is staged.
         """
-        stat = self._run_git(["diff", "--cached", "--stat"], capture=True)
-        diff = self._run_git(["diff", "--cached"], capture=True)
-        if not diff:
+        raw = self._run_git(["diff", "--cached", "--raw", "-z", "--no-abbrev", "--no-renames"],
+                            capture=True)
+        if not raw:
             return None
+        changes = []
+        fields = raw.split('\0')
+        for header, path in zip(fields[0::2], fields[1::2]):
+            new_sha = header.split()[3]
+            changes.append((path, '-' if set(new_sha) == {'0'} else new_sha))
+        return change_fingerprint(changes)
+
+    def staged_digest(self) -> str:
+        """Bounded summary of the staged diff, read from git as a stream"""
+        with PROFILER.span('diff digest'):
+            proc = subprocess.Popen(["git", "diff", "--cached", "--no-color", "--no-ext-diff"],
+                                    cwd=self.repo_dir, stdout=subprocess.PIPE, text=True,
+                                    errors='replace')
+            with proc:
+                return summarize_diff(line.rstrip('\n') for line in proc.stdout)
+
+    def _load_messages(self) -> Dict[str, str]:
+        """Cached commit messages by change-set fingerprint"""
+        try:
+            return json.loads((state_dir(self.repo_dir) / 'messages.json').read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _save_message(self, fingerprint: str, message: str):
+        """Remember a generated message, keeping only the most recent MESSAGE_CACHE_SIZE"""
+        messages = self._load_messages()
+        messages.pop(fingerprint, None)
+        messages[fingerprint] = message
+        messages = dict(list(messages.items())[-self.MESSAGE_CACHE_SIZE:])
+        try:
+            path = state_dir(self.repo_dir) / 'messages.json'
+            path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write_bytes(path, json.dumps(messages, indent=1).encode())
+        except OSError as e:
+            log_warning(f"Could not save commit message cache: {e}")
+
+    def precompute_message(self, fingerprint: str, digest: str):
+        """
+        Start generating the message for a change set that is about to be
+        staged (see DotfileSync.pending_changes), so claude runs while the
+        files are being copied. commit_changes picks the result up if the
+        staged changes turn out to have the same fingerprint.
+        """
+        pending = self.plan_message(fingerprint, digest)
+        if pending is not None:
+            self._start_message(pending)
 
-        max_diff_chars = 12000
-        if len(diff) > max_diff_chars:
-            diff = diff[:max_diff_chars] + "\n... [diff truncated]"
+    def plan_message(self, fingerprint: str, digest: str) -> Optional[PendingMessage]:
+        """
+        Register the message for a change set without starting it, for callers
+        that run run_message themselves. None if there is nothing to generate.
+        """
+        if not digest or not shutil.which("claude") or fingerprint in self._load_messages():
+            return None
+        log_info("Generating commit message with claude in the background...")
+        pending = PendingMessage(digest, time.monotonic() + self.message_budget)
+        self._pending_messages[fingerprint] = pending
+        return pending
 
-        context = f"Changed files:\n{stat}\n\nDiff:\n{diff}"
+    def run_message(self, pending: PendingMessage):
+        """Generate a pending message, bounded by its deadline, and settle its future"""
+        try:
+            pending.future.set_result(
+                self.generate_commit_message(pending.digest, pending.deadline, pending))
+        except BaseException as e:
+            pending.future.set_exception(e)
+
+    def _start_message(self, pending: PendingMessage) -> PendingMessage:
+        """Run run_message on a background thread"""
+        threading.Thread(target=self.run_message, args=(pending,),
+                         name='dotupdate-message', daemon=True).start()
+        return pending
+
+    def discard_pending_messages(self):
+        """Kill background generations nobody is going to wait for"""
+        for pending in self._pending_messages.values():
+            pending.cancel()
+        self._pending_messages.clear()
+
+    def generate_commit_message(self, digest: str, deadline: Optional[float] = None,
+                                pending: Optional['PendingMessage'] = None) -> Optional[str]:
+        """
+        Ask the local 'claude' CLI to write a commit message from a diff digest
+        (see summarize_diff). Returns None if claude is unavailable, fails, is
+        cancelled through pending, or is still running at deadline
+        (time.monotonic()), in which case it is killed.
+        """
         prompt = (
             "Write a concise git commit message for the following staged dotfiles "
             "changes. Use imperative mood and a short summary line. Output only the "
             "commit message text: no explanation, no code fences, and no trailers "
             "or co-author lines."
         )
+        timeout = 120 if deadline is None else max(0.0, deadline - time.monotonic())
 
         try:
-            result = subprocess.run(
-                ["claude", "-p", prompt],
-                cwd=self.repo_dir,
-                input=context,
-                capture_output=True,
-                text=True,
-                check=True,
-                timeout=120,
-            )
+            with PROFILER.span('commit message (claude)'):
+                proc = subprocess.Popen(
+                    ["claude", "-p", prompt],
+                    cwd=self.repo_dir,
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    text=True,
+                )
+                if pending is not None and not pending.attach(proc):
+                    proc.kill()
+                    proc.communicate()
+                    return None
+                try:
+                    stdout, stderr = proc.communicate(digest, timeout=timeout)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+                    proc.communicate()
+                    raise
+                if pending is not None and pending.cancelled.is_set():
+                    return None
+                if proc.returncode:
+                    raise subprocess.CalledProcessError(proc.returncode, proc.args, stdout, stderr)
         except (subprocess.CalledProcessError, FileNotFoundError, subprocess.TimeoutExpired) as e:
             log_warning(f"Claude message generation failed: {e}")
             return None
 
-        message = result.stdout.strip()
+        message = stdout.strip()
         if message.startswith("```"):
             message = "\n".join(
                 line for line in message.splitlines()
@@ -310,23 +1236,64 @@ class GitSync:
             ).strip()
         return message or None
 
+    def commit_message(self) -> Optional[str]:
+        """
+        Message for the staged changes: from the cache, from a precomputed
+        generation with the same fingerprint, or generated now. Waits no
+        longer than the message budget; None means fall back.
+        """
+        fingerprint = self.staged_fingerprint()
+        pending = self._pending_messages.pop(fingerprint, None) if fingerprint else None
+        # Generations for change sets that did not get staged would only hold claude open
+        self.discard_pending_messages()
+        if fingerprint is None:
+            return None
+        cached = self._load_messages().get(fingerprint)
+        if cached:
+            if pending is not None:
+                pending.cancel()
+            log_info("Reusing the message generated for these changes")
+            return cached
+
+        if pending is None:
+            log_info("Generating commit message with claude...")
+            pending = self._start_message(PendingMessage(
+                self.staged_digest(), time.monotonic() + self.message_budget))
+        else:
+            log_info("Waiting for the background commit message...")
+
+        from concurrent.futures import TimeoutError as FutureTimeout
+        try:
+            with PROFILER.span('commit message (wait)'):
+                # The worker kills claude at the deadline; the margin covers that
+                message = pending.future.result(
+                    timeout=max(0.0, pending.deadline - time.monotonic()) + 1)
+        except FutureTimeout:
+            pending.cancel()
+            log_warning(f"No commit message within {self.message_budget:.0f}s")
+            return None
+        if message:
+            self._save_message(fingerprint, message)
+        return message
+
     def commit_changes(self):
         """
         Stage and commit changes.
 
         When the 'claude' CLI is on PATH it generates the commit message and the
         change is committed WITHOUT pushing (push stays manual). When claude is
-        unavailable, falls back to an automated timestamped commit and push.
+        unavailable, or has no message within the budget, falls back to an
+        automated timestamped commit and push.
         """
         if not self.has_changes():
+            self.discard_pending_messages()
             log_info("No changes to commit")
             return
 
         self._run_git(["add", "-A"])
 
         if shutil.which("claude"):
-            log_info("Generating commit message with claude...")
-            message = self.generate_commit_message()
+            message = self.commit_message()
             if message:
                 log_info(f"Committing: {message}")
                 self._run_git(["commit", "-m", message])
@@ -338,156 +1305,1361 @@ class GitSync:
         message = f"Automated commit at {timestamp}"
         log_info(f"Committing: {message}")
         self._run_git(["commit", "-m", message])
+        if self.defer_push:
+            self.push_pending = True
+            log_success("Changes committed, pushing in the background")
+            return
         self._run_git(["push"])
         log_success("Changes committed and pushed")
 
+    def push(self) -> tuple:
+        """
+        Push quietly, for running off the main thread while other work goes on.
+        Returns (success, log lines) so the caller can report it when convenient.
+        """
+        with captured_output() as lines:
+            try:
+                with PROFILER.span('git push (background)'):
+                    self._run_git(["push", "--quiet"], capture=True)
+                log_success("Pushed to remote")
+                ok = True
+            except subprocess.CalledProcessError:
+                log_warning("Push failed - run 'git push' manually")
+                ok = False
+        return ok, lines
+
+
+def change_fingerprint(changes: Iterable[tuple]) -> str:
+    """Order-independent hash of (path, new blob id or '-') pairs describing a change set"""
+    digest = hashlib.sha1()
+    for path, blob in sorted(changes):
+        digest.update(f'{path}\0{blob}\n'.encode('utf-8', 'surrogateescape'))
+    return digest.hexdigest()
+
+
+# Files whose diffs say little about intent (dependency locks, generated output):
+# they are listed with their line counts but their hunks never reach the prompt
+GENERATED_FILE_PATTERNS = ('*.lock', '*-lock.json', '*-lock.yaml', 'go.sum',
+                           '*.min.js', '*.min.css', '*.map', 'packer_compiled.lua')
+_GENERATED_FILE = re.compile('|'.join(glob_to_regex(p) for p in GENERATED_FILE_PATTERNS))
+
+
+class DiffFile:
+    """One file's part of a unified diff, as split out by split_diff"""
+
+    __slots__ = ('path', 'status', 'added', 'removed', 'hunks', 'notes', 'kept', 'dropped')
+
+    def __init__(self, path: str):
+        self.path = path
+        self.status = 'M'         # 'A', 'D', 'M' or 'B' (binary)
+        self.added = 0
+        self.removed = 0
+        self.hunks: List[List[str]] = []
+        self.notes: List[str] = []
+        self.kept = 0             # characters held in hunks
+        self.dropped = 0          # hunks past the per-file cap, counted but not held
+
+    @property
+    def generated(self) -> bool:
+        return bool(_GENERATED_FILE.fullmatch(self.path.rpartition('/')[2]))
+
+    @property
+    def significance(self) -> float:
+        """Ranking weight: changed lines, damped, with new and deleted files ahead"""
+        if self.generated:
+            return 0.0
+        weight = 1.0 + (self.added + self.removed) ** 0.5
+        if self.status in ('A', 'D'):
+            weight += 3.0
+        return weight
+
+    def summary(self) -> str:
+        """One overview line: status, path and line counts"""
+        if self.status == 'B':
+            return f'B {self.path} (binary)'
+        suffix = ', generated, hunks omitted' if self.generated else ''
+        return f'{self.status} {self.path} (+{self.added} -{self.removed}{suffix})'
+
+
+def split_diff(lines: Iterable[str], max_chars: int = 12000) -> Iterator[DiffFile]:
+    """
+    Split a unified diff stream at its 'diff --git' headers, one DiffFile per
+    file. Line counts cover the whole file, but at most max_chars of hunk text
+    is held per file, so memory stays bounded however large the diff is.
+    """
+    current = None
+    hunk = None
+    in_header = False
+    for line in lines:
+        if line.startswith('diff --git '):
+            if current is not None:
+                yield current
+            path = line[len('diff --git '):]
+            current = DiffFile(path.rpartition(' b/')[2] or path)
+            hunk = None
+            in_header = True
+            continue
+        if current is None:
+            continue
+        if line.startswith('@@'):
+            in_header = False
+            if current.generated or current.kept + len(line) > max_chars:
+                hunk = None
+                current.dropped += 1
+            else:
+                hunk = [line]
+                current.hunks.append(hunk)
+                current.kept += len(line)
+            continue
+        if in_header:
+            # Extended headers, file names and notes such as 'Binary files ... differ'
+            # ('Only in home/repo' are the notes DotfileSync._diff_entry writes)
+            if line == '--- /dev/null' or line.startswith(('new file mode', 'Only in home:')):
+                current.status = 'A'
+            elif line == '+++ /dev/null' or line.startswith(('deleted file mode', 'Only in repo:')):
+                current.status = 'D'
+            elif line.startswith('Binary files') or line == 'GIT binary patch':
+                current.status = 'B'
+            if not line.startswith(('--- ', '+++ ', 'index ', 'new file mode', 'deleted file mode',
+                                    'old mode', 'new mode', 'similarity', 'rename ')):
+                current.notes.append(line)
+            continue
+        if line.startswith('+'):
+            current.added += 1
+        elif line.startswith('-'):
+            current.removed += 1
+        if hunk is not None:
+            if current.kept + len(line) > max_chars:
+                hunk = None
+            else:
+                hunk.append(line)
+                current.kept += len(line)
+    if current is not None:
+        yield current
 
-class DotfileSync:
-    """Handles dotfile synchronization between home and repo"""
-
-    def __init__(self, home_dir: Path, repo_dir: Path,
-                 ignore_items: Set[str] = None, ignore_names: Set[str] = None):
-        self.home_dir = home_dir
-        self.repo_dir = repo_dir
-        self.repo_modified = False
-        self.ignore_items = {item.rstrip('/') for item in (ignore_items or set())}
-        self.ignore_names = set(ignore_names or set())
-
-    @staticmethod
-    def get_mtime(path: Path) -> float:
-        """Get modification time of file or directory"""
-        return path.stat().st_mtime
 
-    def contents_match(self, path1: Path, path2: Path) -> bool:
-        """Check if two paths have identical content (files or directories)"""
-        if path1.is_file() and path2.is_file():
-            return filecmp.cmp(path1, path2, shallow=False)
-        if path1.is_dir() and path2.is_dir():
-            return self._dirs_match(path1, path2)
-        return False
+def _fit_lines(lines: List[str], limit: int, more: Callable[[int], str]) -> List[str]:
+    """
+    Leading lines that fit in limit characters (newlines counted), plus
+    more(count of the rest) when not all of them do
+    """
+    if sum(len(line) + 1 for line in lines) <= limit:
+        return lines
+    kept: List[str] = []
+    size = 0
+    for index, line in enumerate(lines):
+        if size + len(line) + 1 + len(more(len(lines) - index)) + 1 > limit:
+            return kept + [more(len(lines) - index)]
+        kept.append(line)
+        size += len(line) + 1
+    return kept
+
+
+def summarize_diff(lines: Iterable[str], budget: int = 12000, min_share: int = 600) -> str:
+    """
+    Bounded digest of a diff for the commit message prompt: an overview of
+    every file with its line counts (grouped by directory when the list alone
+    would take over half the budget), then hunks of the most significant
+    files, each given a fair share of what is left but no less than
+    min_share characters. Lockfiles and generated files contribute counts
+    only. Every line written, headers and notes included, is counted, so the
+    digest never exceeds budget characters however large the diff is.
+    """
+    files = sorted(split_diff(lines, budget), key=lambda f: f.path)
+    if not files:
+        return ''
+    header = (f'{len(files)} file(s) changed, +{sum(f.added for f in files)} '
+              f'-{sum(f.removed for f in files)}')
+    listing = [f'  {f.summary()}' for f in files]
+    if sum(len(line) + 1 for line in listing) > budget // 2:
+        groups: Dict[str, List[DiffFile]] = {}
+        for f in files:
+            groups.setdefault(f.path.rpartition('/')[0] or '.', []).append(f)
+        listing = [f'  {directory}/: {len(members)} file(s), '
+                   f'+{sum(f.added for f in members)} -{sum(f.removed for f in members)}'
+                   for directory, members in sorted(
+                       groups.items(), key=lambda g: -sum(f.added + f.removed for f in g[1]))]
+        listing = _fit_lines(listing, budget // 2, lambda n: f'  ... {n} more directories')
+    overview = '\n'.join([header, *listing])
+
+    ranked = sorted((f for f in files if f.significance and (f.hunks or f.notes)),
+                    key=lambda f: -f.significance)
+
+    def more_files(count: int) -> str:
+        return f'... {count} more file(s), listed above'
+
+    # Room for the closing "more files" line is held back throughout
+    remaining = budget - len(overview) - len('\n\nDiff:\n') - len(more_files(len(ranked))) - 1
+    sections = []
+    for index, f in enumerate(ranked):
+        # Fewer files with readable hunks beat many files with a line each
+        slots = min(len(ranked) - index, remaining // min_share)
+        if not slots:
+            break
+        share = remaining // slots
+        # Held back for the trailing '... omitted' lines, which are counted too
+        limit = share - 60
+        text = [f'--- {f.path}'[:limit]]
+        size = len(text[0]) + 1
+        for note in f.notes:
+            if size + len(note) + 1 > limit:
+                break
+            text.append(note)
+            size += len(note) + 1
+        shown = 0
+        for hunk in f.hunks:
+            hunk_size = sum(len(line) + 1 for line in hunk)
+            if size + hunk_size > limit:
+                break
+            text += hunk
+            size += hunk_size
+            shown += 1
+        partial = not shown and bool(f.hunks)
+        if partial:
+            # Too big to show whole: the start of the first hunk still says the most
+            for line in f.hunks[0]:
+                if size + len(line) + 1 > limit:
+                    break
+                text.append(line)
+                size += len(line) + 1
+            text.append('... (rest of hunk omitted)')
+        omitted = len(f.hunks) - shown - partial + f.dropped
+        if omitted:
+            text.append(f'... {omitted} more hunk(s)')
+        section = '\n'.join(text)
+        sections.append(section)
+        remaining -= len(section) + 1
+    if len(ranked) > len(sections) and remaining >= 0:
+        sections.append(more_files(len(ranked) - len(sections)))
+    return overview + ('\n\nDiff:\n' + '\n'.join(sections) if sections else '')
+
+
+def git_dir(repo_dir: Path) -> Path:
+    """Path of the git directory (follows the 'gitdir:' file of worktrees and submodules)"""
+    dot_git = repo_dir / '.git'
+    if dot_git.is_file():
+        target = dot_git.read_text().strip()
+        if target.startswith('gitdir:'):
+            return (repo_dir / target[len('gitdir:'):].strip()).resolve()
+    return dot_git
+
+
+def git_common_dir(repo_dir: Path) -> Path:
+    """The git directory shared by all worktrees (holds info/, config, objects)"""
+    path = git_dir(repo_dir)
+    try:
+        return (path / (path / 'commondir').read_text().strip()).resolve()
+    except OSError:
+        return path
 
-    def _ignored_name(self, name: str) -> bool:
-        """True if a basename should be skipped everywhere (.git or configured)"""
-        return name == '.git' or name in self.ignore_names
 
-    def _dirs_match(self, dir1: Path, dir2: Path) -> bool:
-        """Recursively check if two directories have identical file content"""
-        entries1 = {e.name for e in dir1.iterdir() if not self._ignored_name(e.name)}
-        entries2 = {e.name for e in dir2.iterdir() if not self._ignored_name(e.name)}
-        if entries1 != entries2:
-            return False
-        for name in entries1:
-            p1 = dir1 / name
-            p2 = dir2 / name
-            if p1.is_symlink() and p2.is_symlink():
-                if os.readlink(p1) != os.readlink(p2):
-                    return False
-            elif p1.is_symlink() or p2.is_symlink():
-                return False
-            elif p1.is_file() and p2.is_file():
-                if not filecmp.cmp(p1, p2, shallow=False):
-                    return False
-            elif p1.is_dir() and p2.is_dir():
-                if not self._dirs_match(p1, p2):
-                    return False
-            elif not p1.is_file() and not p1.is_dir():
-                # Special files (sockets, FIFOs, devices) — skip comparison
-                continue
-            else:
-                return False
-        return True
+def state_dir(repo_dir: Path) -> Path:
+    """Directory for dotupdate's local state (inside the git dir, so never synced or tracked)"""
+    return git_dir(repo_dir) / 'dotupdate'
 
-    @staticmethod
-    def is_newer(path1: Path, path2: Path) -> bool:
-        """Check if path1 was modified more recently than path2"""
-        return DotfileSync.get_mtime(path1) > DotfileSync.get_mtime(path2)
 
-    def copy_directory_contents(self, src: Path, dest: Path, rel_base: str = ''):
-        """
-        Copy contents of src directory into dest directory.
-        If dest exists, merge contents; if not, create it.
-        Skips .git entries, non-regular files (sockets, FIFOs), and ignored sub-paths.
-        Symlinks are recreated as symlinks rather than followed.
-        """
-        dest.mkdir(parents=True, exist_ok=True)
+def hash_file(path: Path) -> str:
+    """
+    Return the hex content digest of a regular file: its git blob id
+    (SHA-1 over a 'blob <size>' header and the content), so digests compare
+    directly against the ids in the git index.
+    """
+    size = 0
+    with open(path, 'rb') as f:
+        digest = hashlib.sha1(b'blob %d\0' % os.fstat(f.fileno()).st_size)
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    PROFILER.add('read', size)
+    return digest.hexdigest()
 
-        for item in src.iterdir():
-            if self._ignored_name(item.name):
-                continue
-            src_item = src / item.name
-            dest_item = dest / item.name
-            rel_path = f'{rel_base}/{item.name}' if rel_base else item.name
 
-            if rel_path in self.ignore_items:
+class Entry(NamedTuple):
+    """
+    One directory entry as produced by scan_directory. Carries everything the
+    comparison and copy stages need, so they never stat the entry again.
+    """
+    name: str
+    path: str
+    kind: str                     # 'file', 'dir', 'link' or 'other'
+    size: int = 0
+    mtime_ns: int = 0
+    ino: int = 0
+    mode: int = 0                 # st_mode, for kind == 'file'
+    target: Optional[str] = None  # symlink target, for kind == 'link'
+
+    @property
+    def signature(self) -> List[int]:
+        """The [size, mtime_ns, inode] tuple ContentCache validates digests against"""
+        return [self.size, self.mtime_ns, self.ino]
+
+
+def scan_directory(directory, skip=None) -> List[Entry]:
+    """
+    List a directory with os.scandir, classifying entries from the cached
+    d_type. Only regular files are stat'ed (for size/mtime/inode) and only
+    symlinks are readlink'ed; directories cost nothing beyond the listing.
+    skip(name, is_dir) filters entries out before any of that work happens.
+    """
+    entries = []
+    with os.scandir(directory) as it:
+        for de in it:
+            try:
+                if skip is not None and skip(de.name, de.is_dir(follow_symlinks=False)):
+                    continue
+                if de.is_symlink():
+                    entries.append(Entry(de.name, de.path, 'link', target=os.readlink(de.path)))
+                elif de.is_dir():
+                    entries.append(Entry(de.name, de.path, 'dir'))
+                elif de.is_file():
+                    st = de.stat()
+                    PROFILER.add('stat')
+                    entries.append(Entry(de.name, de.path, 'file', st.st_size,
+                                         st.st_mtime_ns, st.st_ino, st.st_mode))
+                else:
+                    entries.append(Entry(de.name, de.path, 'other'))
+            except FileNotFoundError:
+                # Removed while we were listing
                 continue
+    return entries
 
-            if src_item.is_symlink():
-                if dest_item.exists() or dest_item.is_symlink():
-                    dest_item.unlink()
-                os.symlink(os.readlink(src_item), dest_item)
-            elif src_item.is_dir():
-                self.copy_directory_contents(src_item, dest_item, rel_path)
-            elif src_item.is_file():
-                shutil.copy2(src_item, dest_item)
 
-        shutil.copystat(src, dest)
+def stat_entry(path) -> Entry:
+    """Entry for a single path, following symlinks (used for top-level file items)"""
+    st = os.stat(path)
+    return Entry(os.path.basename(path), os.fspath(path), 'file',
+                 st.st_size, st.st_mtime_ns, st.st_ino, st.st_mode)
 
-    def copy_file(self, src: Path, dest: Path):
-        """Copy a single file or symlink with metadata"""
-        dest.parent.mkdir(parents=True, exist_ok=True)
-        if src.is_symlink():
-            if dest.exists() or dest.is_symlink():
-                dest.unlink()
-            os.symlink(os.readlink(src), dest)
-        else:
-            shutil.copy2(src, dest)
 
-    def discover_dotfiles(self) -> List[str]:
-        """
-        Discover all dotfiles and config directories in the repo.
-        Returns list of relative paths from repo root.
-        """
-        discovered = []
+# Content with a NUL byte in its first DIFF_SNIFF_BYTES is binary (git's heuristic)
+DIFF_SNIFF_BYTES = 8000
 
-        # Scan repo root for dotfiles
-        for item in self.repo_dir.iterdir():
-            name = item.name
 
-            # Skip ignored items (exact path or basename rule)
-            if name in self.ignore_items or self._ignored_name(name):
+def read_diff_lines(path: Optional[str]) -> Optional[List[str]]:
+    """
+    Lines of a file for a unified diff: [] for a missing side (path None),
+    None for binary content, which is detected without reading past the sniff window.
+    """
+    if path is None:
+        return []
+    with open(path, 'rb') as f:
+        data = f.read(DIFF_SNIFF_BYTES)
+        if b'\0' in data:
+            PROFILER.add('read', len(data))
+            return None
+        data += f.read()
+    PROFILER.add('read', len(data))
+    return data.decode('utf-8', errors='replace').splitlines()
+
+
+def colorize_diff_line(line: str) -> str:
+    """ANSI colors for one unified diff line, as diff --color and git show them"""
+    if line.startswith(('+++', '---')):
+        return f'{Colors.BOLD}{line}{Colors.RESET}'
+    if line.startswith('@@'):
+        return f'{Colors.CYAN}{line}{Colors.RESET}'
+    if line.startswith('+'):
+        return f'{Colors.GREEN}{line}{Colors.RESET}'
+    if line.startswith('-'):
+        return f'{Colors.RED}{line}{Colors.RESET}'
+    return line
+
+
+def _clone_file(src_fd: int, dest_fd: int):
+    """Share src's extents with dest via the FICLONE ioctl (Btrfs, XFS, bcachefs)"""
+    import fcntl
+    FICLONE = 0x40049409  # _IOW(0x94, 9, int)
+    fcntl.ioctl(dest_fd, FICLONE, src_fd)
+
+
+class ShortCopyError(OSError):
+    """A fast copy ended before size bytes; copy_data retries with the next backend"""
+
+
+def _copy_file_range(src_fd: int, dest_fd: int, size: int):
+    """In-kernel copy, which NFS and some filesystems turn into a server-side copy"""
+    copied = 0
+    while copied < size:
+        count = os.copy_file_range(src_fd, dest_fd, size - copied)
+        if count == 0:
+            break
+        copied += count
+    if copied != size:
+        raise ShortCopyError(f"copy_file_range stopped after {copied} of {size} bytes")
+
+
+def _sendfile(src_fd: int, dest_fd: int, size: int):
+    """In-kernel copy between file descriptors, without a userspace buffer"""
+    copied = 0
+    while copied < size:
+        count = os.sendfile(dest_fd, src_fd, copied, size - copied)
+        if count == 0:
+            break
+        copied += count
+    if copied != size:
+        raise ShortCopyError(f"sendfile stopped after {copied} of {size} bytes")
+
+
+# Fast copy backends in the order 'auto' tries them; each is skipped where the
+# platform lacks it, and 'copy2' (shutil) is the fallback that always works.
+# All take (src_fd, dest_fd, size) except reflink, which clones the whole file.
+COPY_BACKENDS = {}
+if sys.platform.startswith('linux'):
+    COPY_BACKENDS['reflink'] = _clone_file
+if hasattr(os, 'copy_file_range'):
+    COPY_BACKENDS['copy_file_range'] = _copy_file_range
+if hasattr(os, 'sendfile'):
+    COPY_BACKENDS['sendfile'] = _sendfile
+COPY_BACKEND_NAMES = ('auto', 'reflink', 'copy_file_range', 'sendfile', 'copy2')
+
+# Errors that mean "not supported here", as opposed to a real I/O failure
+COPY_FALLBACK_ERRNOS = {errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL,
+                        errno.ENOSYS, errno.EBADF, errno.ENOTSOCK, errno.EPERM}
+# (backend, source device, destination device) combinations that already failed
+_unsupported_copies: Set[tuple] = set()
+
+
+def copy_data(src: Path, dest: Path, backend: str = 'auto') -> str:
+    """
+    Copy file content from src to dest (metadata is left to the caller).
+    'auto' tries a reflink, then copy_file_range, then sendfile, remembering
+    per device pair which ones are unsupported; a named backend is tried on
+    its own. Anything unsupported falls back to shutil.copyfile, as does a
+    copy that comes up short (the source changed size, or the filesystem
+    stopped early), so a truncated file is never reported as copied.
+    Returns the backend that did the copy.
+    """
+    chain = [name for name in COPY_BACKENDS if backend in ('auto', name)]
+    src_stat = os.stat(src)
+    size = src_stat.st_size
+    if chain and size:
+        devices = (src_stat.st_dev, os.stat(dest.parent).st_dev)
+        for name in chain:
+            key = (name,) + devices
+            if key in _unsupported_copies:
                 continue
-
-            # .config is a container; sync its subdirectories individually
-            # (handled below) rather than as one whole-folder unit.
-            if name == '.config':
+            try:
+                with open(src, 'rb') as fsrc, open(dest, 'wb') as fdest:
+                    if name == 'reflink':
+                        # A clone takes the whole file, so there is no size to check
+                        _clone_file(fsrc.fileno(), fdest.fileno())
+                    else:
+                        COPY_BACKENDS[name](fsrc.fileno(), fdest.fileno(), size)
+                return name
+            except ShortCopyError:
+                continue
+            except OSError as e:
+                if e.errno not in COPY_FALLBACK_ERRNOS:
+                    raise
+                _unsupported_copies.add(key)
+    shutil.copyfile(src, dest)
+    return 'copy2'
+
+
+class ContentCache:
+    """
+    Persistent manifest of content digests for home and repo files.
+
+    Entries are keyed by relative path and hold [size, mtime_ns, inode, digest]
+    for each side ('home' / 'repo'). A file whose stat tuple still matches its
+    entry is resolved without reading it; anything else is re-hashed.
+    The manifest is discarded whenever the ignore rules it was built under change.
+    """
+
+    VERSION = 2
+    # Files modified this recently may still change within the same mtime tick,
+    # so their digests are used for this run but not persisted.
+    RACY_WINDOW_NS = 2_000_000_000
+
+    def __init__(self, path: Optional[Path] = None, rules_key: str = '',
+                 index: Optional['GitIndex'] = None):
+        self.path = path
+        self.rules_key = rules_key
+        self.index = index
+        self.entries: Dict[str, Dict[str, list]] = {}
+        self.dirty = False
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """Read the manifest from disk, dropping it if stale or unreadable"""
+        if not self.path or not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            self.dirty = True
+            return
+        if data.get('version') != self.VERSION or data.get('rules') != self.rules_key:
+            self.dirty = True
+            return
+        self.entries = data.get('entries', {})
+
+    def save(self):
+        """Write the manifest back if anything changed"""
+        if not self.path or not self.dirty:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write_bytes(self.path, json.dumps({
+                'version': self.VERSION,
+                'rules': self.rules_key,
+                'entries': self.entries,
+            }, separators=(',', ':')).encode())
+            self.dirty = False
+        except OSError as e:
+            log_warning(f"Could not save content cache: {e}")
+
+    def digest(self, side: str, rel_path: str, path, signature: Optional[List[int]] = None) -> str:
+        """
+        Return the content digest of a file, re-hashing only if its
+        [size, mtime_ns, inode] signature changed (stat'ed here if not given).
+        Repo files the git index still vouches for take its blob id unread.
+        """
+        if signature is None:
+            st = os.stat(path)
+            signature = [st.st_size, st.st_mtime_ns, st.st_ino]
+        entry = self.entries.get(rel_path, {}).get(side)
+        if entry and entry[:3] == signature:
+            return entry[3]
+
+        digest = None
+        if side == 'repo' and self.index is not None:
+            digest = self.index.blob_id(rel_path, signature)
+        if digest is None:
+            digest = hash_file(path)
+        if time.time_ns() - signature[1] > self.RACY_WINDOW_NS:
+            with self._lock:
+                self.entries.setdefault(rel_path, {})[side] = signature + [digest]
+                self.dirty = True
+        return digest
+
+
+class GitIndex:
+    """
+    Stat data and blob ids of the repo's tracked files, parsed in one read
+    of .git/index (versions 2-4). A worktree file whose size, mtime and inode
+    still match its entry holds that entry's blob, the same shortcut git
+    status takes, so the repo side needs no reading or hashing. Entries git
+    itself would re-check (racily clean, unmerged, skip-worktree,
+    intent-to-add) are left out, and the whole index is ignored when
+    attributes or core.autocrlf may make blobs differ from worktree bytes.
+    A stale index only answers less often, never wrongly: every answer is
+    tied to the file's current stat data.
+    """
+
+    HEADER = struct.Struct('>4sII')
+    # ctime s/ns, mtime s/ns, dev, ino, mode, uid, gid, size, sha1, flags
+    ENTRY = struct.Struct('>10I20sH')
+
+    def __init__(self, repo_dir: Path):
+        self.repo_dir = repo_dir
+        self.entries: Optional[Dict[str, tuple]] = None
+        self._lock = threading.Lock()
+
+    def blob_id(self, rel_path: str, signature: List[int]) -> Optional[str]:
+        """Hex blob id for a repo file with this [size, mtime_ns, inode], or None if unknown"""
+        entries = self.entries
+        if entries is None:
+            entries = self.load()
+        entry = entries.get(rel_path)
+        if entry is None or entry[:3] != (signature[0] & 0xffffffff, signature[1],
+                                          signature[2] & 0xffffffff):
+            return None
+        return entry[3]
+
+    def load(self) -> Dict[str, tuple]:
+        """Parse the index once (thread-safe); empty if missing, unsupported or untrustworthy"""
+        with self._lock:
+            if self.entries is None:
+                entries = {}
+                try:
+                    entries = self._read()
+                except (OSError, ValueError, struct.error) as e:
+                    if not isinstance(e, FileNotFoundError):
+                        log_warning(f"Could not read git index: {e}")
+                if entries and self._filters_possible(entries):
+                    entries = {}
+                self.entries = entries
+            return self.entries
+
+    def reset(self):
+        """Drop the parsed index (after git rewrote it, e.g. on pull)"""
+        with self._lock:
+            self.entries = None
+
+    def _read(self) -> Dict[str, tuple]:
+        """rel_path -> (size, mtime_ns, inode, blob id) for clean, stage-0 regular files"""
+        path = git_dir(self.repo_dir) / 'index'
+        with open(path, 'rb') as f:
+            index_mtime = os.fstat(f.fileno()).st_mtime_ns
+            data = f.read()
+        PROFILER.add('read', len(data))
+        magic, version, count = self.HEADER.unpack_from(data)
+        if magic != b'DIRC' or version not in (2, 3, 4):
+            raise ValueError(f'unsupported index version {version}')
+
+        entries = {}
+        offset = self.HEADER.size
+        name = b''
+        for _ in range(count):
+            (_, _, mtime_s, mtime_ns, _, ino, mode, _, _, size,
+             sha, flags) = self.ENTRY.unpack_from(data, offset)
+            pos = offset + self.ENTRY.size
+            extended = 0
+            if flags & 0x4000:
+                extended, = struct.unpack_from('>H', data, pos)
+                pos += 2
+            if version == 4:
+                # Path is the previous one minus a varint-encoded suffix, plus a new tail
+                byte = data[pos]
+                strip = byte & 0x7f
+                pos += 1
+                while byte & 0x80:
+                    byte = data[pos]
+                    strip = ((strip + 1) << 7) | (byte & 0x7f)
+                    pos += 1
+                end = data.index(b'\0', pos)
+                name = name[:len(name) - strip] + data[pos:end]
+                offset = end + 1
+            else:
+                end = data.index(b'\0', pos)
+                name = data[pos:end]
+                # Entries are NUL-padded to a multiple of eight bytes
+                offset += (end - offset + 8) & ~7
+            mtime = mtime_s * 1_000_000_000 + mtime_ns
+            if ((flags & 0x8000) or (flags >> 12) & 3 or extended & 0x6000
+                    or mode >> 12 != 0o10 or mtime >= index_mtime):
+                continue
+            entries[name.decode('utf-8', 'surrogateescape')] = (size, mtime, ino, sha.hex())
+        return entries
+
+    def _filters_possible(self, entries: Dict[str, tuple]) -> bool:
+        """Whether checkout filters or line-ending conversion may apply to tracked files"""
+        if (git_common_dir(self.repo_dir) / 'info' / 'attributes').exists():
+            return True
+        if any(path.rpartition('/')[2] == '.gitattributes' for path in entries):
+            return True
+        result = subprocess.run(['git', 'config', '--get', 'core.autocrlf'], cwd=self.repo_dir,
+                                capture_output=True, text=True)
+        return result.stdout.strip().lower() in ('true', 'input')
+
+
+class FileDiff(NamedTuple):
+    """One entry that differs between two compared trees"""
+    rel_path: str        # relative to the repo root
+    kind: str            # 'differs', 'first_only' or 'second_only'
+    direction: str = ''  # three-way outcome: 'to_repo', 'to_home' or 'conflict'
+
+
+class TreeSnapshot:
+    """
+    Compact record of every entry under one item: parallel arrays of
+    path, kind, size, mtime_ns, mode and 20-byte content digest, sorted by
+    path component so a subtree is always a contiguous run. Two snapshots
+    diff as a sorted merge without touching the filesystem.
+    """
+    __slots__ = ('paths', 'kinds', 'sizes', 'mtimes', 'modes', 'digests', 'rules_key', '_index')
+
+    MAGIC = b'DUSNAP2\n'
+    KINDS = {'file': 1, 'dir': 2, 'link': 3}
+    DIGEST_SIZE = 20
+    NO_DIGEST = bytes(DIGEST_SIZE)
+
+    def __init__(self, rules_key: str = ''):
+        self.rules_key = rules_key
+        self.paths: List[str] = []
+        self.kinds = bytearray()
+        self.sizes = array.array('q')
+        self.mtimes = array.array('q')
+        self.modes = array.array('I')
+        self.digests = bytearray()
+        self._index: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def add(self, rel_path: str, kind: str, size: int = 0, mtime_ns: int = 0,
+            mode: int = 0, digest: bytes = NO_DIGEST):
+        """Append one record (call finish() once all are added)"""
+        self.paths.append(rel_path)
+        self.kinds.append(self.KINDS[kind])
+        self.sizes.append(size)
+        self.mtimes.append(mtime_ns)
+        self.modes.append(mode)
+        self.digests += digest
+
+    def finish(self) -> 'TreeSnapshot':
+        """Sort records into path-component order"""
+        order = sorted(range(len(self.paths)), key=lambda i: self.paths[i].split('/'))
+        if order != list(range(len(order))):
+            self.paths = [self.paths[i] for i in order]
+            self.kinds = bytearray(self.kinds[i] for i in order)
+            self.sizes = array.array('q', (self.sizes[i] for i in order))
+            self.mtimes = array.array('q', (self.mtimes[i] for i in order))
+            self.modes = array.array('I', (self.modes[i] for i in order))
+            size = self.DIGEST_SIZE
+            self.digests = bytearray(b''.join(
+                self.digests[i * size:(i + 1) * size] for i in order))
+            self._index = None
+        return self
+
+    def digest(self, index: int) -> bytes:
+        return bytes(self.digests[index * self.DIGEST_SIZE:(index + 1) * self.DIGEST_SIZE])
+
+    @classmethod
+    def link_digest(cls, target: str) -> bytes:
+        """Digest recorded for a symlink: a hash of its target"""
+        return hashlib.blake2b(os.fsencode(target), digest_size=cls.DIGEST_SIZE).digest()
+
+    def subtree(self, rel_path: str) -> 'TreeSnapshot':
+        """The records for rel_path and everything below it (empty if absent)"""
+        if self._index is None:
+            self._index = {path: i for i, path in enumerate(self.paths)}
+        sub = TreeSnapshot(self.rules_key)
+        start = self._index.get(rel_path)
+        if start is None:
+            return sub
+        end = self._skip_subtree(start)
+        sub.paths = self.paths[start:end]
+        sub.kinds = self.kinds[start:end]
+        sub.sizes = self.sizes[start:end]
+        sub.mtimes = self.mtimes[start:end]
+        sub.modes = self.modes[start:end]
+        sub.digests = self.digests[start * self.DIGEST_SIZE:end * self.DIGEST_SIZE]
+        return sub
+
+    def to_bytes(self) -> bytes:
+        """Serialize as a header followed by each array in turn"""
+        paths = '\0'.join(self.paths).encode('utf-8', 'surrogateescape')
+        return b''.join([
+            struct.pack('<8s16sII', self.MAGIC, self.rules_key.encode().ljust(16),
+                        len(self.paths), len(paths)),
+            paths, bytes(self.kinds), self.sizes.tobytes(), self.mtimes.tobytes(),
+            self.modes.tobytes(), bytes(self.digests),
+        ])
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'TreeSnapshot':
+        """Inverse of to_bytes; raises ValueError on a malformed snapshot"""
+        header = struct.calcsize('<8s16sII')
+        try:
+            magic, rules_key, count, paths_size = struct.unpack_from('<8s16sII', data)
+        except struct.error:
+            raise ValueError('truncated snapshot')
+        if magic != cls.MAGIC:
+            raise ValueError('not a snapshot')
+
+        snapshot = cls(rules_key.rstrip().decode())
+        offset = header + paths_size
+        paths = data[header:offset].decode('utf-8', 'surrogateescape')
+        snapshot.paths = paths.split('\0') if count else []
+        snapshot.kinds = bytearray(data[offset:offset + count])
+        offset += count
+        for name, typecode in (('sizes', 'q'), ('mtimes', 'q'), ('modes', 'I')):
+            values = array.array(typecode)
+            values.frombytes(data[offset:offset + count * values.itemsize])
+            setattr(snapshot, name, values)
+            offset += count * values.itemsize
+        snapshot.digests = bytearray(data[offset:offset + count * cls.DIGEST_SIZE])
+        if (len(snapshot.paths) != count or len(snapshot.digests) != count * cls.DIGEST_SIZE):
+            raise ValueError('truncated snapshot')
+        return snapshot
+
+    def _skip_subtree(self, index: int) -> int:
+        """Index of the first record after the entry at index and everything below it"""
+        prefix = self.paths[index] + '/'
+        index += 1
+        while index < len(self.paths) and self.paths[index].startswith(prefix):
+            index += 1
+        return index
+
+    def diff(self, other: 'TreeSnapshot') -> List[FileDiff]:
+        """
+        Sorted merge of two snapshots into the same FileDiff list a live
+        comparison produces (self is the first tree). A subtree present on one
+        side only is reported once, at its root.
+        """
+        changes = []
+        i = j = 0
+        while i < len(self.paths) or j < len(other.paths):
+            key1 = self.paths[i].split('/') if i < len(self.paths) else None
+            key2 = other.paths[j].split('/') if j < len(other.paths) else None
+            if key2 is None or (key1 is not None and key1 < key2):
+                changes.append(FileDiff(self.paths[i], 'first_only'))
+                i = self._skip_subtree(i)
+            elif key1 is None or key2 < key1:
+                changes.append(FileDiff(other.paths[j], 'second_only'))
+                j = other._skip_subtree(j)
+            elif self.kinds[i] != other.kinds[j]:
+                changes.append(FileDiff(self.paths[i], 'differs'))
+                i = self._skip_subtree(i)
+                j = other._skip_subtree(j)
+            else:
+                if (self.sizes[i] != other.sizes[j]
+                        or self.digest(i) != other.digest(j)):
+                    changes.append(FileDiff(self.paths[i], 'differs'))
+                i += 1
+                j += 1
+        return changes
+
+
+class ItemPlan:
+    """
+    Outcome of comparing one item between home and repo.
+    Changes are ordered (home, repo): 'first_only' entries exist only in home.
+    """
+
+    def __init__(self, item: str, info: tuple, changes: List[FileDiff] = None):
+        self.item = item
+        self.info = info
+        self.changes = changes or []
+
+    @property
+    def status(self) -> str:
+        return self.info[0]
+
+    @property
+    def action(self) -> str:
+        return self.info[2]
+
+
+class CopyStats:
+    """
+    Counters collected while copying: entries copied, entries skipped as
+    identical, entries deleted (by a three-way merge) and bytes written
+    """
+
+    def __init__(self, copied: int = 0, skipped: int = 0, bytes_written: int = 0):
+        self.copied = copied
+        self.skipped = skipped
+        self.deleted = 0
+        self.bytes_written = bytes_written
+
+    @classmethod
+    def single(cls, bytes_written: int) -> 'CopyStats':
+        """Stats for one copied file or symlink"""
+        return cls(copied=1, bytes_written=bytes_written)
+
+    def __str__(self) -> str:
+        deleted = f"{self.deleted} deleted, " if self.deleted else ""
+        return (f"{self.copied} copied, {self.skipped} unchanged, {deleted}"
+                f"{format_bytes(self.bytes_written)} written")
+
+
+class DotfileSync:
+    """Handles dotfile synchronization between home and repo"""
+
+    # Regular files handed to one worker task during a parallel comparison
+    COMPARE_BATCH = 32
+    IN_SYNC_INFO = ('in_sync', 'In sync', 'skip', Colors.GREEN, '✓')
+    DEFAULT_OPTIONS = ItemOptions()
+    # Comparison workers when neither the command line nor the config says
+    DEFAULT_JOBS = 4
+
+    def __init__(self, home_dir: Path, repo_dir: Path,
+                 ignore_items: Iterable[str] = None, ignore_names: Iterable[str] = None,
+                 cache: Optional[ContentCache] = None, jobs: int = 1,
+                 copy_backend: str = 'auto', fsync: bool = False,
+                 item_options: Optional[Dict[str, ItemOptions]] = None,
+                 rules: Optional[IgnoreRules] = None):
+        self.home_dir = home_dir
+        self.repo_dir = repo_dir
+        self.repo_modified = False
+        self.jobs = jobs
+        self.copy_backend = copy_backend
+        self.fsync_batch = FsyncBatch(fsync)
+        self.item_options = item_options or {}
+        # Comparison pools by worker count (items can ask for their own, see ItemOptions.jobs)
+        self._executors: Dict[int, 'ThreadPoolExecutor'] = {}
+        self._executors_lock = threading.Lock()
+        # Precompiled rules (see Config.rules) stand in for the two lists
+        self.rules = rules if rules is not None else IgnoreRules(ignore_items or (), ignore_names or ())
+        if cache is None:
+            rules_key = self.rules.fingerprint()
+            is_repo = (repo_dir / '.git').exists()
+            manifest = state_dir(repo_dir) / 'manifest.json' if is_repo else None
+            cache = ContentCache(manifest, rules_key, GitIndex(repo_dir) if is_repo else None)
+        self.cache = cache
+        self.plans: Dict[str, ItemPlan] = {}
+        self.items: Optional[List[str]] = None
+        # Directories a three-way merge may delete, as confirmed by the user
+        self.confirmed_deletions: Set[str] = set()
+        # Optional watch daemon: items it has not seen change are known in sync
+        self.watch = WatchClient(state_dir(repo_dir) / 'watch.sock')
+        self._watch_view: Optional[Dict[str, Any]] = None
+        self._watch_lock = threading.Lock()
+        self._confirmed_clean: Set[str] = set()
+
+    @classmethod
+    def from_config(cls, home_dir: Path, repo_dir: Path, config: Config,
+                    jobs: Optional[int] = None, copy_backend: Optional[str] = None,
+                    **kwargs) -> 'DotfileSync':
+        """
+        Build from a loaded Config; explicit jobs/copy_backend override the
+        config's, which override DEFAULT_JOBS and the 'auto' backend.
+        """
+        return cls(home_dir, repo_dir, config.ignore_items, config.ignore_names,
+                   jobs=jobs or config.jobs or cls.DEFAULT_JOBS,
+                   copy_backend=copy_backend or config.copy_backend or 'auto',
+                   item_options=config.items, rules=config.rules, **kwargs)
+
+    def _options_for(self, rel_path: str) -> ItemOptions:
+        """Options of the configured item a path belongs to (defaults if none)"""
+        if self.item_options:
+            parts = rel_path.split('/', 2)
+            for depth in (2, 1):
+                options = self.item_options.get('/'.join(parts[:depth]))
+                if options is not None:
+                    return options
+        return self.DEFAULT_OPTIONS
+
+    def save(self):
+        """Persist the content cache and report verified items to the watch daemon"""
+        self.cache.save()
+        if self._watch_view and self._confirmed_clean:
+            self.watch.request({
+                'op': 'clean',
+                'items': sorted(self._confirmed_clean),
+                'generation': self._watch_view['generation'],
+            })
+            self._confirmed_clean.clear()
+
+    def _watch_says_clean(self, item_path: str) -> bool:
+        """
+        True if a running watch daemon has seen no change to the item since it
+        was last confirmed in sync. Without a daemon (or with one running under
+        different ignore rules) every item has to be checked.
+        """
+        with self._watch_lock:
+            if self._watch_view is None:
+                reply = self.watch.request({'op': 'dirty'})
+                if reply and reply.get('rules') == self.cache.rules_key:
+                    reply['clean'] = set(reply['items']) - set(reply['dirty'])
+                    self._watch_view = reply
+                else:
+                    self._watch_view = {}
+        return bool(self._watch_view) and item_path in self._watch_view['clean']
+
+    def _record_status(self, item_path: str, info: tuple) -> tuple:
+        """
+        Remember items found in sync so save() can report them to the daemon.
+        Only content-verified verdicts count: the daemon trusts a reported item
+        until it sees a change, so a stat-only guess (same size and mtime)
+        would otherwise hide a same-size edit for good.
+        """
+        if info[0] == 'in_sync' and self._options_for(item_path).compare == 'content':
+            self._confirmed_clean.add(item_path)
+        return info
+
+    def _snapshot_path(self, item_path: str, name: str) -> Path:
+        """Where the named snapshot of an item is stored"""
+        from urllib.parse import quote
+        return state_dir(self.repo_dir) / 'snapshots' / name / (quote(item_path, safe='') + '.snap')
+
+    def take_snapshot(self, item_path: str, side: str, follow: bool = True) -> TreeSnapshot:
+        """
+        Capture an item (or any path below one) on one side ('home' or 'repo')
+        as a TreeSnapshot. File digests come from the content cache, so only
+        changed files are read. With follow=False a symlink at item_path is
+        recorded as a link rather than followed, as it would be inside a tree.
+        """
+        root = self.home_dir if side == 'home' else self.repo_dir
+        snapshot = TreeSnapshot(self.cache.rules_key)
+        try:
+            if not follow and os.path.islink(root / item_path):
+                target = os.readlink(root / item_path)
+                snapshot.add(item_path, 'link', digest=TreeSnapshot.link_digest(target))
+                return snapshot
+            top = stat_entry(root / item_path)
+        except OSError:
+            return snapshot
+
+        if not stat_module.S_ISDIR(top.mode):
+            digest = self.cache.digest(side, item_path, top.path, top.signature)
+            snapshot.add(item_path, 'file', top.size, top.mtime_ns, top.mode, bytes.fromhex(digest))
+            return snapshot
+
+        snapshot.add(item_path, 'dir')
+        stack = [(top.path, item_path)]
+        while stack:
+            directory, rel_base = stack.pop()
+            for name, entry in self._list_entries(directory, rel_base).items():
+                rel_path = f'{rel_base}/{name}'
+                if entry.kind == 'dir':
+                    snapshot.add(rel_path, 'dir')
+                    stack.append((entry.path, rel_path))
+                elif entry.kind == 'link':
+                    snapshot.add(rel_path, 'link', digest=TreeSnapshot.link_digest(entry.target))
+                elif entry.kind == 'file':
+                    digest = self.cache.digest(side, rel_path, entry.path, entry.signature)
+                    snapshot.add(rel_path, 'file', entry.size, entry.mtime_ns,
+                                 entry.mode, bytes.fromhex(digest))
+        return snapshot.finish()
+
+    def save_snapshot(self, item_path: str, name: str, snapshot: TreeSnapshot):
+        """Store a snapshot under the repo's state directory"""
+        path = self._snapshot_path(item_path, name)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write_bytes(path, snapshot.to_bytes())
+        except OSError as e:
+            log_warning(f"Could not save snapshot of {item_path}: {e}")
+
+    def load_snapshot(self, item_path: str, name: str) -> Optional[TreeSnapshot]:
+        """Read a stored snapshot; None if missing, unreadable or built under other ignore rules"""
+        try:
+            snapshot = TreeSnapshot.from_bytes(self._snapshot_path(item_path, name).read_bytes())
+        except (OSError, ValueError):
+            return None
+        return snapshot if snapshot.rules_key == self.cache.rules_key else None
+
+    def record_synced(self, items: List[str], verified: bool = False):
+        """
+        Snapshot both sides of each item and, where they agree, store the repo
+        side as the item's 'synced' state, the reference later runs diff against.
+        verified=True skips the home side for items just found in sync, and
+        only rewrites snapshots that no longer match. Items deployed as links
+        agree once every link resolves into the repo.
+        """
+        for item in items:
+            snapshot = self.take_snapshot(item, 'repo')
+            if not len(snapshot):
+                continue
+            deployed = self._options_for(item).deploy != 'copy'
+            if deployed and self.link_status(item)[0] != 'in_sync':
+                continue
+            if verified:
+                stored = self.load_snapshot(item, 'synced')
+                if stored is not None and not stored.diff(snapshot):
+                    continue
+            elif not deployed and self.take_snapshot(item, 'home').diff(snapshot):
+                continue
+            self.save_snapshot(item, 'synced', snapshot)
+
+    def changes_since_sync(self, item_path: str, side: str) -> Optional[List[FileDiff]]:
+        """
+        What changed on one side since the item was last in sync, as FileDiffs
+        ordered (synced, now). None if there is no usable 'synced' snapshot.
+        """
+        synced = self.load_snapshot(item_path, 'synced')
+        if synced is None:
+            return None
+        return synced.diff(self.take_snapshot(item_path, side))
+
+    @staticmethod
+    def get_mtime(path: Path) -> float:
+        """Get modification time of file or directory"""
+        return path.stat().st_mtime
+
+    def contents_match(self, path1: Path, path2: Path) -> bool:
+        """Check if two paths have identical content (files or directories)"""
+        if path1.is_file() and path2.is_file():
+            return self._files_match(path1, path2)
+        if path1.is_dir() and path2.is_dir():
+            return self._dirs_match(path1, path2)
+        return False
+
+    def _cache_key(self, path) -> tuple:
+        """Map a path (str or Path) to its (side, relative path) manifest key"""
+        path = os.fspath(path)
+        # The repo usually lives inside home, so test it first
+        for side, root in (('repo', self.repo_dir), ('home', self.home_dir)):
+            prefix = os.path.join(root, '')
+            if path.startswith(prefix):
+                return side, path[len(prefix):]
+        return 'abs', path
+
+    def _files_match(self, path1, path2, entry1: Optional[Entry] = None,
+                     entry2: Optional[Entry] = None) -> bool:
+        """
+        Compare two regular files by size, then by cached content digest.
+        Entries from scan_directory save the stat calls.
+        """
+        entry1 = entry1 or stat_entry(path1)
+        entry2 = entry2 or stat_entry(path2)
+        if entry1.size != entry2.size:
+            return False
+        side1, rel1 = self._cache_key(path1)
+        side2, rel2 = self._cache_key(path2)
+        if self._options_for(rel1).compare == 'stat':
+            return entry1.mtime_ns == entry2.mtime_ns
+        return (self.cache.digest(side1, rel1, path1, entry1.signature)
+                == self.cache.digest(side2, rel2, path2, entry2.signature))
+
+    def _ignored(self, rel_path: str, is_dir: bool) -> bool:
+        """True if an entry should be skipped everywhere (.git, temp files or a configured rule)"""
+        name = rel_path.rpartition('/')[2]
+        return (name == '.git' or name.startswith(TEMP_PREFIX)
+                or self.rules.match(rel_path, is_dir))
+
+    def _dirs_match(self, dir1: Path, dir2: Path) -> bool:
+        """Recursively check if two directories have identical file content"""
+        side, rel_base = self._cache_key(dir1)
+        if side == 'abs':
+            rel_base = ''
+        return not self._differences(dir1, dir2, rel_base, stop_early=True)
+
+    def _list_entries(self, directory, rel_base: str) -> Dict[str, Entry]:
+        """Scan a directory, leaving out ignored entries before they are stat'ed or descended into"""
+        def skip(name: str, is_dir: bool) -> bool:
+            return self._ignored(f'{rel_base}/{name}' if rel_base else name, is_dir)
+        return {entry.name: entry for entry in scan_directory(directory, skip)}
+
+    def _scan_pair(self, dir1, dir2, rel_base: str) -> List[tuple]:
+        """
+        List two directories side by side and classify each entry, in name order,
+        as (kind, rel_path, entry1, entry2). Kind is a FileDiff kind when the entry
+        is already known to differ, 'file' for two regular files that still need
+        a content check, or 'dir' for two subdirectories to descend into.
+        Special files (sockets, FIFOs, devices) are never compared.
+        """
+        entries1 = self._list_entries(dir1, rel_base)
+        entries2 = self._list_entries(dir2, rel_base)
+        scanned = []
+        for name in sorted(entries1.keys() | entries2.keys()):
+            rel_path = f'{rel_base}/{name}' if rel_base else name
+            e1 = entries1.get(name)
+            e2 = entries2.get(name)
+            if e2 is None:
+                if e1.kind != 'other':
+                    scanned.append(('first_only', rel_path, e1, None))
+            elif e1 is None:
+                if e2.kind != 'other':
+                    scanned.append(('second_only', rel_path, None, e2))
+            elif e1.kind == 'link' and e2.kind == 'link':
+                if e1.target != e2.target:
+                    scanned.append(('differs', rel_path, e1, e2))
+            elif e1.kind == 'link' or e2.kind == 'link':
+                scanned.append(('differs', rel_path, e1, e2))
+            elif e1.kind == 'other' or e2.kind == 'other':
+                continue
+            elif e1.kind == e2.kind:
+                scanned.append((e1.kind, rel_path, e1, e2))
+            else:
+                scanned.append(('differs', rel_path, e1, e2))
+        return scanned
+
+    def _iter_differences(self, dir1, dir2, rel_base: str = '') -> Iterator['FileDiff']:
+        """
+        Walk two directories in step and yield every entry that differs.
+        Paths are reported relative to the repo root. The walk is lazy, so a
+        caller that only needs a yes/no answer can stop at the first difference.
+        """
+        for kind, rel_path, e1, e2 in self._scan_pair(dir1, dir2, rel_base):
+            if kind == 'dir':
+                yield from self._iter_differences(e1.path, e2.path, rel_path)
+            elif kind == 'file':
+                if not self._files_match(e1.path, e2.path, e1, e2):
+                    yield FileDiff(rel_path, 'differs')
+            else:
+                yield FileDiff(rel_path, kind)
+
+    def _compare_files(self, pairs: List[tuple], stop_early: bool) -> List['FileDiff']:
+        """Content-check a batch of (rel_path, entry1, entry2) regular file pairs"""
+        diffs = []
+        for rel_path, e1, e2 in pairs:
+            if not self._files_match(e1.path, e2.path, e1, e2):
+                diffs.append(FileDiff(rel_path, 'differs'))
+                if stop_early:
+                    break
+        return diffs
+
+    def _workers(self, rel_path: str) -> int:
+        """Comparison workers for the item containing rel_path"""
+        return self._options_for(rel_path).jobs or self.jobs
+
+    def _get_executor(self, workers: int) -> 'ThreadPoolExecutor':
+        """
+        Worker pool shared by every comparison this instance runs with that
+        many workers. Items sync in parallel, so creation is locked.
+        """
+        with self._executors_lock:
+            pool = self._executors.get(workers)
+            if pool is None:
+                from concurrent.futures import ThreadPoolExecutor
+                pool = self._executors[workers] = ThreadPoolExecutor(
+                    max_workers=workers, thread_name_prefix='dotupdate-compare')
+            return pool
+
+    def _parallel_differences(self, dir1, dir2, rel_base: str,
+                              stop_early: bool) -> List['FileDiff']:
+        """
+        Compare two trees on the worker pool. Directory listings and batches of
+        file comparisons run concurrently; the calling thread only schedules
+        follow-up work, so workers never block on each other. Results are
+        sorted by path so they do not depend on scheduling order.
+        """
+        import queue
+        pool = self._get_executor(self._workers(rel_base))
+        finished: 'queue.Queue[Future]' = queue.Queue()
+        pending = set()
+
+        def submit(fn, *args):
+            future = pool.submit(fn, *args)
+            pending.add(future)
+            future.add_done_callback(finished.put)
+
+        diffs = []
+        submit(self._scan_pair, dir1, dir2, rel_base)
+        try:
+            while pending:
+                future = finished.get()
+                pending.discard(future)
+                result = future.result()
+                files = []
+                for entry in result:
+                    if isinstance(entry, FileDiff):
+                        diffs.append(entry)
+                        continue
+                    kind, rel_path, e1, e2 = entry
+                    if kind == 'dir':
+                        submit(self._scan_pair, e1.path, e2.path, rel_path)
+                    elif kind == 'file':
+                        files.append((rel_path, e1, e2))
+                    else:
+                        diffs.append(FileDiff(rel_path, kind))
+                for i in range(0, len(files), self.COMPARE_BATCH):
+                    submit(self._compare_files, files[i:i + self.COMPARE_BATCH], stop_early)
+                if stop_early and diffs:
+                    break
+        finally:
+            for future in pending:
+                future.cancel()
+
+        return sorted(diffs, key=lambda diff: diff.rel_path.split('/'))
+
+    def _differences(self, dir1, dir2, rel_base: str = '',
+                     stop_early: bool = False) -> List['FileDiff']:
+        """
+        Collect the entries that differ between two directories, on a worker
+        pool when the item has more than one job. With stop_early, at most the first difference found
+        is returned, which is enough to answer "do these match?".
+        """
+        if self._workers(rel_base) > 1:
+            diffs = self._parallel_differences(dir1, dir2, rel_base, stop_early)
+            return diffs[:1] if stop_early else diffs
+        found = self._iter_differences(dir1, dir2, rel_base)
+        return list(itertools.islice(found, 1)) if stop_early else list(found)
+
+    @staticmethod
+    def is_newer(path1: Path, path2: Path) -> bool:
+        """Check if path1 was modified more recently than path2"""
+        return DotfileSync.get_mtime(path1) > DotfileSync.get_mtime(path2)
+
+    def _needs_copy(self, src: Entry, dest: Optional[Entry]) -> bool:
+        """
+        Check whether dest must be rewritten to match src.
+        Symlinks compare by target; files by size and mtime, falling back to
+        content only when the sizes agree but the mtimes do not.
+        """
+        if dest is None or src.kind != dest.kind:
+            return True
+        if src.kind == 'link':
+            return src.target != dest.target
+        if src.size != dest.size:
+            return True
+        if src.mtime_ns == dest.mtime_ns:
+            return False
+        return not self._files_match(src.path, dest.path, src, dest)
+
+    def copy_directory_contents(self, src: Path, dest: Path, rel_base: str = '',
+                                stats: Optional['CopyStats'] = None,
+                                delta: bool = True) -> 'CopyStats':
+        """
+        Copy contents of src directory into dest directory.
+        If dest exists, merge contents; if not, create it.
+        Skips .git entries, non-regular files (sockets, FIFOs), and ignored sub-paths.
+        Symlinks are recreated as symlinks rather than followed.
+        With delta=True (the default) files and symlinks that already match
+        are left untouched; delta=False rewrites everything.
+        """
+        stats = stats if stats is not None else CopyStats()
+        copied_before = stats.copied
+        created = not dest.exists()
+        dest.mkdir(parents=True, exist_ok=True)
+        existing = self._list_entries(dest, rel_base) if delta and not created else {}
+
+        for entry in self._list_entries(src, rel_base).values():
+            rel_path = f'{rel_base}/{entry.name}' if rel_base else entry.name
+            dest_item = dest / entry.name
+
+            if entry.kind == 'dir':
+                self.copy_directory_contents(Path(entry.path), dest_item, rel_path, stats, delta)
+            elif entry.kind in ('file', 'link'):
+                if delta and not self._needs_copy(entry, existing.get(entry.name)):
+                    stats.skipped += 1
+                    continue
+                stats.bytes_written += self.copy_file(Path(entry.path), dest_item)
+                stats.copied += 1
+
+        if created or stats.copied > copied_before or not delta:
+            shutil.copystat(src, dest)
+        return stats
+
+    def copy_file(self, src: Path, dest: Path) -> int:
+        """
+        Copy a single file or symlink with metadata, through the configured
+        copy backend (see copy_data). The copy is written to a temp file and
+        renamed over dest, so dest is never half-written or briefly missing.
+        A symlink at dest is written through to its target, as shutil.copy2
+        does, unless src is a symlink too. Returns bytes written.
+        """
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        if src.is_symlink():
+            with atomic_target(dest) as tmp:
+                os.symlink(os.readlink(src), tmp)
+            self.fsync_batch.add(dest)
+            return 0
+        backend = self._options_for(self._cache_key(dest)[1]).copy_backend or self.copy_backend
+        if dest.is_symlink():
+            dest = Path(os.path.realpath(dest))
+        with atomic_target(dest) as tmp:
+            backend = copy_data(src, tmp, backend)
+            shutil.copystat(src, tmp)
+            size = os.stat(tmp).st_size
+        self.fsync_batch.add(dest)
+        if backend != 'reflink':
+            # A reflink shares extents: no data is read or written
+            PROFILER.add('read', size)
+            PROFILER.add('written', size)
+        return size
+
+    def discover_dotfiles(self) -> List[str]:
+        """
+        Discover all dotfiles and config directories in the repo.
+        Returns list of relative paths from repo root.
+        """
+        discovered = []
+
+        # Scan repo root for dotfiles (ignored items are skipped by _list_entries)
+        for name, entry in self._list_entries(self.repo_dir, '').items():
+            # .config is a container; sync its subdirectories individually
+            # (handled below) rather than as one whole-folder unit.
+            if name == '.config':
                 continue
 
             # Include dotfiles (starting with .)
             if name.startswith('.'):
                 discovered.append(name)
             # Include common config directories like 'nvim'
-            elif item.is_dir() and name in ['nvim']:
+            elif entry.kind == 'dir' and name in ['nvim']:
                 discovered.append(name)
 
         # Scan .config directory if it exists
         config_dir = self.repo_dir / '.config'
-        if config_dir.exists() and config_dir.is_dir():
-            for entry in config_dir.iterdir():
-                rel_path = f'.config/{entry.name}'
-                if rel_path in self.ignore_items or self._ignored_name(entry.name):
-                    continue
-                discovered.append(rel_path)
+        if config_dir.is_dir():
+            for name in self._list_entries(config_dir, '.config'):
+                discovered.append(f'.config/{name}')
 
         return sorted(discovered)
 
-    def get_sync_info(self, item_path: str) -> tuple:
+    @staticmethod
+    def _presence_info(home_path: Path, repo_path: Path) -> Optional[tuple]:
         """
-        Get information about sync status for an item.
-        Returns (status, description, action, color, symbol)
+        Status tuple for an item that is missing on a side or differs in type.
+        Returns None when both sides exist with the same type and need comparing.
         """
-        home_path = self.home_dir / item_path
-        repo_path = self.repo_dir / item_path
-
         home_exists = home_path.exists()
         repo_exists = repo_path.exists()
 
@@ -503,150 +2675,845 @@ class DotfileSync:
             return ('new_in_repo', f'New {item_type} in repo → home', 'copy_to_home', Colors.BLUE, '→')
 
         # Both exist
-        home_is_dir = home_path.is_dir()
-        repo_is_dir = repo_path.is_dir()
-
-        if home_is_dir != repo_is_dir:
+        if home_path.is_dir() != repo_path.is_dir():
             return ('type_mismatch', 'Type mismatch!', 'skip', Colors.RED, '✗')
+        return None
 
-        if self.contents_match(home_path, repo_path):
-            return ('in_sync', 'In sync', 'skip', Colors.GREEN, '✓')
-
+    def _direction_info(self, home_path: Path, repo_path: Path) -> tuple:
+        """
+        Status tuple for an item that differs: the configured direction if the
+        item is pinned, otherwise whichever side is newer
+        """
+        direction = self._options_for(home_path.relative_to(self.home_dir).as_posix()).direction
+        if direction == 'to_repo':
+            return ('home_newer', 'Pinned: home → repo', 'update_repo', Colors.YELLOW, '←')
+        if direction == 'to_home':
+            return ('repo_newer', 'Pinned: repo → home', 'update_home', Colors.CYAN, '→')
         if self.is_newer(repo_path, home_path):
             return ('repo_newer', 'Repo newer → home', 'update_home', Colors.CYAN, '→')
-        else:
-            return ('home_newer', 'Home newer → repo', 'update_repo', Colors.YELLOW, '←')
+        return ('home_newer', 'Home newer → repo', 'update_repo', Colors.YELLOW, '←')
 
-    def sync_item(self, item_path: str, verbose: bool = True) -> bool:
+    @PROFILER.traced('status')
+    def plan_item(self, item_path: str, trust_watch: bool = True, deployed: bool = True) -> 'ItemPlan':
         """
-        Synchronize a single dotfile or directory.
-        Returns True if repo was modified.
+        Compare one item between home and repo and record what differs.
+        The returned plan carries the get_sync_info tuple plus the file-level
+        changes, so sync_item can act on it without comparing again.
+        Items a watch daemon reports unchanged are taken as in sync unless
+        trust_watch is False. Items deployed as links are only checked with
+        readlink, unless deployed is False (compare them as copies).
         """
-        if verbose:
-            log(f"\n{'-'*50}", Colors.CYAN)
-            log(f"Syncing: {item_path}", Colors.CYAN + Colors.BOLD)
-            log(f"{'-'*50}", Colors.CYAN)
+        if deployed and self._options_for(item_path).deploy != 'copy':
+            return ItemPlan(item_path, self.link_status(item_path))
+        if trust_watch and self._watch_says_clean(item_path):
+            return ItemPlan(item_path, self.IN_SYNC_INFO)
 
         home_path = self.home_dir / item_path
         repo_path = self.repo_dir / item_path
 
-        home_exists = home_path.exists()
-        repo_exists = repo_path.exists()
+        # An item missing on one side is copied back over, never deleted from
+        # the other: losing a whole tree (say ~/.config) must not reach the repo
+        info = self._presence_info(home_path, repo_path)
+        if info is not None:
+            return ItemPlan(item_path, info)
 
-        # Determine if it's a directory
-        is_directory = False
-        if home_exists:
-            is_directory = home_path.is_dir()
-        elif repo_exists:
-            is_directory = repo_path.is_dir()
+        if home_path.is_dir():
+            changes = self._differences(home_path, repo_path, item_path)
+        elif self.contents_match(home_path, repo_path):
+            changes = []
         else:
-            if verbose:
-                log_warning(f"'{item_path}' not found - skipping")
+            changes = [FileDiff(item_path, 'differs')]
+
+        if not changes:
+            return ItemPlan(item_path, self._record_status(item_path, self.IN_SYNC_INFO))
+        pinned = self._options_for(item_path).direction != 'auto'
+        base = None if pinned else self.load_snapshot(item_path, 'synced')
+        if base is not None:
+            return self._three_way_plan(item_path, changes, base)
+        return ItemPlan(item_path, self._direction_info(home_path, repo_path), changes)
+
+    def _changed_since(self, base: TreeSnapshot, item_path: str, rel_path: str, side: str) -> bool:
+        """Whether rel_path (and everything below it) on one side differs from the synced base"""
+        current = self.take_snapshot(rel_path, side, follow=rel_path == item_path)
+        return bool(base.subtree(rel_path).diff(current))
+
+    def _three_way_plan(self, item_path: str, changes: List[FileDiff],
+                        base: TreeSnapshot) -> 'ItemPlan':
+        """
+        Decide each differing entry against the item's last synced snapshot:
+        changed only in home goes to the repo, changed only in the repo goes
+        home (deletions included), and changed on both sides is a conflict
+        that is left alone. Only the entries involved are re-examined.
+        """
+        resolved = []
+        for change in changes:
+            home_changed = self._changed_since(base, item_path, change.rel_path, 'home')
+            repo_changed = self._changed_since(base, item_path, change.rel_path, 'repo')
+            if home_changed and not repo_changed:
+                direction = 'to_repo'
+            elif repo_changed and not home_changed:
+                direction = 'to_home'
+            else:
+                # Both changed, or the base cannot explain the difference
+                direction = 'conflict'
+            resolved.append(change._replace(direction=direction))
+        return ItemPlan(item_path, self._merge_info(resolved), resolved)
+
+    @staticmethod
+    def _merge_info(resolved: List[FileDiff]) -> tuple:
+        """Status tuple summing up the directions of a three-way plan's entries"""
+        directions = {change.direction for change in resolved}
+        conflicts = sum(1 for change in resolved if change.direction == 'conflict')
+        if conflicts:
+            info = ('conflict', f'Conflict in {conflicts} entr{"y" if conflicts == 1 else "ies"}',
+                    'merge', Colors.RED, '!')
+        elif directions == {'to_repo'}:
+            info = ('home_newer', 'Home changed → repo', 'update_repo', Colors.YELLOW, '←')
+        elif directions == {'to_home'}:
+            info = ('repo_newer', 'Repo changed → home', 'update_home', Colors.CYAN, '→')
+        else:
+            info = ('merge', 'Changed on both sides → merge', 'merge', Colors.BLUE, '⇄')
+        return info
+
+    @staticmethod
+    def _stat_verdict(entry1: Entry, entry2: Entry) -> Optional[bool]:
+        """
+        Judge two regular files from stat metadata alone: False if their sizes
+        differ, True if size and mtime both match (copy2 preserves mtimes),
+        None when only the mtime differs and the content has to decide.
+        """
+        if entry1.size != entry2.size:
             return False
+        if entry1.mtime_ns == entry2.mtime_ns:
+            return True
+        return None
+
+    def _quick_differs(self, dir1, dir2, rel_base: str) -> bool:
+        """
+        Decide whether two trees differ, reading file content only as a last
+        resort: the stat pass stops at the first definite difference (missing
+        entry, type or size change), and only the ambiguous files are
+        content-compared if it finds none.
+        """
+        ambiguous = []
+        stack = [(dir1, dir2, rel_base)]
+        while stack:
+            d1, d2, rel = stack.pop()
+            for kind, rel_path, e1, e2 in self._scan_pair(d1, d2, rel):
+                if kind == 'dir':
+                    stack.append((e1.path, e2.path, rel_path))
+                elif kind == 'file':
+                    verdict = self._stat_verdict(e1, e2)
+                    if verdict is False:
+                        return True
+                    if verdict is None:
+                        ambiguous.append((rel_path, e1, e2))
+                else:
+                    return True
+
+        batches = [ambiguous[i:i + self.COMPARE_BATCH]
+                   for i in range(0, len(ambiguous), self.COMPARE_BATCH)]
+        workers = self._workers(rel_base)
+        if workers > 1 and len(batches) > 1:
+            results = self._get_executor(workers).map(
+                lambda batch: self._compare_files(batch, True), batches)
+        else:
+            results = (self._compare_files(batch, True) for batch in batches)
+        return any(results)
+
+    @PROFILER.traced('status')
+    def fast_status(self, item_path: str, exact: bool = False) -> tuple:
+        """
+        Sync status for display only (status/doctor), same tuple as get_sync_info.
+        Items are classified from stat metadata first; file content is read only
+        for files whose size matches but mtime does not. exact=True forces a
+        full content comparison instead.
+        """
+        if self._options_for(item_path).deploy != 'copy':
+            return self.link_status(item_path)
+        if exact:
+            return self.plan_item(item_path, trust_watch=False).info
+        if self._watch_says_clean(item_path):
+            return self.IN_SYNC_INFO
+
+        home_path = self.home_dir / item_path
+        repo_path = self.repo_dir / item_path
+
+        if self._presence_info(home_path, repo_path) is not None:
+            # Cheap either way; plan_item keeps status and sync on one decision
+            return self.plan_item(item_path, trust_watch=False).info
+
+        if home_path.is_dir():
+            differs = self._quick_differs(home_path, repo_path, item_path)
+        else:
+            home_entry = stat_entry(home_path)
+            repo_entry = stat_entry(repo_path)
+            verdict = self._stat_verdict(home_entry, repo_entry)
+            if verdict is None:
+                differs = not self._files_match(home_path, repo_path, home_entry, repo_entry)
+            else:
+                differs = not verdict
+
+        if not differs:
+            # Decided from stat data, so not reported to the daemon (see _record_status)
+            return self.IN_SYNC_INFO
+        if (self._options_for(item_path).direction == 'auto'
+                and self._snapshot_path(item_path, 'synced').exists()):
+            # Direction comes from the three-way comparison, not mtimes
+            return self.plan_item(item_path, trust_watch=False).info
+        return self._direction_info(home_path, repo_path)
+
+    def get_sync_info(self, item_path: str) -> tuple:
+        """
+        Get information about sync status for an item.
+        Returns (status, description, action, color, symbol)
+        The underlying plan is kept so a following sync_item can reuse it.
+        """
+        plan = self.plan_item(item_path)
+        self.plans[item_path] = plan
+        return plan.info
+
+    def iter_diff(self, items: Iterable[str], context: int = 3) -> Iterator[tuple]:
+        """
+        Stream the differences between repo (a/) and home (b/) for items as
+        (kind, text) pairs: 'item' headers, unified diff 'line's and 'note's for
+        binaries, symlinks and type changes. Each item is compared with
+        plan_item, the same pass status uses, only when the consumer gets to
+        it, so the first diff is out before later items are even scanned.
+        Entries that exist on one side only are diffed against nothing, file
+        by file through whole directory trees.
+        """
+        for item in items:
+            plan = self.plan_item(item)
+            if plan.status == 'in_sync':
+                continue
+            yield 'item', f'--- {item} --- ({plan.info[1]})'
+            changes = plan.changes or [FileDiff(item, {'new_in_home': 'first_only',
+                                                       'new_in_repo': 'second_only'}
+                                                .get(plan.status, 'differs'))]
+            for change in changes:
+                yield from self._diff_entry(change.rel_path, context)
+
+    def _diff_entry(self, rel_path: str, context: int) -> Iterator[tuple]:
+        """Diff one changed path, descending into directories that differ in shape"""
+        repo_entry = self._diff_side(self.repo_dir / rel_path)
+        home_entry = self._diff_side(self.home_dir / rel_path)
+        repo_kind = repo_entry.kind if repo_entry else None
+        home_kind = home_entry.kind if home_entry else None
+
+        if 'link' in (repo_kind, home_kind):
+            if repo_kind == home_kind:
+                yield 'note', f'Symlink {rel_path}: {repo_entry.target} -> {home_entry.target}'
+            elif repo_kind is None or home_kind is None:
+                entry, side = (home_entry, 'home') if repo_kind is None else (repo_entry, 'repo')
+                yield 'note', f'Only in {side}: {rel_path} -> {entry.target}'
+            else:
+                yield 'note', f'Type changed: {rel_path} ({repo_kind or "missing"} -> {home_kind or "missing"})'
+            return
+        if 'dir' in (repo_kind, home_kind):
+            if repo_kind not in ('dir', None) or home_kind not in ('dir', None):
+                yield 'note', f'Type changed: {rel_path} ({repo_kind or "missing"} -> {home_kind or "missing"})'
+                return
+            repo_names = self._list_entries(repo_entry.path, rel_path) if repo_entry else {}
+            home_names = self._list_entries(home_entry.path, rel_path) if home_entry else {}
+            for name in sorted(repo_names.keys() | home_names.keys()):
+                yield from self._diff_entry(f'{rel_path}/{name}', context)
+            return
+        if repo_kind == 'other' or home_kind == 'other':
+            return
+
+        repo_lines = read_diff_lines(repo_entry.path if repo_entry else None)
+        home_lines = read_diff_lines(home_entry.path if home_entry else None)
+        if repo_lines is None or home_lines is None:
+            yield 'note', f'Binary files a/{rel_path} and b/{rel_path} differ'
+            return
+        if not repo_lines and not home_lines:
+            if repo_entry is None or home_entry is None:
+                side = 'home' if repo_entry is None else 'repo'
+                yield 'note', f'Only in {side}: {rel_path} (empty)'
+            return
+        import difflib
+        for line in difflib.unified_diff(
+                repo_lines, home_lines,
+                f'a/{rel_path}' if repo_entry else '/dev/null',
+                f'b/{rel_path}' if home_entry else '/dev/null',
+                n=context, lineterm=''):
+            yield 'line', line
+
+    def pending_changes(self, items: Iterable[str]) -> Optional[tuple]:
+        """
+        Predict from their plans, before anything is copied, what syncing items
+        will change in the repo: (fingerprint, diff digest) as taken by
+        GitSync.precompute_message, or None if nothing goes to the repo.
+        Home blob ids come from the content cache, so the fingerprint equals
+        GitSync.staged_fingerprint after the sync unless the repo worktree had
+        other changes.
+        """
+        roots = []
+        for item in items:
+            plan = self.plans.get(item)
+            if plan is None:
+                continue
+            if any(change.direction for change in plan.changes):
+                roots += [change.rel_path for change in plan.changes if change.direction == 'to_repo']
+            elif plan.action == 'add_to_repo':
+                roots.append(item)
+            elif plan.action == 'update_repo':
+                roots += [change.rel_path for change in plan.changes
+                          if change.kind in ('differs', 'first_only')]
+
+        changes = [change for root in roots for change in self._repo_bound(root)]
+        if not changes:
+            return None
+
+        def diff_lines() -> Iterator[str]:
+            for path, _ in sorted(changes):
+                yield f'diff --git a/{path} b/{path}'
+                for _, text in self._diff_entry(path, 3):
+                    yield text
 
+        return change_fingerprint(changes), summarize_diff(diff_lines())
+
+    def _repo_bound(self, rel_path: str) -> List[tuple]:
+        """
+        (path, blob id) for every file and symlink at rel_path in home, as the
+        repo will store them; (path, '-') for repo files that go away because
+        rel_path no longer exists in home.
+        """
+        side, root = 'home', self.home_dir
+        top = self._diff_side(root / rel_path)
+        if top is None:
+            side, root = 'repo', self.repo_dir
+            top = self._diff_side(root / rel_path)
+            if top is None:
+                return []
+
+        changes = []
+        stack = [(rel_path, top)]
+        while stack:
+            path, entry = stack.pop()
+            if entry.kind == 'dir':
+                stack += [(f'{path}/{name}', child)
+                          for name, child in self._list_entries(entry.path, path).items()]
+            elif side == 'repo':
+                if entry.kind in ('file', 'link'):
+                    changes.append((path, '-'))
+            elif entry.kind == 'link':
+                target = os.fsencode(entry.target)
+                changes.append((path, hashlib.sha1(b'blob %d\0' % len(target) + target).hexdigest()))
+            elif entry.kind == 'file':
+                changes.append((path, self.cache.digest('home', path, entry.path, entry.signature)))
+        return changes
+
+    @staticmethod
+    def _diff_side(path: Path) -> Optional[Entry]:
+        """Entry for one side of a diff without following symlinks, or None if missing"""
         try:
-            # Case 1: Only in home (add to repo)
-            if home_exists and not repo_exists:
+            st = os.lstat(path)
+        except FileNotFoundError:
+            return None
+        if stat_module.S_ISLNK(st.st_mode):
+            return Entry(path.name, os.fspath(path), 'link', target=os.readlink(path))
+        if stat_module.S_ISDIR(st.st_mode):
+            return Entry(path.name, os.fspath(path), 'dir')
+        if stat_module.S_ISREG(st.st_mode):
+            return Entry(path.name, os.fspath(path), 'file', st.st_size,
+                         st.st_mtime_ns, st.st_ino, st.st_mode)
+        return Entry(path.name, os.fspath(path), 'other')
+
+    def _apply_plan(self, plan: 'ItemPlan', src_root: Path, dest_root: Path,
+                    source_kind: str) -> 'CopyStats':
+        """
+        Copy the entries a plan marked as differing or source-only from src_root
+        to dest_root. Entries that exist only at the destination are left alone,
+        matching the merge semantics of copy_directory_contents.
+        """
+        stats = CopyStats()
+        touched_dirs = set()
+        for change in plan.changes:
+            if change.kind not in ('differs', source_kind):
+                continue
+            src = src_root / change.rel_path
+            dest = dest_root / change.rel_path
+            if src.is_dir() and not src.is_symlink():
+                self.copy_directory_contents(src, dest, change.rel_path, stats)
+            else:
+                stats.bytes_written += self.copy_file(src, dest)
+                stats.copied += 1
+
+            parent = posixpath.dirname(change.rel_path)
+            while parent == plan.item or parent.startswith(plan.item + '/'):
+                touched_dirs.add(parent)
+                parent = posixpath.dirname(parent)
+
+        # Stamp touched directories with their source metadata, deepest first,
+        # as a full copy_directory_contents pass would
+        for rel_dir in sorted(touched_dirs, key=len, reverse=True):
+            shutil.copystat(src_root / rel_dir, dest_root / rel_dir)
+        return stats
+
+    @staticmethod
+    def _remove_path(path: Path):
+        """Delete a file, symlink or directory tree"""
+        if path.is_dir() and not path.is_symlink():
+            shutil.rmtree(path)
+        else:
+            path.unlink()
+
+    def directory_deletions(self, plan: 'ItemPlan') -> List[FileDiff]:
+        """Entries of a three-way plan that would delete a whole directory"""
+        deletions = []
+        for change in plan.changes:
+            if change.direction not in ('to_repo', 'to_home'):
+                continue
+            src_root, dest_root = ((self.home_dir, self.repo_dir) if change.direction == 'to_repo'
+                                   else (self.repo_dir, self.home_dir))
+            dest = dest_root / change.rel_path
+            if not os.path.lexists(src_root / change.rel_path) \
+                    and dest.is_dir() and not dest.is_symlink():
+                deletions.append(change)
+        return deletions
+
+    def _apply_merge(self, plan: 'ItemPlan', verbose: bool = True) -> tuple:
+        """
+        Carry out a three-way plan: each resolved entry is copied (or deleted)
+        in its own direction, conflicts are reported and left untouched.
+        Directories are only deleted once confirmed (see confirmed_deletions).
+        Returns (CopyStats, whether the repo was modified).
+        """
+        stats = CopyStats()
+        repo_modified = False
+        for change in plan.changes:
+            if change.direction == 'conflict':
                 if verbose:
-                    log_info(f"Adding to repo from home")
-                if is_directory:
-                    repo_path.mkdir(parents=True, exist_ok=True)
-                    self.copy_directory_contents(home_path, repo_path, item_path)
-                else:
-                    self.copy_file(home_path, repo_path)
+                    log_warning(f"Conflict: {change.rel_path} changed in home and repo - left alone")
+                continue
+            if change.direction == 'to_repo':
+                src, dest = self.home_dir / change.rel_path, self.repo_dir / change.rel_path
+            else:
+                src, dest = self.repo_dir / change.rel_path, self.home_dir / change.rel_path
+
+            src_is_dir = src.is_dir() and (change.rel_path == plan.item or not src.is_symlink())
+            if not os.path.lexists(src) and dest.is_dir() and not dest.is_symlink() \
+                    and change.rel_path not in self.confirmed_deletions:
                 if verbose:
-                    log_success(f"Added to repository")
-                return True
+                    log_warning(f"{change.rel_path}/ is gone from one side - "
+                                f"not deleting the directory without confirmation")
+                continue
+            if change.direction == 'to_repo':
+                repo_modified = True
+            if not os.path.lexists(src):
+                self._remove_path(dest)
+                stats.deleted += 1
+                continue
+            if os.path.lexists(dest) and src_is_dir != (dest.is_dir() and not dest.is_symlink()):
+                self._remove_path(dest)
+            if src_is_dir:
+                self.copy_directory_contents(src, dest, change.rel_path, stats)
+            else:
+                stats.bytes_written += self.copy_file(src, dest)
+                stats.copied += 1
+        return stats, repo_modified
 
-            # Case 2: Only in repo (copy to home)
-            elif repo_exists and not home_exists:
+    def _link_state(self, home_path: Path, repo_path: Path) -> str:
+        """
+        How home_path stands against the repo entry it should link to:
+        'ok', 'missing', 'copy' (a real file or directory), 'foreign' (a link
+        somewhere else) or 'broken' (a link to a repo entry that is gone)
+        """
+        try:
+            target = os.readlink(home_path)
+        except FileNotFoundError:
+            return 'missing'
+        except OSError:
+            # Not a link itself, but possibly reached through a linked parent
+            if os.path.realpath(home_path) == os.path.realpath(repo_path):
+                return 'ok'
+            return 'copy'
+        if target != os.fspath(repo_path) and os.path.realpath(home_path) != os.path.realpath(repo_path):
+            return 'foreign'
+        return 'ok' if os.path.lexists(repo_path) else 'broken'
+
+    def _link_pairs(self, item_path: str) -> Iterator[tuple]:
+        """
+        (rel_path, home path, repo path) for each link an item needs: the item
+        itself in 'link' mode, every repo file and symlink under it in 'farm' mode.
+        Farm links in home whose repo file has gone are included too, so they
+        show up as broken.
+        """
+        repo_path = self.repo_dir / item_path
+        if self._options_for(item_path).deploy == 'link' or not repo_path.is_dir() \
+                or self._link_state(self.home_dir / item_path, repo_path) == 'ok':
+            yield item_path, self.home_dir / item_path, repo_path
+            return
+        stack = [(os.fspath(repo_path), item_path)]
+        while stack:
+            directory, rel_base = stack.pop()
+            entries = self._list_entries(directory, rel_base)
+            for name, entry in sorted(entries.items()):
+                rel_path = f'{rel_base}/{name}'
+                if entry.kind == 'dir':
+                    stack.append((entry.path, rel_path))
+                elif entry.kind in ('file', 'link'):
+                    yield rel_path, self.home_dir / rel_path, Path(entry.path)
+            try:
+                home_entries = list(os.scandir(self.home_dir / rel_base))
+            except OSError:
+                continue
+            for home_entry in home_entries:
+                stale = Path(directory, home_entry.name)
+                if home_entry.name not in entries and home_entry.is_symlink() \
+                        and os.readlink(home_entry.path) == os.fspath(stale):
+                    yield f'{rel_base}/{home_entry.name}', Path(home_entry.path), stale
+
+    def link_status(self, item_path: str) -> tuple:
+        """
+        Status tuple for an item deployed as links, from readlink alone (one
+        call for 'link', one per file for 'farm'): in sync when every link
+        points into the repo, otherwise what deploy_item would do about it.
+        Broken and foreign links are reported and never touched.
+        """
+        home_path = self.home_dir / item_path
+        if not os.path.lexists(self.repo_dir / item_path):
+            if self._link_state(home_path, self.repo_dir / item_path) == 'broken':
+                return ('broken_link', 'Links to a repo entry that is gone', 'skip', Colors.RED, '✗')
+            stale = self._stale_farm_links(item_path)
+            if stale:
+                return ('broken_link', f"{stale} broken link(s), item gone from repo", 'skip',
+                        Colors.RED, '✗')
+            if os.path.lexists(home_path) and not os.path.islink(home_path):
+                return ('needs_adopt', 'Only in home → adopt into repo and link', 'adopt',
+                        Colors.YELLOW, '←')
+            return ('not_found', 'Not found', 'skip', Colors.RESET, '?')
+
+        states: Dict[str, int] = {}
+        foreign = None
+        for rel_path, home, repo in self._link_pairs(item_path):
+            state = self._link_state(home, repo)
+            states[state] = states.get(state, 0) + 1
+            if state == 'foreign' and foreign is None:
+                foreign = f'{rel_path} -> {os.readlink(home)}'
+
+        if states.get('broken'):
+            return ('broken_link', f"{states['broken']} broken link(s)", 'skip', Colors.RED, '✗')
+        if foreign:
+            return ('foreign_link', f'Linked elsewhere: {foreign}', 'skip', Colors.RED, '✗')
+        if states.get('copy'):
+            return ('needs_adopt', f"{states['copy']} copy(ies) in home → adopt as links", 'adopt',
+                    Colors.YELLOW, '←')
+        if states.get('missing'):
+            return ('not_linked', f"{states['missing']} link(s) to create", 'link', Colors.BLUE, '→')
+        return ('in_sync', 'Linked', 'skip', Colors.GREEN, '✓')
+
+    def _stale_farm_links(self, item_path: str) -> int:
+        """Links under a home directory that point into an item the repo no longer has"""
+        home_path = self.home_dir / item_path
+        if os.path.islink(home_path) or not home_path.is_dir():
+            return 0
+        prefix = os.fspath(self.repo_dir / item_path) + os.sep
+        stale = 0
+        for dirpath, dirnames, filenames in os.walk(home_path):
+            for name in dirnames + filenames:
+                path = os.path.join(dirpath, name)
+                if os.path.islink(path) and os.readlink(path).startswith(prefix) \
+                        and not os.path.exists(path):
+                    stale += 1
+        return stale
+
+    def orphaned_links(self, items: Iterable[str]) -> List[tuple]:
+        """
+        (item, status tuple) for configured link/farm items that are not among
+        items because the repo no longer has them, but that home still links to
+        """
+        known = set(items)
+        orphans = []
+        for item, options in sorted(self.item_options.items()):
+            if options.deploy == 'copy' or item in known or os.path.lexists(self.repo_dir / item):
+                continue
+            info = self.link_status(item)
+            if info[0] == 'broken_link':
+                orphans.append((item, info))
+        return orphans
+
+    def _adoption_plan(self, item_path: str) -> 'ItemPlan':
+        """
+        Copy plan for adopting an item's home copies before they become links.
+        A 'farm' item only links the files the repo has, so only copies of
+        those count: a file missing from home is a link to create rather than
+        a deletion, files only in home are not the farm's business, and links
+        already in place are not copies.
+        """
+        plan = self.plan_item(item_path, trust_watch=False, deployed=False)
+        if self._options_for(item_path).deploy != 'farm' \
+                or not os.path.lexists(self.repo_dir / item_path):
+            return plan
+        changes = [change for change in plan.changes if change.kind == 'differs' and self._link_state(
+            self.home_dir / change.rel_path, self.repo_dir / change.rel_path) == 'copy']
+        if not changes:
+            return ItemPlan(item_path, self.IN_SYNC_INFO)
+        if any(change.direction for change in changes):
+            return ItemPlan(item_path, self._merge_info(changes), changes)
+        return ItemPlan(item_path, plan.info, changes)
+
+    def deploy_item(self, item_path: str, verbose: bool = True) -> bool:
+        """
+        Deploy an item as links into the repo. Copies in home are adopted
+        first, through the same plan a copy sync would use (see
+        _adoption_plan), so home edits reach the repo, repo edits reach home
+        and anything changed on both sides since the last sync is a conflict
+        that is left alone. A copy is then swapped for a link only if it
+        matches the repo exactly; anything else in the way is left alone
+        with a warning. Returns True if the repo was modified.
+        """
+        home_path = self.home_dir / item_path
+        repo_path = self.repo_dir / item_path
+        repo_modified = False
+
+        if not os.path.lexists(repo_path) or self._link_state(home_path, repo_path) == 'copy':
+            plan = self._adoption_plan(item_path)
+            if plan.status not in ('in_sync', 'not_found', 'type_mismatch'):
                 if verbose:
-                    log_info(f"Copying to home from repo")
-                if is_directory:
-                    home_path.mkdir(parents=True, exist_ok=True)
-                    self.copy_directory_contents(repo_path, home_path, item_path)
-                else:
-                    self.copy_file(repo_path, home_path)
+                    log_info(f"Adopting the copy in home ({plan.info[1]})")
+                repo_modified = self._sync_copy(item_path, plan, verbose)
+
+        linked = kept = 0
+        for rel_path, home, repo in self._link_pairs(item_path):
+            state = self._link_state(home, repo)
+            if state == 'ok':
+                continue
+            if state == 'copy' and not self._same_entry(home, repo):
                 if verbose:
-                    log_success(f"Copied to home")
-                return False
+                    log_warning(f"{rel_path} differs from the repo - keeping the copy")
+                kept += 1
+                continue
+            if state in ('foreign', 'broken'):
+                if verbose:
+                    log_warning(f"{rel_path} is a {state} link - left alone")
+                kept += 1
+                continue
+            self._replace_with_link(home, repo)
+            linked += 1
+        if verbose:
+            log_success(f"Linked {linked} path(s) into the repo"
+                        + (f", {kept} left as they were" if kept else ""))
+        return repo_modified
+
+    def _same_entry(self, home: Path, repo: Path) -> bool:
+        """Whether a home copy can be replaced by a link to repo without losing anything"""
+        if os.path.islink(repo):
+            return os.path.islink(home) and os.readlink(home) == os.readlink(repo)
+        if home.is_dir() != repo.is_dir():
+            return False
+        if home.is_dir():
+            # Ignored files (caches, history) only live in home; a link would drop them
+            for dirpath, dirnames, filenames in os.walk(home):
+                rel = os.path.relpath(dirpath, home)
+                for name in dirnames + filenames:
+                    if not os.path.lexists(os.path.join(repo, rel, name)):
+                        return False
+        return self.contents_match(home, repo)
 
-            # Case 3: Exists in both
-            elif home_exists and repo_exists:
-                home_is_dir = home_path.is_dir()
-                repo_is_dir = repo_path.is_dir()
-
-                if home_is_dir != repo_is_dir:
-                    if verbose:
-                        log_error(f"Type mismatch - skipping")
-                    return False
-
-                if self.contents_match(home_path, repo_path):
-                    if verbose:
-                        log_success("Already in sync")
-                    return False
-
-                # Sync based on which is newer
-                if self.is_newer(repo_path, home_path):
-                    if verbose:
-                        log_info("Updating home from repo")
-                    if is_directory:
-                        self.copy_directory_contents(repo_path, home_path, item_path)
-                    else:
-                        self.copy_file(repo_path, home_path)
-                    if verbose:
-                        log_success("Home updated")
-                    return False
-                else:
-                    if verbose:
-                        log_info("Updating repo from home")
-                    if is_directory:
-                        self.copy_directory_contents(home_path, repo_path, item_path)
-                    else:
-                        self.copy_file(home_path, repo_path)
-                    if verbose:
-                        log_success("Repo updated")
-                    return True
+    @staticmethod
+    def _replace_with_link(home: Path, repo: Path):
+        """
+        Make home a symlink to repo in place of whatever is there. Files are
+        swapped in one rename; a directory is moved aside first and deleted
+        once the link is in place (and moved back if that fails).
+        """
+        home.parent.mkdir(parents=True, exist_ok=True)
+        link = temp_path_for(home)
+        os.symlink(repo, link)
+        aside = None
+        try:
+            if home.is_dir() and not home.is_symlink():
+                aside = temp_path_for(home)
+                os.rename(home, aside)
+            os.replace(link, home)
+        except BaseException:
+            if aside is not None and not os.path.lexists(home):
+                os.rename(aside, home)
+            if os.path.lexists(link):
+                os.unlink(link)
+            raise
+        if aside is not None:
+            shutil.rmtree(aside)
+
+    @PROFILER.traced('sync')
+    def sync_item(self, item_path: str, verbose: bool = True) -> bool:
+        """
+        Synchronize a single dotfile or directory.
+        Returns True if repo was modified.
+        """
+        if verbose:
+            log(f"\n{'-'*50}", Colors.CYAN)
+            log(f"Syncing: {item_path}", Colors.CYAN + Colors.BOLD)
+            log(f"{'-'*50}", Colors.CYAN)
+
+        # Reuse the plan from the status pass when there is one
+        plan = self.plans.pop(item_path, None) or self.plan_item(item_path)
+
+        if plan.status == 'not_found':
+            if verbose:
+                log_warning(f"'{item_path}' not found - skipping")
+            return False
 
+        try:
+            if plan.action in ('link', 'adopt'):
+                return self.deploy_item(item_path, verbose)
+            return self._sync_copy(item_path, plan, verbose)
         except Exception as e:
             if verbose:
                 log_error(f"Error: {e}")
             return False
+        finally:
+            self.fsync_batch.flush()
 
-        return False
+    def _sync_copy(self, item_path: str, plan: 'ItemPlan', verbose: bool = True) -> bool:
+        """Carry out a plan by copying between home and repo; True if the repo was modified"""
+        home_path = self.home_dir / item_path
+        repo_path = self.repo_dir / item_path
 
-    def sync_all(self, interactive: bool = False):
+        # Three-way plans carry a direction per entry
+        if any(change.direction for change in plan.changes):
+            if verbose:
+                log_info(f"Merging changes since last sync ({plan.info[1]})")
+            stats, repo_modified = self._apply_merge(plan, verbose)
+            if verbose:
+                log_success(f"Merged ({stats})")
+            return repo_modified
+
+        # Case 1: Only in home (add to repo)
+        if plan.action == 'add_to_repo':
+            if verbose:
+                log_info(f"Adding to repo from home")
+            if home_path.is_dir():
+                repo_path.mkdir(parents=True, exist_ok=True)
+                stats = self.copy_directory_contents(home_path, repo_path, item_path)
+            else:
+                stats = CopyStats.single(self.copy_file(home_path, repo_path))
+            if verbose:
+                log_success(f"Added to repository ({stats})")
+            return True
+
+        # Case 2: Only in repo (copy to home)
+        elif plan.action == 'copy_to_home':
+            if verbose:
+                log_info(f"Copying to home from repo")
+            if repo_path.is_dir():
+                home_path.mkdir(parents=True, exist_ok=True)
+                stats = self.copy_directory_contents(repo_path, home_path, item_path)
+            else:
+                stats = CopyStats.single(self.copy_file(repo_path, home_path))
+            if verbose:
+                log_success(f"Copied to home ({stats})")
+            return False
+
+        # Case 3: Exists in both
+        elif plan.status == 'type_mismatch':
+            if verbose:
+                log_error(f"Type mismatch - skipping")
+            return False
+
+        elif plan.status == 'in_sync':
+            if verbose:
+                log_success("Already in sync")
+            return False
+
+        # Sync based on which is newer, copying only what the plan found
+        elif plan.action == 'update_home':
+            if verbose:
+                log_info("Updating home from repo")
+            stats = self._apply_plan(plan, self.repo_dir, self.home_dir, 'second_only')
+            if verbose:
+                log_success(f"Home updated ({stats})")
+            return False
+        else:
+            if verbose:
+                log_info("Updating repo from home")
+            stats = self._apply_plan(plan, self.home_dir, self.repo_dir, 'first_only')
+            if verbose:
+                log_success(f"Repo updated ({stats})")
+            return stats.copied > 0
+
+    def prepare(self) -> List[str]:
+        """
+        Discover items and compute their plans ahead of sync_all, e.g. while a
+        background git fetch is running. Call invalidate() if the repo changes
+        in between (a pull).
+        """
+        with PROFILER.span('discover'):
+            self.items = self.discover_dotfiles()
+        with PROFILER.span('status'):
+            for item in self.items:
+                self.plans[item] = self.plan_item(item)
+        return self.items
+
+    def invalidate(self):
+        """Forget discovered items and plans so the next pass starts fresh"""
+        self.items = None
+        self.plans.clear()
+        if self.cache.index is not None:
+            self.cache.index.reset()
+
+    def sync_all(self, interactive: bool = False,
+                 on_selected: Optional[Callable[[List[str]], None]] = None):
         """
         Synchronize dotfiles. By default syncs all actionable items.
         With interactive=True, prompts for each item.
+        Reuses items and plans from prepare() when available.
+        on_selected is called with the items about to be synced, while their
+        plans are still available and before anything is copied.
+        """
+        selected_items = self.select_items(interactive)
+        if not selected_items:
+            return
+        if on_selected is not None:
+            on_selected(selected_items)
+        self.sync_selected(selected_items)
+
+    def select_items(self, interactive: bool = False) -> List[str]:
+        """
+        The selection half of sync_all: list every item with its status and
+        pick the ones to sync, asking where needed. This is where all of a
+        sync's prompts happen. Items found in sync are recorded as synced.
         """
         log(f"\n{'='*50}", Colors.HEADER)
         log("DISCOVERING DOTFILES", Colors.HEADER + Colors.BOLD)
         log(f"{'='*50}\n", Colors.HEADER)
 
-        items = self.discover_dotfiles()
+        with PROFILER.span('discover'):
+            items = self.items if self.items is not None else self.discover_dotfiles()
 
         if not items:
             log_warning("No dotfiles found in repository")
-            return
+            return []
 
         log_info(f"Found {len(items)} dotfile(s) in repository\n")
 
         # Display all items with status
         item_info = []
-        for i, item in enumerate(items, 1):
-            status, description, action, color, symbol = self.get_sync_info(item)
-            item_info.append((item, status, description, action))
-            log(f"{color}{symbol} [{i:2d}] {item:30s} {description}{Colors.RESET}")
+        with PROFILER.span('status'):
+            for i, item in enumerate(items, 1):
+                plan = self.plans.get(item)
+                status, description, action, color, symbol = (
+                    plan.info if plan else self.get_sync_info(item)
+                )
+                item_info.append((item, status, description, action))
+                log(f"{color}{symbol} [{i:2d}] {item:30s} {description}{Colors.RESET}")
 
         # Collect items that need syncing
         actionable = [(item, status, description, action)
                       for item, status, description, action in item_info
                       if action != 'skip']
 
+        # Items in sync become the base for the next three-way comparison
+        in_sync = [item for item, status, description, action in item_info if status == 'in_sync']
+        with PROFILER.span('snapshot'):
+            self.record_synced(in_sync, verified=True)
+
         if not actionable:
             log_info("\nAll dotfiles are in sync")
-            return
+            return []
 
         if interactive:
             log(f"\n{'-'*50}\n", Colors.CYAN)
@@ -670,7 +3537,7 @@ class DotfileSync:
 
             if not selected_items:
                 log_warning("\nNo items selected for sync")
-                return
+                return []
         else:
             selected_items = []
             for item, status, description, action in actionable:
@@ -684,75 +3551,783 @@ class DotfileSync:
                         continue
                 selected_items.append(item)
 
+        for item in selected_items:
+            self._confirm_deletions(item)
+        return selected_items
+
+    def sync_selected(self, items: List[str]):
+        """The copy half of sync_all: sync items from select_items, without prompting"""
         log(f"\n{'='*50}", Colors.HEADER)
-        log(f"SYNCING {len(selected_items)} ITEM(S)", Colors.HEADER + Colors.BOLD)
+        log(f"SYNCING {len(items)} ITEM(S)", Colors.HEADER + Colors.BOLD)
         log(f"{'='*50}\n", Colors.HEADER)
 
-        for item in selected_items:
-            if self.sync_item(item):
-                self.repo_modified = True
+        with PROFILER.span('copy'):
+            if self.jobs > 1 and len(items) > 1:
+                modified = self._sync_items_parallel(items)
+            else:
+                modified = [self.sync_item(item) for item in items]
+        if any(modified):
+            self.repo_modified = True
 
+        with PROFILER.span('snapshot'):
+            self.record_synced(items)
 
-def main():
-    """Main entry point"""
-    parser = argparse.ArgumentParser(description="Dotfiles synchronization tool")
-    parser.add_argument("-i", "--interactive", action="store_true",
-                        help="Prompt before syncing each item (default: sync all)")
-    args = parser.parse_args()
+    def _confirm_deletions(self, item: str):
+        """Ask, before any copying starts, whether directories gone on one side may go on the other"""
+        plan = self.plans.get(item)
+        if plan is None:
+            return
+        for change in self.directory_deletions(plan):
+            gone, side = ('home', 'repo') if change.direction == 'to_repo' else ('repo', 'home')
+            log_warning(f"'{change.rel_path}' was deleted in {gone} since the last sync")
+            if prompt_yes_no(f"Delete directory {Colors.BOLD}{change.rel_path}{Colors.RESET} "
+                             f"from {side} too?", default=False):
+                self.confirmed_deletions.add(change.rel_path)
+            else:
+                log(f"  Kept {change.rel_path}", Colors.RESET)
 
-    log(f"\n{'#'*50}", Colors.HEADER + Colors.BOLD)
-    log("DOTFILES UPDATE UTILITY", Colors.HEADER + Colors.BOLD)
-    log(f"{'#'*50}\n", Colors.HEADER + Colors.BOLD)
+    def _sync_one_captured(self, item: str) -> tuple:
+        """Run sync_item on a worker thread, returning (repo_modified, log lines)"""
+        with captured_output() as lines:
+            modified = self.sync_item(item)
+        return modified, lines
 
-    # Determine directories
-    home_dir = Path.home()
-    repo_dir = Path(__file__).parent.resolve()
+    def _sync_items_parallel(self, items: List[str]) -> List[bool]:
+        """
+        Sync independent items concurrently. Each item's log output is buffered
+        and printed as one block, in the original item order, once it finishes.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        # A separate pool from the comparison workers, so an item waiting on a
+        # comparison can never starve the pool it is waiting on
+        with ThreadPoolExecutor(max_workers=self.jobs,
+                                thread_name_prefix='dotupdate-sync') as pool:
+            futures = [pool.submit(self._sync_one_captured, item) for item in items]
+            modified = []
+            for future in futures:
+                item_modified, lines = future.result()
+                for line in lines:
+                    print(line)
+                modified.append(item_modified)
+        return modified
+
+
+class WatchState:
+    """
+    Dirty-item bookkeeping shared by a watcher backend and the socket server.
+    Every change bumps a generation counter; an item is only cleared when a
+    client confirms it in sync as of a generation at or after its last change.
+    """
 
-    log_info(f"Home: {home_dir}")
-    log_info(f"Repo: {repo_dir}")
+    def __init__(self, items: List[str]):
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.items = set(items)
+        self.dirty = set(items)
+        self.unwatched: Set[str] = set()
+        self.changed_at: Dict[str, int] = {item: 0 for item in items}
+
+    def mark(self, items):
+        """Record a change to the given items"""
+        with self.lock:
+            self.generation += 1
+            for item in items:
+                if item in self.items:
+                    self.dirty.add(item)
+                    self.changed_at[item] = self.generation
+
+    def set_items(self, items: List[str]):
+        """Replace the tracked item set; newly discovered items start dirty"""
+        with self.lock:
+            self.generation += 1
+            added = set(items) - self.items
+            self.items = set(items)
+            self.dirty = (self.dirty & self.items) | added
+            for item in added:
+                self.changed_at[item] = self.generation
+
+    def set_unwatched(self, items: Set[str]):
+        """Items the backend could not watch; they stay dirty until it can"""
+        with self.lock:
+            self.unwatched = set(items)
+            self.dirty |= self.unwatched & self.items
+
+    def clean(self, items, generation: int):
+        """Clear items a client verified in sync as of the given generation"""
+        with self.lock:
+            for item in items:
+                if self.changed_at.get(item, 0) <= generation and item not in self.unwatched:
+                    self.dirty.discard(item)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'generation': self.generation,
+                'items': sorted(self.items),
+                'dirty': sorted(self.dirty),
+            }
+
+
+class InotifyWatcher:
+    """Linux inotify backend: one watch per directory under each tracked item"""
+
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+
+    MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+            | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+    MEMBERSHIP = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+    EVENT = struct.Struct('iIII')
+
+    def __init__(self, dotfiles: 'DotfileSync', state: WatchState):
+        import ctypes
+
+        self.dotfiles = dotfiles
+        self.state = state
+        self.libc = ctypes.CDLL(None, use_errno=True)
+        # Raises AttributeError where inotify does not exist (macOS)
+        self.fd = self.libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        # wd -> (directory, [(item or None for membership, name filter, rel_dir, root)]);
+        # root is set on ancestor watches standing in for an item's missing parent
+        self.watches: Dict[int, tuple] = {}
+        self.rediscover = False
+        # (root, item) pairs whose watches could not be set up
+        self.failed: Set[tuple] = set()
+
+    def _add_watch(self, directory: Path, item: Optional[str], name: Optional[str] = None,
+                   rel_dir: str = '', root: Optional[Path] = None):
+        """Watch a directory on behalf of an item (optionally only one entry name)"""
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK)
+        if wd < 0:
+            import ctypes
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_add_watch {directory}: {os.strerror(err)}")
+        owners = self.watches.setdefault(wd, (directory, []))[1]
+        if (item, name, rel_dir, root) not in owners:
+            owners.append((item, name, rel_dir, root))
+
+    def _watch_tree(self, directory: Path, item: str, rel_dir: str):
+        """Watch a directory and every non-ignored subdirectory below it"""
+        self._add_watch(directory, item, None, rel_dir)
+        for name, entry in self.dotfiles._list_entries(directory, rel_dir).items():
+            if entry.kind == 'dir':
+                self._watch_tree(Path(entry.path), item, f'{rel_dir}/{name}')
+
+    def _arm(self, root: Path, item: str):
+        """
+        Watch an item under root: its parent (which sees the item itself being
+        created or replaced) and its whole tree. While the parent does not
+        exist, the nearest existing ancestor is watched for the next path
+        component instead, and arming resumes once that appears.
+        """
+        path = root / item
+        ancestor = path.parent
+        while not ancestor.is_dir() and ancestor != ancestor.parent:
+            ancestor = ancestor.parent
+        if ancestor != path.parent:
+            self._add_watch(ancestor, item, path.relative_to(ancestor).parts[0], root=root)
+            return
+        self._add_watch(path.parent, item, path.name, posixpath.dirname(item))
+        if path.is_dir() and not path.is_symlink():
+            self._watch_tree(path, item, item)
 
-    # Verify repo is a git repository
-    if not (repo_dir / ".git").exists():
-        log_error(f"{repo_dir} is not a git repository")
-        sys.exit(1)
+    def _rearm(self, root: Path, item: str):
+        """
+        Arm an item again after part of its path appeared or its watch went
+        away. The item is marked only afterwards, so whatever changed before
+        the new watches existed is still re-checked.
+        """
+        try:
+            self._arm(root, item)
+            self.failed.discard((root, item))
+        except OSError as e:
+            log_warning(f"watch: {e}")
+            self.failed.add((root, item))
+        self.state.set_unwatched({failed_item for _, failed_item in self.failed})
+        self.state.mark([item])
+
+    def watch_items(self, items: List[str]):
+        """Set up watches for items on both sides, plus discovery membership"""
+        repo_dir = self.dotfiles.repo_dir
+        for directory in (repo_dir, repo_dir / '.config'):
+            if directory.is_dir():
+                self._add_watch(directory, None)
+        for item in items:
+            for root in (self.dotfiles.home_dir, self.dotfiles.repo_dir):
+                self._arm(root, item)
+
+    def _reset(self):
+        """Drop every watch so the next watch_items starts over"""
+        for wd in list(self.watches):
+            self.libc.inotify_rm_watch(self.fd, wd)
+        self.watches.clear()
+        self.failed.clear()
+        self.state.set_unwatched(set())
+
+    def _root_of(self, directory: Path) -> Path:
+        """The side (repo or home) a watched directory belongs to"""
+        repo_dir = self.dotfiles.repo_dir
+        # The repo usually lives inside home, so test it first
+        if directory == repo_dir or repo_dir in directory.parents:
+            return repo_dir
+        return self.dotfiles.home_dir
+
+    def _handle(self, wd: int, mask: int, name: str):
+        """Translate one event into dirty items (and new watches for new directories)"""
+        if mask & self.IN_Q_OVERFLOW:
+            # Events were lost, directory creations among them: start over
+            self.state.mark(self.state.items)
+            self.rediscover = True
+            return
+        if mask & self.IN_IGNORED:
+            # The directory went away (or was unmounted): watch from further up
+            directory, owners = self.watches.pop(wd, (None, []))
+            for item in {owner[0] for owner in owners if owner[0] is not None}:
+                self._rearm(self._root_of(directory), item)
+            return
+        directory, owners = self.watches.get(wd, (None, []))
+        for item, only_name, rel_dir, root in list(owners):
+            if item is None:
+                if name and mask & self.MEMBERSHIP:
+                    self.rediscover = True
+                continue
+            if only_name is not None and name != only_name:
+                continue
+            if root is not None:
+                # Ancestor watch: the next component of a missing path changed
+                if mask & self.IN_ISDIR and mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    self._rearm(root, item)
+                continue
+            rel_path = f'{rel_dir}/{name}' if rel_dir and name else rel_dir or name
+            if name and self.dotfiles._ignored(rel_path, bool(mask & self.IN_ISDIR)):
+                continue
+            self.state.mark([item])
+            if mask & self.IN_ISDIR and mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                self._watch_tree(directory / name, item, rel_path)
+                # Entries created before the new watches existed went unseen
+                self.state.mark([item])
+
+    def process(self, data: bytes):
+        """Dispatch one read's worth of events"""
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = self.EVENT.unpack_from(data, offset)
+            offset += self.EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            try:
+                self._handle(wd, mask, name)
+            except OSError as e:
+                log_warning(f"watch: {e}")
+        if self.rediscover:
+            self.rediscover = False
+            self.state.set_items(self.dotfiles.discover_dotfiles())
+            self._reset()
+            self.watch_items(sorted(self.state.items))
+
+    def run(self):
+        """Read and dispatch events forever (after watch_items)"""
+        while True:
+            self.process(os.read(self.fd, 64 * 1024))
+
+
+class PollingWatcher:
+    """Portable backend: periodically re-stats each item and compares signatures"""
+
+    def __init__(self, dotfiles: 'DotfileSync', state: WatchState, interval: float):
+        self.dotfiles = dotfiles
+        self.state = state
+        self.interval = interval
+        self.signatures: Dict[str, int] = {}
+
+    def _signature(self, item: str) -> int:
+        """Hash of type, size and mtime for every entry of an item on both sides"""
+        records = []
+        for root in (self.dotfiles.home_dir, self.dotfiles.repo_dir):
+            path = root / item
+            try:
+                st = os.lstat(path)
+            except OSError:
+                records.append((str(path), None))
+                continue
+            records.append((str(path), st.st_mode, st.st_size, st.st_mtime_ns))
+            stack = [(path, item)] if stat_module.S_ISDIR(st.st_mode) else []
+            while stack:
+                directory, rel_path = stack.pop()
+                for name, entry in self.dotfiles._list_entries(directory, rel_path).items():
+                    records.append(entry)
+                    if entry.kind == 'dir':
+                        stack.append((entry.path, f'{rel_path}/{name}'))
+        return hash(tuple(records))
+
+    def run(self):
+        """Poll forever"""
+        while True:
+            items = self.dotfiles.discover_dotfiles()
+            self.state.set_items(items)
+            changed = []
+            for item in items:
+                signature = self._signature(item)
+                if self.signatures.get(item) not in (None, signature):
+                    changed.append(item)
+                self.signatures[item] = signature
+            if changed:
+                self.state.mark(changed)
+            time.sleep(self.interval)
+
+
+class WatchDaemon:
+    """
+    Long-running watcher that keeps a dirty set of tracked items and serves it
+    over a Unix socket, so status and sync only re-check what changed.
+    Protocol: one JSON request line, one JSON reply line per connection.
+    """
 
-    # Load configuration
-    config_path = repo_dir / "dotupdate.config.yaml"
-    config = load_yaml_config(config_path)
-    ignore_items = set(config.get('ignore_items', []))
-    ignore_names = set(config.get('ignore_names', []))
+    def __init__(self, dotfiles: 'DotfileSync', socket_path: Path, interval: float = 2.0):
+        self.dotfiles = dotfiles
+        self.socket_path = socket_path
+        self.interval = interval
+        self.state = WatchState(dotfiles.discover_dotfiles())
 
-    if ignore_items or ignore_names:
-        log_info(
-            f"Loaded {len(ignore_items)} path rule(s) and "
-            f"{len(ignore_names)} name rule(s) from config"
-        )
+    def _start_watcher(self) -> str:
+        """Start the inotify backend, or the polling one where that is unavailable"""
+        try:
+            watcher = InotifyWatcher(self.dotfiles, self.state)
+            try:
+                watcher.watch_items(sorted(self.state.items))
+            except OSError:
+                os.close(watcher.fd)
+                raise
+            backend = 'inotify'
+        except (OSError, AttributeError) as e:
+            if not isinstance(e, AttributeError):
+                log_warning(f"inotify unavailable ({e}) - polling every {self.interval:g}s")
+            watcher = PollingWatcher(self.dotfiles, self.state, self.interval)
+            backend = 'polling'
+        threading.Thread(target=watcher.run, name='dotupdate-watch', daemon=True).start()
+        return backend
+
+    def _reply(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        op = request.get('op')
+        if op == 'dirty':
+            reply = self.state.snapshot()
+            reply['rules'] = self.dotfiles.cache.rules_key
+            return reply
+        if op == 'clean':
+            self.state.clean(request.get('items', []), int(request.get('generation', -1)))
+            return {'ok': True}
+        if op == 'ping':
+            return {'ok': True}
+        return {'error': f"unknown op {op!r}"}
+
+    def serve(self):
+        """Run until interrupted"""
+        if WatchClient(self.socket_path).request({'op': 'ping'}):
+            log_error(f"A watcher is already running on {self.socket_path}")
+            return
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        if self.socket_path.exists() or self.socket_path.is_symlink():
+            self.socket_path.unlink()
 
+        import socket
+        backend = self._start_watcher()
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            server.bind(str(self.socket_path))
+            server.listen(8)
+            log_success(f"Watching {len(self.state.items)} item(s) via {backend} on {self.socket_path}")
+            while True:
+                conn, _ = server.accept()
+                with conn, conn.makefile('rwb') as stream:
+                    try:
+                        reply = self._reply(json.loads(stream.readline() or b'{}'))
+                    except ValueError as e:
+                        reply = {'error': str(e)}
+                    stream.write(json.dumps(reply).encode() + b'\n')
+                    stream.flush()
+        finally:
+            server.close()
+            if self.socket_path.exists():
+                self.socket_path.unlink()
+
+
+class WatchClient:
+    """Client side of WatchDaemon; every request returns None when no daemon answers"""
+
+    def __init__(self, socket_path: Path, timeout: float = 1.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def request(self, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if not self.socket_path.exists():
+            return None
+        import socket
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+                conn.settimeout(self.timeout)
+                conn.connect(str(self.socket_path))
+                with conn.makefile('rwb') as stream:
+                    stream.write(json.dumps(payload).encode() + b'\n')
+                    stream.flush()
+                    return json.loads(stream.readline())
+        except (OSError, ValueError):
+            return None
+
+
+def positive_int(text: str) -> int:
+    """argparse type for counts that must be at least 1"""
     try:
-        # Step 1: Git sync (pull latest)
-        git = GitSync(repo_dir)
-        if not git.sync():
-            log_warning("Git sync incomplete - continuing anyway")
-
-        # Step 2: Keep .gitignore in sync with ignore list
-        sync_gitignore(repo_dir, ignore_items | ignore_names)
-
-        # Step 3: Dotfile sync
-        dotfiles = DotfileSync(home_dir, repo_dir, ignore_items, ignore_names)
-        dotfiles.sync_all(interactive=args.interactive)
-
-        # Step 3: Commit and push if needed
-        if dotfiles.repo_modified:
-            log(f"\n{'='*50}", Colors.HEADER)
-            log("COMMITTING CHANGES", Colors.HEADER + Colors.BOLD)
-            log(f"{'='*50}\n", Colors.HEADER)
-            git.commit_changes()
-        else:
-            log_info("\nNo repository changes to commit")
+        value = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: '{text}'")
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return value
+
+
+def _add_options(parser: argparse.ArgumentParser, groups: tuple, suppress: bool = False):
+    """
+    Add option groups ('common', 'sync', 'watch') to a parser. Subcommands get
+    the same options with suppressed defaults, so a value given before the
+    command is not reset by the subcommand's parser.
+    """
+    def default(value):
+        return argparse.SUPPRESS if suppress else value
+
+    if 'common' in groups:
+        parser.add_argument("-j", "--jobs", type=positive_int, metavar="N", default=default(None),
+                            help="Worker threads used to compare trees (default: config, else 4; 1 = serial)")
+        parser.add_argument("--copy-backend", choices=COPY_BACKEND_NAMES, default=default(None),
+                            help="How file content is copied (default: config, else auto)")
+        parser.add_argument("--profile", action="store_true", default=default(False),
+                            help="Print per-phase and per-item timing and I/O at the end")
+        parser.add_argument("--trace", metavar="FILE", default=default(None),
+                            help="Write recorded timings to FILE (see --trace-format)")
+        parser.add_argument("--trace-format", choices=("chrome", "json"), default=default("chrome"),
+                            help="Trace file format: Chrome trace events or plain JSON (default: chrome)")
+    if 'sync' in groups:
+        parser.add_argument("-i", "--interactive", action="store_true", default=default(False),
+                            help="Prompt before syncing each item (default: sync all)")
+        parser.add_argument("--fsync", action="store_true", default=default(False),
+                            help="Force synced files to disk (batched per item and directory)")
+        parser.add_argument("--fetch-window", type=float, metavar="SECONDS", default=default(0),
+                            help="Skip 'git fetch' if the last fetch is younger than this (default: 0, always fetch)")
+        parser.add_argument("--message-budget", type=float, metavar="SECONDS", default=default(60.0),
+                            help="Longest wait for a claude commit message before the "
+                                 "timestamp fallback (default: 60)")
+    if 'watch' in groups:
+        parser.add_argument("--watch-interval", type=float, metavar="SECONDS", default=default(2.0),
+                            help="Polling interval when inotify is unavailable (default: 2)")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Command-line interface: sync (the default) plus inspection subcommands"""
+    parser = argparse.ArgumentParser(
+        description="Dotfiles synchronization tool",
+        epilog="Without a command, runs 'sync'.")
+    _add_options(parser, ('common', 'sync', 'watch'))
+    parser.add_argument("--watch", action="store_true",
+                        help="Same as the 'watch' command")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+
+    sync = commands.add_parser("sync", help="Sync dotfiles, then commit (default)")
+    _add_options(sync, ('common', 'sync'), suppress=True)
+
+    for name, help_text in (("status", "Show the git status and each item's sync status"),
+                            ("doctor", "Check the environment, repo, config and items")):
+        command = commands.add_parser(name, help=help_text)
+        _add_options(command, ('common',), suppress=True)
+        command.add_argument("--exact", action="store_true",
+                             help="Verify content instead of trusting matching size and mtime")
+        command.add_argument("--json", action="store_true", help="Print JSON instead of text")
+
+    for name, help_text in (("diff", "Show what differs between home and repo"),
+                            ("list", "List tracked dotfiles")):
+        command = commands.add_parser(name, help=help_text)
+        _add_options(command, ('common',), suppress=True)
+        command.add_argument("--json", action="store_true", help="Print JSON instead of text")
+
+    watch = commands.add_parser("watch", help="Run the filesystem watcher that keeps sync state hot")
+    _add_options(watch, ('common', 'watch'), suppress=True)
+    return parser
+
+
+def print_json(data: Any):
+    """Write one JSON document to stdout"""
+    print(json.dumps(data, indent=2, ensure_ascii=False))
+
+
+def _item_statuses(dotfiles: 'DotfileSync', items: List[str], exact: bool) -> List[tuple]:
+    """
+    (item, info) for each item, from one fast_status pass shared by status and
+    doctor, plus linked items gone from the repo that home still links to
+    """
+    statuses = [(item, dotfiles.fast_status(item, exact=exact)) for item in items]
+    return statuses + dotfiles.orphaned_links(items)
+
+
+def cmd_list(dotfiles: 'DotfileSync', args: argparse.Namespace):
+    """List tracked dotfiles"""
+    items = dotfiles.discover_dotfiles()
+    if args.json:
+        print_json(items)
+        return
+    for item in items:
+        print(f'  {item}')
+
+
+def cmd_status(dotfiles: 'DotfileSync', args: argparse.Namespace):
+    """Git status of the repo plus each item's sync status (one git process either way)"""
+    with PROFILER.span('discover'):
+        items = dotfiles.discover_dotfiles()
+    with PROFILER.span('status'):
+        statuses = _item_statuses(dotfiles, items, args.exact)
+    dotfiles.save()
+
+    if args.json:
+        git_changes = subprocess.run(["git", "status", "--porcelain"], cwd=dotfiles.repo_dir,
+                                     capture_output=True, text=True).stdout
+        print_json({
+            'git': git_changes.splitlines(),
+            'items': [{'item': item, 'status': info[0], 'description': info[1], 'action': info[2]}
+                      for item, info in statuses],
+        })
+        return
+    print("=== Git Status ===", flush=True)
+    subprocess.run(["git", "status", "--short"], cwd=dotfiles.repo_dir)
+    print("\n=== Dotfile Diff ===")
+    for item, (status, description, action, color, symbol) in statuses:
+        log(f'{color}{symbol}  {item:30s} {description}')
+
+
+def cmd_diff(dotfiles: 'DotfileSync', args: argparse.Namespace):
+    """Stream unified diffs (repo → home) of everything that differs"""
+    with PROFILER.span('discover'):
+        items = dotfiles.discover_dotfiles()
+
+    if args.json:
+        with PROFILER.span('status'):
+            plans = [dotfiles.plan_item(item) for item in items]
+        dotfiles.save()
+        print_json([{
+            'item': plan.item, 'status': plan.status, 'description': plan.info[1],
+            'changes': [{'path': change.rel_path, 'kind': change.kind,
+                         'direction': change.direction or None} for change in plan.changes],
+        } for plan in plans if plan.status != 'in_sync'])
+        return
+
+    color = sys.stdout.isatty()
+    found = False
+    try:
+        with PROFILER.span('diff'):
+            for kind, text in dotfiles.iter_diff(items):
+                if kind == 'item':
+                    if found:
+                        print()
+                    found = True
+                    text = f'{Colors.BOLD}{text}{Colors.RESET}' if color else text
+                    sys.stdout.flush()
+                elif kind == 'line' and color:
+                    text = colorize_diff_line(text)
+                print(text)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # The pager or head quit early; keep the interpreter from complaining at exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return
+    finally:
+        dotfiles.save()
+    if not found:
+        print('All files in sync.')
+
+
+def cmd_doctor(dotfiles: 'DotfileSync', args: argparse.Namespace, config_error: Optional[str]):
+    """Environment, git, config and item health in one pass"""
+    git = GitSync(dotfiles.repo_dir)
+    porcelain = git._run_git(["status", "--porcelain"], check=False, capture=True) or ''
+    config_path = dotfiles.repo_dir / 'dotupdate.config.yaml'
+    report: Dict[str, Any] = {
+        'environment': {
+            'os': os.uname().sysname,
+            'home': str(dotfiles.home_dir),
+            'repo': str(dotfiles.repo_dir),
+            'python': sys.version.split()[0],
+            'git': git._run_git(["--version"], check=False, capture=True),
+        },
+        'git': {
+            'branch': git._run_git(["symbolic-ref", "--short", "HEAD"], check=False, capture=True),
+            'remote': git._run_git(["remote", "get-url", "origin"], check=False, capture=True) or None,
+            'uncommitted': len(porcelain.splitlines()),
+        },
+        'config': {
+            'path': str(config_path),
+            'exists': config_path.exists(),
+            'error': config_error,
+        },
+    }
+    with PROFILER.span('discover'):
+        items = dotfiles.discover_dotfiles()
+    with PROFILER.span('status'):
+        statuses = _item_statuses(dotfiles, items, args.exact)
+    dotfiles.save()
+    report['dotfiles'] = {
+        'tracked': len(items),
+        'in_sync': sum(1 for _, info in statuses if info[0] == 'in_sync'),
+        'out_of_sync': [item for item, info in statuses if info[0] != 'in_sync'],
+    }
+    # fast_status already answers from readlink for items deployed as links
+    linked = [(item, info) for item, info in statuses
+              if dotfiles._options_for(item).deploy != 'copy']
+    report['links'] = {
+        'deployed': len(linked),
+        'ok': sum(1 for _, info in linked if info[0] == 'in_sync'),
+        'problems': {item: info[1] for item, info in linked if info[0] != 'in_sync'},
+    }
+
+    if args.json:
+        print_json(report)
+        return
+    env, repo, cfg, items_report = (report['environment'], report['git'],
+                                    report['config'], report['dotfiles'])
+    print("=== Environment ===")
+    print(f"  OS:       {env['os']}")
+    print(f"  Home:     {env['home']}")
+    print(f"  Repo:     {env['repo']}")
+    print(f"  Python:   {env['python']}")
+    print(f"  Git:      {env['git']}")
+    print("\n=== Git ===")
+    print(f"  Branch:   {repo['branch']}")
+    print(f"  Remote:   {repo['remote'] or 'none'}")
+    print(f"  Clean:    {repo['uncommitted']} uncommitted change(s)")
+    print("\n=== Config ===")
+    if not cfg['exists']:
+        print("  dotupdate.config.yaml: MISSING")
+    elif cfg['error']:
+        print(f"  dotupdate.config.yaml: INVALID ({cfg['error']})")
+    else:
+        print("  dotupdate.config.yaml: ok")
+    print("\n=== Dotfiles ===")
+    print(f"  Tracked:  {items_report['tracked']}")
+    print(f"  In sync:  {items_report['in_sync']}/{items_report['tracked']}")
+    links = report['links']
+    if links['deployed']:
+        print("\n=== Links ===")
+        print(f"  Linked:   {links['ok']}/{links['deployed']}")
+        for item, problem in links['problems'].items():
+            print(f"  {item}: {problem}")
+
+
+async def sync_pipeline(dotfiles: 'DotfileSync', git: GitSync, args: argparse.Namespace):
+    """
+    The sync command as a graph of asyncio tasks. Each blocking step (git,
+    claude, the disk) runs on a worker thread via asyncio.to_thread and waits
+    only on the tasks it depends on, so wall time follows the longest chain
+    instead of the sum:
+
+        fetch ─── pull ──┬──────────────────────────── push (if ahead) ──┐
+        prepare ─────────┴─ select ─┬─ copy ────┬─ commit ─── push ──────┴─ report
+                                    └─ message ─┘
+
+    Selection stays on the event loop's thread because it may prompt, and
+    prompts need the terminal and Ctrl-C. Returns False if a push failed.
+    """
+    import asyncio
+
+    # Discovery and status need nothing from the remote, the fetch nothing local
+    prepare = asyncio.create_task(asyncio.to_thread(dotfiles.prepare))
+    fetch = asyncio.create_task(asyncio.to_thread(git.fetch, args.fetch_window, quiet=True))
+
+    # Step 1: Git sync (pull latest), once the fetch is in
+    fetched = await fetch
+    with PROFILER.span('git sync'):
+        synced = await asyncio.to_thread(git.sync, args.fetch_window, fetched=fetched)
+    if not synced:
+        log_warning("Git sync incomplete - continuing anyway")
+
+    # Commits that were already ahead go out while the rest runs
+    pushes = []
+    if git.push_pending:
+        git.push_pending = False
+        pushes.append(asyncio.create_task(asyncio.to_thread(git.push)))
+
+    await prepare
+    if git.pulled:
+        dotfiles.invalidate()
+
+    # Step 2: Keep .gitignore in sync with ignore list
+    with PROFILER.span('gitignore'):
+        sync_gitignore(dotfiles.repo_dir, dotfiles.rules)
+
+    # Step 3: Dotfile sync; the commit message is generated while files are copied
+    message = None
+    try:
+        selected = dotfiles.select_items(interactive=args.interactive)
+        if selected:
+            pending = dotfiles.pending_changes(selected)
+            planned = git.plan_message(*pending) if pending is not None else None
+            if planned is not None:
+                message = asyncio.create_task(asyncio.to_thread(git.run_message, planned))
+            await asyncio.to_thread(dotfiles.sync_selected, selected)
+    finally:
+        dotfiles.save()
+
+    # Step 4: Commit, which takes the message if it matches what got staged
+    # (and kills it otherwise), then push behind any push still running
+    if dotfiles.repo_modified:
+        log(f"\n{'='*50}", Colors.HEADER)
+        log("COMMITTING CHANGES", Colors.HEADER + Colors.BOLD)
+        log(f"{'='*50}\n", Colors.HEADER)
+        with PROFILER.span('commit'):
+            await asyncio.to_thread(git.commit_changes)
+    else:
+        log_info("\nNo repository changes to commit")
+        git.discard_pending_messages()
+    if message is not None:
+        await message
+
+    if git.push_pending:
+        git.push_pending = False
+
+        async def push_after(earlier: list):
+            await asyncio.gather(*earlier)
+            return await asyncio.to_thread(git.push)
+
+        pushes.append(asyncio.create_task(push_after(list(pushes))))
+
+    if pushes:
+        log_info("\nWaiting for push...")
+    ok = True
+    for push_ok, lines in await asyncio.gather(*pushes):
+        for line in lines:
+            print(line)
+        ok = ok and push_ok
+    return ok
+
+
+def cmd_sync(dotfiles: 'DotfileSync', args: argparse.Namespace):
+    """Pull, sync every item, keep .gitignore current and commit what changed"""
+    import asyncio
+    try:
+        git = GitSync(dotfiles.repo_dir, message_budget=args.message_budget, defer_push=True)
+        pushed = asyncio.run(sync_pipeline(dotfiles, git, args))
 
         # Summary
         log(f"\n{'#'*50}", Colors.GREEN + Colors.BOLD)
-        log("✓ DOTFILES UPDATE COMPLETE", Colors.GREEN + Colors.BOLD)
+        log("✓ DOTFILES UPDATE COMPLETE" + ("" if pushed else " (push failed)"),
+            Colors.GREEN + Colors.BOLD)
         log(f"{'#'*50}\n", Colors.GREEN + Colors.BOLD)
 
     except KeyboardInterrupt:
@@ -765,5 +4340,79 @@ def main():
         sys.exit(1)
 
 
+def cmd_watch(dotfiles: 'DotfileSync', args: argparse.Namespace):
+    """Serve the watch daemon until interrupted"""
+    try:
+        WatchDaemon(dotfiles, state_dir(dotfiles.repo_dir) / 'watch.sock', args.watch_interval).serve()
+    except KeyboardInterrupt:
+        log_info("\nWatcher stopped")
+
+
+def main(argv: Optional[List[str]] = None):
+    """Main entry point"""
+    args = build_parser().parse_args(argv)
+    command = args.command or ('watch' if args.watch else 'sync')
+
+    if args.profile or args.trace:
+        PROFILER.enable()
+
+    # Determine directories
+    home_dir = Path.home()
+    repo_dir = Path(__file__).parent.resolve()
+
+    if command == 'sync':
+        log(f"\n{'#'*50}", Colors.HEADER + Colors.BOLD)
+        log("DOTFILES UPDATE UTILITY", Colors.HEADER + Colors.BOLD)
+        log(f"{'#'*50}\n", Colors.HEADER + Colors.BOLD)
+        log_info(f"Home: {home_dir}")
+        log_info(f"Repo: {repo_dir}")
+
+    # Verify repo is a git repository
+    if not (repo_dir / ".git").exists():
+        log_error(f"{repo_dir} is not a git repository")
+        sys.exit(1)
+
+    # Load configuration; doctor reports a broken config instead of stopping
+    config_path = repo_dir / "dotupdate.config.yaml"
+    config_error = None
+    try:
+        config = load_config(config_path)
+    except ConfigError as e:
+        if command != 'doctor':
+            log_error(f"Invalid config: {e}")
+            sys.exit(1)
+        config, config_error = Config(), str(e)
+
+    if command == 'sync' and (config.ignore_items or config.ignore_names or config.items):
+        log_info(
+            f"Loaded {len(config.ignore_items)} path rule(s), "
+            f"{len(config.ignore_names)} name rule(s) and "
+            f"{len(config.items)} item setting(s) from {len(config.sources)} config file(s)"
+        )
+
+    dotfiles = DotfileSync.from_config(home_dir, repo_dir, config, jobs=args.jobs,
+                                       copy_backend=args.copy_backend,
+                                       fsync=getattr(args, 'fsync', False))
+    try:
+        if command == 'doctor':
+            cmd_doctor(dotfiles, args, config_error)
+        else:
+            {'sync': cmd_sync, 'status': cmd_status, 'diff': cmd_diff,
+             'list': cmd_list, 'watch': cmd_watch}[command](dotfiles, args)
+    finally:
+        report_profile(args)
+
+
+def report_profile(args: argparse.Namespace):
+    """Print and/or write what the profiler recorded, if it was enabled"""
+    if not PROFILER.enabled:
+        return
+    if args.profile:
+        PROFILER.print_summary()
+    if args.trace:
+        PROFILER.write_trace(Path(args.trace), args.trace_format)
+        log_info(f"Trace written to {args.trace} ({args.trace_format})")
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+dotupdate_bench.py - Benchmarks for the dotupdate.py sync phases
+
+Generates synthetic home/repo trees inside a temp directory (with a local bare
+git remote) and times discovery, status/comparison, copying and git sync,
+reporting wall time, stat/listdir calls, bytes read/written and subprocesses
+as recorded by dotupdate's profiler.
+"""
+
+import os
+import json
+import random
+import shutil
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+from typing import List, Dict, Any, Callable
+
+from dotupdate import (DotfileSync, GitSync, Colors, PROFILER, COPY_BACKEND_NAMES,
+                       captured_output, log, log_info, positive_int, state_dir)
+
+
+def run_git(cwd: Path, *args: str):
+    """Run a git command quietly, failing loudly"""
+    subprocess.run(['git', *args], cwd=cwd, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def generate_trees(root: Path, args: argparse.Namespace) -> List[str]:
+    """
+    Build home/ and repo/ (a git repo with a bare remote) under root.
+    Returns the tracked item paths. Files are spread over args.items
+    directories under .config, up to args.depth levels deep; a fraction of
+    entries are symlinks and a fraction of home files are modified so the
+    two sides diverge.
+    """
+    rng = random.Random(args.seed)
+    home = root / 'home'
+    repo = root / 'repo'
+    items = [f'.config/bench{i}' for i in range(args.items)]
+
+    for index in range(args.files):
+        item = items[index % len(items)]
+        depth = rng.randint(0, args.depth)
+        rel_dir = '/'.join(f'd{rng.randint(0, 3)}' for _ in range(depth))
+        rel_path = f'{item}/{rel_dir}/f{index}.txt' if rel_dir else f'{item}/f{index}.txt'
+        path = repo / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        if index and rng.random() < args.symlink_ratio:
+            os.symlink(f'target{index}', path.with_suffix('.link'))
+            continue
+        path.write_bytes(rng.randbytes(args.size))
+
+    run_git(repo, 'init', '-q')
+    run_git(repo, 'add', '-A')
+    run_git(repo, '-c', 'user.name=bench', '-c', 'user.email=bench@localhost',
+            'commit', '-q', '-m', 'bench')
+    run_git(root, 'clone', '-q', '--bare', str(repo), str(root / 'remote.git'))
+    run_git(repo, 'remote', 'add', 'origin', str(root / 'remote.git'))
+    run_git(repo, 'fetch', '-q', 'origin')
+    branch = subprocess.run(['git', 'symbolic-ref', '--short', 'HEAD'], cwd=repo,
+                            capture_output=True, text=True, check=True).stdout.strip()
+    run_git(repo, 'branch', '-q', f'--set-upstream-to=origin/{branch}')
+
+    shutil.copytree(repo / '.config', home / '.config', symlinks=True)
+
+    # Age everything so the content cache treats it as stable (not racy)
+    past = 1_600_000_000
+    for base in (home, repo / '.config'):
+        for dirpath, dirnames, filenames in os.walk(base):
+            for name in dirnames + filenames:
+                os.utime(os.path.join(dirpath, name), (past, past), follow_symlinks=False)
+    # As git status would, so the index stat data matches the aged repo files
+    run_git(repo, 'update-index', '-q', '--refresh')
+
+    files = sorted(p for p in (home / '.config').rglob('*.txt'))
+    for path in rng.sample(files, int(len(files) * args.divergence)):
+        data = bytearray(path.read_bytes())
+        if rng.random() < 0.5:
+            data += b'diverged'
+        else:
+            data[0] ^= 0xff
+        path.write_bytes(bytes(data))
+    return items
+
+
+def measure(name: str, fn: Callable[[], Any]) -> Dict[str, Any]:
+    """Run one phase under a profiler span and return its wall time and counters"""
+    with captured_output(), PROFILER.span(name, 'bench'):
+        fn()
+    # The enclosing span finishes last, after any per-item spans inside it
+    span = PROFILER.spans[-1]
+    return {'phase': name, 'wall_ms': span['duration'] * 1000, **span['counters']}
+
+
+def run_benchmarks(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """Generate trees and measure each phase; returns one result per phase"""
+    with tempfile.TemporaryDirectory(prefix='dotupdate-bench-') as tmp:
+        root = Path(tmp)
+        log_info(f"Generating {args.files} file(s) across {args.items} item(s) in {root}")
+        items = generate_trees(root, args)
+        home, repo = root / 'home', root / 'repo'
+        manifest = state_dir(repo) / 'manifest.json'
+
+        PROFILER.enable()
+        try:
+            results = []
+            for _ in range(args.repeat):
+                manifest.unlink(missing_ok=True)
+                ds = DotfileSync(home, repo, jobs=args.jobs, copy_backend=args.copy_backend)
+                results.append(measure('discover', ds.discover_dotfiles))
+                results.append(measure('status (cold cache)',
+                                       lambda: [ds.get_sync_info(i) for i in items]))
+                ds.save()
+
+                ds = DotfileSync(home, repo, jobs=args.jobs, copy_backend=args.copy_backend)
+                results.append(measure('status (warm cache)',
+                                       lambda: [ds.get_sync_info(i) for i in items]))
+                results.append(measure('fast status',
+                                       lambda: [ds.fast_status(i) for i in items]))
+
+                dest = root / 'copy'
+                shutil.rmtree(dest, ignore_errors=True)
+                results.append(measure('copy (full)', lambda: [
+                    ds.copy_directory_contents(home / i, dest / i, i) for i in items]))
+                results.append(measure('copy (delta)', lambda: [
+                    ds.copy_directory_contents(home / i, dest / i, i) for i in items]))
+
+                git = GitSync(repo)
+                results.append(measure('git sync', git.sync))
+        finally:
+            PROFILER.disable()
+    return results
+
+
+def aggregate(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Collapse repeated runs per phase into the median wall time (counters from the first run)"""
+    by_phase: Dict[str, List[Dict[str, Any]]] = {}
+    for result in results:
+        by_phase.setdefault(result['phase'], []).append(result)
+    summary = []
+    for phase, runs in by_phase.items():
+        walls = sorted(run['wall_ms'] for run in runs)
+        row = dict(runs[0])
+        row['wall_ms'] = walls[len(walls) // 2]
+        row['runs'] = len(runs)
+        summary.append(row)
+    return summary
+
+
+def print_table(rows: List[Dict[str, Any]]):
+    """Print results as an aligned table"""
+    log(f"\n{'phase':22s} {'wall ms':>10s} {'stats':>9s} {'listdirs':>9s} "
+        f"{'bytes read':>13s} {'bytes written':>13s} {'procs':>6s}", Colors.BOLD)
+    for row in rows:
+        log(f"{row['phase']:22s} {row['wall_ms']:10.1f} {row['stat']:9,d} "
+            f"{row['listdir']:9,d} {row['read']:13,d} "
+            f"{row['written']:13,d} {row['spawned']:6,d}")
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description="Benchmark dotupdate.py sync phases")
+    parser.add_argument("--files", type=int, default=2000, help="Files to generate (default: 2000)")
+    parser.add_argument("--size", type=int, default=2048, help="Bytes per file (default: 2048)")
+    parser.add_argument("--depth", type=int, default=3, help="Maximum directory depth (default: 3)")
+    parser.add_argument("--items", type=int, default=4, help="Tracked items to spread files over (default: 4)")
+    parser.add_argument("--symlink-ratio", type=float, default=0.05,
+                        help="Fraction of entries that are symlinks (default: 0.05)")
+    parser.add_argument("--divergence", type=float, default=0.05,
+                        help="Fraction of home files that differ from the repo (default: 0.05)")
+    parser.add_argument("-j", "--jobs", type=positive_int, default=4, help="Worker threads (default: 4)")
+    parser.add_argument("--copy-backend", choices=COPY_BACKEND_NAMES, default="auto",
+                        help="Copy backend for the copy phases (default: auto)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per phase; median is reported (default: 3)")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for tree generation")
+    parser.add_argument("--json", metavar="FILE", help="Also write results as JSON")
+    args = parser.parse_args()
+
+    if args.items < 1 or args.files < 1:
+        parser.error("--items and --files must be at least 1")
+
+    rows = aggregate(run_benchmarks(args))
+    print_table(rows)
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({'args': vars(args), 'results': rows}, indent=2))
+        log_info(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
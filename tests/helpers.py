@@ -0,0 +1,41 @@
+"""Fixtures shared by the test modules"""
+
+import shutil
+import tempfile
+import unittest
+import subprocess
+from pathlib import Path
+
+from dotupdate import DotfileSync
+
+ITEM = '.config/app'
+
+
+class SyncedItemTestCase(unittest.TestCase):
+    """
+    A home directory and a git repo that both hold ITEM with the same a.conf
+    and b.conf, recorded as synced so three-way comparisons have a base.
+    """
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp(prefix='dotupdate-test-'))
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.home = self.tmp / 'home'
+        self.repo = self.tmp / 'repo'
+        self.repo.mkdir()
+        subprocess.run(['git', 'init', '-q'], cwd=self.repo, check=True)
+        for root in (self.home, self.repo):
+            self.write(root, 'a.conf', 'a = 1\n')
+            self.write(root, 'b.conf', 'b = 1\n')
+        self.dotfiles = DotfileSync(self.home, self.repo)
+        self.dotfiles.record_synced([ITEM])
+
+    @staticmethod
+    def write(root: Path, name: str, text: str):
+        path = root / ITEM / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+
+    @staticmethod
+    def read(root: Path, name: str) -> str:
+        return (root / ITEM / name).read_text()
@@ -0,0 +1,84 @@
+"""Tests for config loading"""
+
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import dotupdate
+from dotupdate import DotfileSync, ItemOptions, build_parser, load_config
+
+
+class IncludeTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp(prefix='dotupdate-test-'))
+        self.addCleanup(shutil.rmtree, self.tmp)
+        dotupdate._config_memo.clear()
+        self.addCleanup(dotupdate._config_memo.clear)
+
+    def load(self, text: str):
+        path = self.tmp / 'dotupdate.config.yaml'
+        path.write_text(text)
+        with mock.patch.object(dotupdate, '_config_host', return_value='laptop'):
+            return load_config(path)
+
+    def test_host_is_substituted(self):
+        (self.tmp / 'hosts').mkdir()
+        (self.tmp / 'hosts' / 'laptop.yaml').write_text('ignore_names:\n  - .DS_Store\n')
+        config = self.load('include:\n  - hosts/{host}.yaml\n')
+        self.assertEqual(config.ignore_names, ['.DS_Store'])
+
+    def test_other_braces_are_literal(self):
+        (self.tmp / '{user}.yaml').write_text('ignore_items:\n  - .cache\n')
+        config = self.load('include:\n  - "{user}.yaml"\n  - "{}.yaml"\n  - "{.yaml"\n  - "x}{0}.yaml"\n')
+        self.assertEqual(config.ignore_items, ['.cache'])
+
+
+class CompiledRulesTest(unittest.TestCase):
+    def test_rules_are_shared(self):
+        tmp = Path(tempfile.mkdtemp(prefix='dotupdate-test-'))
+        self.addCleanup(shutil.rmtree, tmp)
+        config = dotupdate.Config()
+        config.ignore_names = ['*.swp']
+        first = DotfileSync.from_config(tmp / 'home', tmp / 'repo', config)
+        second = DotfileSync.from_config(tmp / 'home', tmp / 'repo', config)
+        self.assertIs(first.rules, second.rules)
+        self.assertTrue(first.rules.match('.config/nvim/.init.lua.swp'))
+
+
+class JobsTest(unittest.TestCase):
+    def test_item_jobs_size_their_own_pool(self):
+        tmp = Path(tempfile.mkdtemp(prefix='dotupdate-test-'))
+        self.addCleanup(shutil.rmtree, tmp)
+        for root in (tmp / 'home', tmp / 'repo'):
+            for name in ('a', 'b'):
+                (root / '.config/app' / name).mkdir(parents=True)
+                (root / '.config/app' / name / 'x.conf').write_text(f'{root.name}\n')
+        dotfiles = DotfileSync(tmp / 'home', tmp / 'repo', jobs=1,
+                               item_options={'.config/app': ItemOptions(jobs=3)})
+        diffs = dotfiles._differences(tmp / 'home/.config/app', tmp / 'repo/.config/app', '.config/app')
+        self.assertEqual([diff.rel_path for diff in diffs],
+                         ['.config/app/a/x.conf', '.config/app/b/x.conf'])
+        self.assertEqual(list(dotfiles._executors), [3])
+        self.assertEqual(dotfiles._executors[3]._max_workers, 3)
+
+    def test_pool_is_created_once_across_threads(self):
+        from concurrent.futures import ThreadPoolExecutor
+        dotfiles = DotfileSync(Path('/nonexistent/home'), Path('/nonexistent/repo'), jobs=4)
+        with ThreadPoolExecutor(max_workers=8) as callers:
+            pools = set(callers.map(lambda _: id(dotfiles._get_executor(4)), range(64)))
+        self.assertEqual(len(pools), 1)
+        self.assertEqual(list(dotfiles._executors), [4])
+
+    def test_jobs_must_be_positive(self):
+        parser = build_parser()
+        self.assertEqual(parser.parse_args(['-j', '2', 'status']).jobs, 2)
+        for value in ('0', '-1', 'many'):
+            with self.subTest(value=value), mock.patch('sys.stderr'):
+                with self.assertRaises(SystemExit):
+                    parser.parse_args(['-j', value, 'status'])
+
+
+if __name__ == '__main__':
+    unittest.main()
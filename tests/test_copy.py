@@ -0,0 +1,78 @@
+"""Tests for the copy backends"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import dotupdate
+from dotupdate import DotfileSync, copy_data, ShortCopyError
+
+
+def short_copy(limit: int):
+    """A copy_file_range/sendfile stand-in that stops for good after limit bytes"""
+    copied = 0
+
+    def copy_file_range(src_fd, dest_fd, count, *args):
+        nonlocal copied
+        data = os.read(src_fd, min(count, limit - copied))
+        os.write(dest_fd, data)
+        copied += len(data)
+        return len(data)
+
+    def sendfile(dest_fd, src_fd, offset, count):
+        return copy_file_range(src_fd, dest_fd, count)
+
+    return copy_file_range, sendfile
+
+
+class ShortCopyTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp(prefix='dotupdate-test-'))
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.src = self.tmp / 'src'
+        self.src.write_bytes(os.urandom(64 * 1024))
+        self.dest = self.tmp / 'dest'
+        self.dest.write_bytes(b'old contents')
+        unsupported = set(dotupdate._unsupported_copies)
+        self.addCleanup(lambda: dotupdate._unsupported_copies.__init__(unsupported))
+
+    def test_short_copy_falls_back(self):
+        copy_file_range, sendfile = short_copy(1000)
+        # The fakes replace os functions, so keep the shutil fallback off them
+        with mock.patch.object(dotupdate.os, 'copy_file_range', copy_file_range, create=True), \
+                mock.patch.object(dotupdate.os, 'sendfile', sendfile, create=True), \
+                mock.patch.object(shutil, '_USE_CP_SENDFILE', False, create=True), \
+                mock.patch.object(shutil, '_USE_CP_COPY_FILE_RANGE', False, create=True):
+            for backend in ('copy_file_range', 'sendfile'):
+                if backend not in dotupdate.COPY_BACKENDS:
+                    continue
+                with self.subTest(backend=backend):
+                    self.assertEqual(copy_data(self.src, self.dest, backend), 'copy2')
+                    self.assertEqual(self.dest.read_bytes(), self.src.read_bytes())
+
+    def test_short_copy_raises(self):
+        copy_file_range, sendfile = short_copy(1000)
+        size = self.src.stat().st_size
+        with mock.patch.object(dotupdate.os, 'copy_file_range', copy_file_range, create=True), \
+                open(self.src, 'rb') as fsrc, open(self.dest, 'wb') as fdest:
+            with self.assertRaises(ShortCopyError):
+                dotupdate._copy_file_range(fsrc.fileno(), fdest.fileno(), size)
+
+
+class CopyFileTest(unittest.TestCase):
+    def test_destination_symlink_is_written_through(self):
+        tmp = Path(tempfile.mkdtemp(prefix='dotupdate-test-'))
+        self.addCleanup(shutil.rmtree, tmp)
+        (tmp / 'src').write_text('new\n')
+        (tmp / 'target').write_text('old\n')
+        os.symlink('target', tmp / 'dest')
+        DotfileSync(tmp, tmp).copy_file(tmp / 'src', tmp / 'dest')
+        self.assertEqual(os.readlink(tmp / 'dest'), 'target')
+        self.assertEqual((tmp / 'target').read_text(), 'new\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
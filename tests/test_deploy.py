@@ -0,0 +1,114 @@
+"""Tests for link and farm deployment"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import dotupdate
+from dotupdate import DotfileSync, ItemOptions
+from tests.helpers import ITEM, SyncedItemTestCase
+
+
+class DeployTest(SyncedItemTestCase):
+    """ITEM starts out synced as plain copies, then switches to links"""
+
+    def deploy(self, mode: str) -> DotfileSync:
+        dotfiles = DotfileSync(self.home, self.repo,
+                               item_options={ITEM: ItemOptions(deploy=mode)})
+        dotfiles.sync_item(ITEM, verbose=False)
+        return dotfiles
+
+    def test_link_replaces_matching_copy(self):
+        dotfiles = self.deploy('link')
+        self.assertEqual(os.readlink(self.home / ITEM), str(self.repo / ITEM))
+        self.assertEqual(dotfiles.link_status(ITEM)[0], 'in_sync')
+        self.assertEqual(sorted(os.listdir(self.home / '.config')), ['app'])
+
+    def test_link_adopts_home_edit(self):
+        self.write(self.home, 'a.conf', 'a = home\n')
+        self.deploy('link')
+        self.assertTrue(os.path.islink(self.home / ITEM))
+        self.assertEqual(self.read(self.repo, 'a.conf'), 'a = home\n')
+
+    def test_link_adoption_keeps_conflicting_copy(self):
+        self.write(self.home, 'a.conf', 'a = home\n')
+        self.write(self.repo, 'a.conf', 'a = repository\n')
+        dotfiles = self.deploy('link')
+        self.assertFalse(os.path.islink(self.home / ITEM))
+        self.assertEqual(self.read(self.home, 'a.conf'), 'a = home\n')
+        self.assertEqual(self.read(self.repo, 'a.conf'), 'a = repository\n')
+        self.assertEqual(dotfiles.link_status(ITEM)[0], 'needs_adopt')
+
+    def test_link_with_home_missing_deletes_nothing(self):
+        shutil.rmtree(self.home / ITEM)
+        self.deploy('link')
+        self.assertTrue(os.path.islink(self.home / ITEM))
+        self.assertEqual(self.read(self.repo, 'a.conf'), 'a = 1\n')
+        self.assertEqual(self.read(self.repo, 'b.conf'), 'b = 1\n')
+
+    def test_farm_takes_repo_update(self):
+        self.write(self.repo, 'a.conf', 'a = from another machine\n')
+        self.deploy('farm')
+        self.assertEqual(self.read(self.repo, 'a.conf'), 'a = from another machine\n')
+        self.assertEqual(os.readlink(self.home / ITEM / 'a.conf'), str(self.repo / ITEM / 'a.conf'))
+
+    def test_farm_keeps_conflicting_copy(self):
+        self.write(self.home, 'a.conf', 'a = home\n')
+        self.write(self.repo, 'a.conf', 'a = repository\n')
+        self.deploy('farm')
+        self.assertFalse(os.path.islink(self.home / ITEM / 'a.conf'))
+        self.assertEqual(self.read(self.home, 'a.conf'), 'a = home\n')
+        self.assertEqual(self.read(self.repo, 'a.conf'), 'a = repository\n')
+        self.assertTrue(os.path.islink(self.home / ITEM / 'b.conf'))
+
+    def test_farm_links_missing_files_and_leaves_home_only_files(self):
+        (self.home / ITEM / 'a.conf').unlink()
+        self.write(self.home, 'local.conf', 'local\n')
+        self.deploy('farm')
+        self.assertEqual(self.read(self.repo, 'a.conf'), 'a = 1\n')
+        self.assertTrue(os.path.islink(self.home / ITEM / 'a.conf'))
+        self.assertFalse((self.repo / ITEM / 'local.conf').exists())
+        self.assertFalse(os.path.islink(self.home / ITEM / 'local.conf'))
+
+    def test_broken_and_foreign_links_are_left_alone(self):
+        dotfiles = self.deploy('farm')
+        os.unlink(self.home / ITEM / 'b.conf')
+        os.symlink('/elsewhere', self.home / ITEM / 'b.conf')
+        self.assertEqual(dotfiles.link_status(ITEM)[0], 'foreign_link')
+        (self.repo / ITEM / 'a.conf').unlink()
+        self.assertEqual(dotfiles.link_status(ITEM)[0], 'broken_link')
+        dotfiles.deploy_item(ITEM, verbose=False)
+        self.assertEqual(os.readlink(self.home / ITEM / 'b.conf'), '/elsewhere')
+        self.assertEqual(os.readlink(self.home / ITEM / 'a.conf'), str(self.repo / ITEM / 'a.conf'))
+
+
+class ReplaceWithLinkTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp(prefix='dotupdate-test-'))
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.home = self.tmp / 'home' / 'app'
+        self.repo = self.tmp / 'repo' / 'app'
+        for root in (self.home, self.repo):
+            (root / 'sub').mkdir(parents=True)
+            (root / 'sub' / 'x').write_text('x\n')
+
+    def test_directory_is_replaced(self):
+        DotfileSync._replace_with_link(self.home, self.repo)
+        self.assertEqual(os.readlink(self.home), str(self.repo))
+        self.assertEqual(os.listdir(self.home.parent), ['app'])
+        self.assertEqual((self.repo / 'sub' / 'x').read_text(), 'x\n')
+
+    def test_failed_swap_restores_directory(self):
+        with mock.patch.object(dotupdate.os, 'replace', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                DotfileSync._replace_with_link(self.home, self.repo)
+        self.assertFalse(os.path.islink(self.home))
+        self.assertEqual((self.home / 'sub' / 'x').read_text(), 'x\n')
+        self.assertEqual(os.listdir(self.home.parent), ['app'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+"""Tests for reading git's index and locating the git directory"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import subprocess
+from pathlib import Path
+
+from dotupdate import DotfileSync, GitIndex, git_dir, hash_file, state_dir
+
+
+def git(cwd: Path, *args: str) -> str:
+    return subprocess.run(['git', *args], cwd=cwd, check=True,
+                          capture_output=True, text=True).stdout
+
+
+class GitIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp(prefix='dotupdate-test-'))
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.repo = self.tmp / 'repo'
+        self.repo.mkdir()
+        git(self.repo, 'init', '-q')
+        # Shared prefixes exercise version 4's path compression, long names the padding
+        paths = ['.zshrc', '.config/nvim/init.lua', '.config/nvim/lua/plugins/alpha.lua',
+                 '.config/nvim/lua/plugins/alphabet.lua', '.config/nvim/lua/plugins/beta.lua',
+                 '.config/nvim/lua/zeta.lua', '.config/tmux/tmux.conf',
+                 '.config/' + 'long-name-' * 20 + '.conf', 'caf\u00e9.txt', 'skipped', 'intended']
+        for index, rel_path in enumerate(paths):
+            path = self.repo / rel_path
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(f'{rel_path} {index}\n' * index)
+            # Entries as new as the index itself are racy and skipped
+            os.utime(path, (path.stat().st_mtime - 60,) * 2)
+        os.symlink('.zshrc', self.repo / '.zshrc.link')
+        git(self.repo, 'add', '--', *paths[:-1], '.zshrc.link')
+
+    def expected(self) -> dict:
+        """Blob ids of clean regular files, as git lists them"""
+        entries = {}
+        for line in git(self.repo, '-c', 'core.quotePath=false', 'ls-files', '-s', '-t').splitlines():
+            meta, rel_path = line.split('\t', 1)
+            tag, mode, blob, stage = meta.split()
+            if tag == 'H' and mode in ('100644', '100755') and stage == '0' and rel_path != 'intended':
+                entries[rel_path] = blob
+        return entries
+
+    def test_versions(self):
+        for version, count in ((2, 10), (3, 9), (4, 9)):
+            with self.subTest(version=version):
+                if version == 3:
+                    # Both need extended flags (so version 3 or later); neither entry is usable
+                    git(self.repo, 'add', '-N', 'intended')
+                    git(self.repo, 'update-index', '--skip-worktree', 'skipped')
+                git(self.repo, 'update-index', '--index-version', str(version))
+                expected = self.expected()
+                self.assertEqual(len(expected), count)
+                self.assertEqual((git_dir(self.repo) / 'index').read_bytes()[4:8],
+                                 version.to_bytes(4, 'big'))
+                entries = GitIndex(self.repo)._read()
+                self.assertEqual({path: entry[3] for path, entry in entries.items()}, expected)
+                for rel_path, (size, mtime_ns, inode, _) in entries.items():
+                    st = (self.repo / rel_path).stat()
+                    self.assertEqual((size, mtime_ns, inode), (st.st_size, st.st_mtime_ns, st.st_ino))
+
+    def test_hash_file_is_the_blob_id(self):
+        # Larger than hash_file's read size, so the digest spans several chunks
+        for name, data in (('empty', b''), ('text', b'a = 1\n'), ('big', os.urandom(3 << 20))):
+            with self.subTest(name=name):
+                path = self.tmp / name
+                path.write_bytes(data)
+                self.assertEqual(hash_file(path), git(self.repo, 'hash-object', str(path)).strip())
+
+
+class WorktreeTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp(prefix='dotupdate-test-'))
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.main = self.tmp / 'main'
+        self.main.mkdir()
+        git(self.main, 'init', '-q')
+        git(self.main, '-c', 'user.name=t', '-c', 'user.email=t@t', 'commit', '-q',
+            '--allow-empty', '-m', 'init')
+        self.worktree = self.tmp / 'worktree'
+        git(self.main, 'worktree', 'add', '-q', str(self.worktree))
+
+    def test_git_dir_follows_gitdir_file(self):
+        expected = (self.main / '.git' / 'worktrees' / 'worktree').resolve()
+        self.assertEqual(git_dir(self.worktree), expected)
+        self.assertEqual(state_dir(self.worktree), expected / 'dotupdate')
+        self.assertEqual(git_dir(self.main), self.main / '.git')
+
+    def test_index_is_read_in_a_worktree(self):
+        path = self.worktree / '.zshrc'
+        path.write_text('export EDITOR=nvim\n')
+        # Entries as new as the index itself are racy and skipped
+        os.utime(path, (path.stat().st_mtime - 60,) * 2)
+        git(self.worktree, 'add', '.zshrc')
+        dotfiles = DotfileSync(self.tmp / 'home', self.worktree)
+        self.assertIsNotNone(dotfiles.cache.index)
+        self.assertIn('.zshrc', dotfiles.cache.index._read())
+
+
+if __name__ == '__main__':
+    unittest.main()
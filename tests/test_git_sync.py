@@ -0,0 +1,87 @@
+"""Tests for GitSync commit message generation"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+import subprocess
+from pathlib import Path
+
+from dotupdate import GitSync, captured_output
+
+# Stand-in for the claude CLI: records its pid, then answers at once unless
+# the digest asks it to be slow
+FAKE_CLAUDE = f"""#!{sys.executable}
+import os, sys, time
+digest = sys.stdin.read()
+name = 'slow' if 'slow' in digest else 'fast'
+with open(os.path.join(os.environ['FAKE_CLAUDE_DIR'], name + '.pid'), 'w') as f:
+    f.write(str(os.getpid()))
+if name == 'slow':
+    time.sleep(60)
+print('Update dotfiles')
+"""
+
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+class CommitMessageTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp(prefix='dotupdate-test-'))
+        self.addCleanup(shutil.rmtree, self.tmp)
+        bin_dir = self.tmp / 'bin'
+        bin_dir.mkdir()
+        claude = bin_dir / 'claude'
+        claude.write_text(FAKE_CLAUDE)
+        claude.chmod(0o755)
+
+        environ = dict(os.environ)
+        self.addCleanup(lambda: (os.environ.clear(), os.environ.update(environ)))
+        os.environ['PATH'] = f"{bin_dir}{os.pathsep}{os.environ['PATH']}"
+        os.environ['FAKE_CLAUDE_DIR'] = str(self.tmp)
+
+        self.repo = self.tmp / 'repo'
+        self.repo.mkdir()
+        subprocess.run(['git', 'init', '-q'], cwd=self.repo, check=True)
+        (self.repo / '.zshrc').write_text('export EDITOR=nvim\n')
+        subprocess.run(['git', 'add', '-A'], cwd=self.repo, check=True)
+
+    def wait_for_pid(self, name: str) -> int:
+        path = self.tmp / f'{name}.pid'
+        for _ in range(500):
+            if path.exists() and path.read_text():
+                return int(path.read_text())
+            time.sleep(0.01)
+        self.fail(f'fake claude never wrote {path.name}')
+
+    def test_mismatched_precompute_is_killed(self):
+        git = GitSync(self.repo, message_budget=30.0)
+        with captured_output():
+            git.precompute_message('not-the-staged-fingerprint', 'slow digest')
+            slow = self.wait_for_pid('slow')
+            message = git.commit_message()
+
+        self.assertEqual(message, 'Update dotfiles')
+        self.assertFalse(pid_alive(slow), 'orphaned claude process still running')
+        self.assertEqual(git._pending_messages, {})
+
+    def test_matching_precompute_is_used(self):
+        git = GitSync(self.repo, message_budget=30.0)
+        with captured_output():
+            git.precompute_message(git.staged_fingerprint(), 'fast digest')
+            message = git.commit_message()
+
+        self.assertEqual(message, 'Update dotfiles')
+        self.assertFalse((self.tmp / 'slow.pid').exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+"""Tests for the gitignore-style ignore rules"""
+
+import unittest
+
+from dotupdate import IgnoreRules
+
+PATHS = [
+    ('.config/nvim', True), ('.config/nvim/init.lua', False), ('.config/nvim/cache', True),
+    ('.config/nvim/cache', False), ('.config/nvim/sub/cache', True), ('cache', True),
+    ('.config/iterm2/sockets', True), ('.config/iterm2/sockets/a', False),
+    ('.config/Battle.net', True), ('.DS_Store', False), ('.config/app/.DS_Store', False),
+    ('debug.log', False), ('.config/app/keep.log', False), ('.config/app/run.log', False),
+    ('__pycache__', True), ('.local/lib/python/__pycache__', True), ('x/.config/nvim/cache', True),
+]
+
+
+def legacy_match(items, names, rel_path: str) -> bool:
+    """The matching done before rules were compiled: exact paths and exact names"""
+    return rel_path in {item.rstrip('/') for item in items} or rel_path.rpartition('/')[2] in names
+
+
+class IgnoreRulesTest(unittest.TestCase):
+    def assertIgnored(self, rules: IgnoreRules, expected: dict):
+        for (rel_path, is_dir), ignored in expected.items():
+            with self.subTest(path=rel_path, is_dir=is_dir):
+                self.assertEqual(rules.match(rel_path, is_dir), ignored)
+
+    def test_literal_rules_match_as_before(self):
+        items = ['.config/iterm2/sockets', '.config/Battle.net/', '.gitignore', 'old']
+        names = ['.DS_Store', 'cache']
+        rules = IgnoreRules(items, names)
+        for rel_path, is_dir in PATHS:
+            if not is_dir and rel_path.rstrip('/') + '/' in items:
+                continue  # dir-only rules no longer hide files of the same name
+            with self.subTest(path=rel_path, is_dir=is_dir):
+                self.assertEqual(rules.match(rel_path, is_dir), legacy_match(items, names, rel_path))
+
+    def test_negation_last_rule_wins(self):
+        self.assertIgnored(IgnoreRules(names=['*.log', '!keep.log']), {
+            ('debug.log', False): True,
+            ('.config/app/run.log', False): True,
+            ('.config/app/keep.log', False): False,
+        })
+        self.assertIgnored(IgnoreRules(names=['!keep.log', '*.log']), {
+            ('.config/app/keep.log', False): True,
+        })
+        # Item rules come first, so a name rule can re-include below an ignored path
+        self.assertIgnored(IgnoreRules(items=['.config/app/*'], names=['!keep.log']), {
+            ('.config/app/run.log', False): True,
+            ('.config/app/keep.log', False): False,
+        })
+
+    def test_dir_only(self):
+        self.assertIgnored(IgnoreRules(names=['cache/']), {
+            ('.config/nvim/cache', True): True,
+            ('.config/nvim/cache', False): False,
+            ('cache', True): True,
+        })
+
+    def test_anchored(self):
+        self.assertIgnored(IgnoreRules(items=['.config/*/cache']), {
+            ('.config/nvim/cache', True): True,
+            ('.config/nvim/cache', False): True,
+            ('.config/nvim/sub/cache', True): False,
+            ('x/.config/nvim/cache', True): False,
+        })
+        # A leading slash anchors a name rule
+        self.assertIgnored(IgnoreRules(names=['/cache']), {
+            ('cache', True): True,
+            ('.config/nvim/cache', True): False,
+        })
+
+    def test_double_star(self):
+        self.assertIgnored(IgnoreRules(names=['**/__pycache__']), {
+            ('__pycache__', True): True,
+            ('.local/lib/python/__pycache__', True): True,
+        })
+        # As in .gitignore, a/**/b also matches a/b
+        self.assertIgnored(IgnoreRules(items=['.config/**/cache']), {
+            ('.config/cache', True): True,
+            ('.config/nvim/cache', True): True,
+            ('.config/nvim/sub/cache', True): True,
+            ('x/.config/nvim/cache', True): False,
+        })
+
+    def test_fast_path_agrees_with_ordered_scan(self):
+        items = ['.config/*/cache', '.config/iterm2/sockets', '.config/Battle.net/', '.config/**/*.log']
+        names = ['.DS_Store', '__pycache__/', 'debug.?og']
+        fast = IgnoreRules(items, names)
+        # An unrelated negation forces the rule-by-rule scan
+        ordered = IgnoreRules(items, names + ['!never-matches'])
+        self.assertFalse(fast.has_negation)
+        self.assertTrue(ordered.has_negation)
+        for rel_path, is_dir in PATHS:
+            with self.subTest(path=rel_path, is_dir=is_dir):
+                self.assertEqual(fast.match(rel_path, is_dir), ordered.match(rel_path, is_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
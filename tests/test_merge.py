@@ -0,0 +1,84 @@
+"""Tests for three-way syncing against the last synced snapshot"""
+
+import shutil
+import unittest
+
+from tests.helpers import ITEM, SyncedItemTestCase
+
+
+class ThreeWayMergeTest(SyncedItemTestCase):
+    def sync(self) -> bool:
+        return self.dotfiles.sync_item(ITEM, verbose=False)
+
+    def test_home_deletion_reaches_repo(self):
+        (self.home / ITEM / 'a.conf').unlink()
+        self.assertTrue(self.sync())
+        self.assertFalse((self.repo / ITEM / 'a.conf').exists())
+        self.assertEqual((self.repo / ITEM / 'b.conf').read_text(), 'b = 1\n')
+
+    def test_repo_deletion_reaches_home(self):
+        (self.repo / ITEM / 'a.conf').unlink()
+        self.assertFalse(self.sync())
+        self.assertFalse((self.home / ITEM / 'a.conf').exists())
+        self.assertEqual((self.home / ITEM / 'b.conf').read_text(), 'b = 1\n')
+
+    def test_edits_on_each_side_are_merged(self):
+        self.write(self.home, 'a.conf', 'a = home\n')
+        self.write(self.repo, 'b.conf', 'b = repo\n')
+        self.assertEqual(self.dotfiles.plan_item(ITEM).status, 'merge')
+        self.sync()
+        for root in (self.home, self.repo):
+            self.assertEqual((root / ITEM / 'a.conf').read_text(), 'a = home\n')
+            self.assertEqual((root / ITEM / 'b.conf').read_text(), 'b = repo\n')
+
+    def test_conflicting_edits_are_left_alone(self):
+        self.write(self.home, 'a.conf', 'a = home\n')
+        self.write(self.repo, 'a.conf', 'a = repository\n')
+        self.assertEqual(self.dotfiles.plan_item(ITEM).status, 'conflict')
+        self.assertFalse(self.sync())
+        self.assertEqual((self.home / ITEM / 'a.conf').read_text(), 'a = home\n')
+        self.assertEqual((self.repo / ITEM / 'a.conf').read_text(), 'a = repository\n')
+
+    def test_deletion_does_not_override_an_edit(self):
+        (self.home / ITEM / 'a.conf').unlink()
+        self.write(self.repo, 'a.conf', 'a = repository\n')
+        self.assertEqual(self.dotfiles.plan_item(ITEM).status, 'conflict')
+        self.sync()
+        self.assertEqual((self.repo / ITEM / 'a.conf').read_text(), 'a = repository\n')
+        self.assertFalse((self.home / ITEM / 'a.conf').exists())
+
+    def test_missing_item_is_copied_back_not_deleted(self):
+        shutil.rmtree(self.home / ITEM)
+        plan = self.dotfiles.plan_item(ITEM)
+        self.assertEqual(plan.action, 'copy_to_home')
+        self.assertEqual(self.dotfiles.fast_status(ITEM), plan.info)
+        self.assertFalse(self.sync())
+        self.assertEqual((self.repo / ITEM / 'a.conf').read_text(), 'a = 1\n')
+        self.assertEqual((self.home / ITEM / 'a.conf').read_text(), 'a = 1\n')
+
+    def test_item_missing_from_repo_is_added_back(self):
+        shutil.rmtree(self.repo / ITEM)
+        self.assertEqual(self.dotfiles.plan_item(ITEM).action, 'add_to_repo')
+        self.assertTrue(self.sync())
+        self.assertEqual((self.home / ITEM / 'b.conf').read_text(), 'b = 1\n')
+        self.assertEqual((self.repo / ITEM / 'b.conf').read_text(), 'b = 1\n')
+
+    def test_directory_deletion_needs_confirmation(self):
+        for root in (self.home, self.repo):
+            self.write(root, 'sub/c.conf', 'c = 1\n')
+        self.dotfiles.record_synced([ITEM])
+        shutil.rmtree(self.home / ITEM / 'sub')
+
+        plan = self.dotfiles.plan_item(ITEM)
+        self.assertEqual([change.rel_path for change in self.dotfiles.directory_deletions(plan)],
+                         [f'{ITEM}/sub'])
+        self.assertFalse(self.sync())
+        self.assertEqual((self.repo / ITEM / 'sub' / 'c.conf').read_text(), 'c = 1\n')
+
+        self.dotfiles.confirmed_deletions.add(f'{ITEM}/sub')
+        self.assertTrue(self.sync())
+        self.assertFalse((self.repo / ITEM / 'sub').exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
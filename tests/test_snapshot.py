@@ -0,0 +1,95 @@
+"""Tests for the binary tree snapshots used as the three-way merge base"""
+
+import os
+import unittest
+
+from dotupdate import FileDiff, TreeSnapshot
+from tests.helpers import ITEM, SyncedItemTestCase
+
+
+def digest(text: str) -> bytes:
+    return text.encode().ljust(TreeSnapshot.DIGEST_SIZE, b'.')
+
+
+class TreeSnapshotTest(unittest.TestCase):
+    def snapshot(self) -> TreeSnapshot:
+        snapshot = TreeSnapshot('rules-key')
+        snapshot.add('.config/app/a.b', 'file', 3, 10, 0o100644, digest('ab'))
+        snapshot.add('.config/app/a/b', 'file', 2 ** 40, 1_700_000_000_123_456_789, 0o100755,
+                     digest('b'))
+        snapshot.add('.config/app', 'dir', mode=0o40755)
+        snapshot.add('.config/app/a', 'dir', mode=0o40700)
+        snapshot.add('.config/app/link', 'link', digest=TreeSnapshot.link_digest('a/b'))
+        snapshot.add('.config/app/caf\udce9', 'file', 1, 20, 0o100600, digest('latin-1 name'))
+        return snapshot.finish()
+
+    def test_finish_sorts_by_path_component(self):
+        self.assertEqual(self.snapshot().paths, [
+            '.config/app', '.config/app/a', '.config/app/a/b', '.config/app/a.b',
+            '.config/app/caf\udce9', '.config/app/link',
+        ])
+
+    def test_round_trip(self):
+        snapshot = self.snapshot()
+        loaded = TreeSnapshot.from_bytes(snapshot.to_bytes())
+        self.assertEqual(loaded.rules_key, 'rules-key')
+        for field in ('paths', 'kinds', 'sizes', 'mtimes', 'modes', 'digests'):
+            with self.subTest(field=field):
+                self.assertEqual(getattr(loaded, field), getattr(snapshot, field))
+        self.assertEqual(loaded.diff(snapshot), [])
+
+        empty = TreeSnapshot.from_bytes(TreeSnapshot().to_bytes())
+        self.assertEqual(len(empty), 0)
+
+    def test_malformed_data_is_rejected(self):
+        data = self.snapshot().to_bytes()
+        for bad in (b'', data[:10], data[:-1], b'X' + data[1:]):
+            with self.subTest(size=len(bad)):
+                with self.assertRaises(ValueError):
+                    TreeSnapshot.from_bytes(bad)
+
+    def test_subtree(self):
+        sub = self.snapshot().subtree('.config/app/a')
+        self.assertEqual(sub.paths, ['.config/app/a', '.config/app/a/b'])
+        self.assertEqual(sub.digest(1), digest('b'))
+        self.assertEqual(len(self.snapshot().subtree('.config/app/missing')), 0)
+
+    def test_diff(self):
+        first = self.snapshot()
+        second = TreeSnapshot('rules-key')
+        second.add('.config/app', 'dir')
+        second.add('.config/app/a', 'file', 3, 10, 0o100644, digest('a is a file now'))
+        second.add('.config/app/a.b', 'file', 3, 99, 0o100644, digest('ab'))
+        second.add('.config/app/link', 'link', digest=TreeSnapshot.link_digest('elsewhere'))
+        second.add('.config/app/new', 'dir')
+        second.add('.config/app/new/c', 'file', 1, 10, 0o100644, digest('c'))
+        second.finish()
+        self.assertEqual(first.diff(second), [
+            FileDiff('.config/app/a', 'differs'),
+            FileDiff('.config/app/caf\udce9', 'first_only'),
+            FileDiff('.config/app/link', 'differs'),
+            FileDiff('.config/app/new', 'second_only'),
+        ])
+
+
+class SnapshotOfTreeTest(SyncedItemTestCase):
+    def test_diff_matches_live_comparison(self):
+        self.write(self.home, 'a.conf', 'a = home\n')
+        self.write(self.home, 'only/home.conf', 'home\n')
+        self.write(self.repo, 'sub/repo.conf', 'repo\n')
+        self.write(self.home, 'kind', 'a file at home\n')
+        self.write(self.repo, 'kind/x', 'a directory in the repo\n')
+        os.symlink('a.conf', self.home / ITEM / 'link')
+        os.symlink('b.conf', self.repo / ITEM / 'link')
+
+        home = self.dotfiles.take_snapshot(ITEM, 'home')
+        repo = self.dotfiles.take_snapshot(ITEM, 'repo')
+        live = self.dotfiles._differences(self.home / ITEM, self.repo / ITEM, ITEM)
+        self.assertEqual(home.diff(repo), live)
+        self.assertEqual([change.rel_path for change in live], [
+            f'{ITEM}/a.conf', f'{ITEM}/kind', f'{ITEM}/link', f'{ITEM}/only', f'{ITEM}/sub',
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
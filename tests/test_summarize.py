@@ -0,0 +1,52 @@
+"""Tests for the commit message diff digest"""
+
+import unittest
+from typing import List
+
+from dotupdate import summarize_diff
+
+
+def file_diff(path: str, hunks: int = 1, lines: int = 3) -> List[str]:
+    diff = [f'diff --git a/{path} b/{path}', 'index 1111111..2222222 100644',
+            f'--- a/{path}', f'+++ b/{path}']
+    for hunk in range(hunks):
+        diff.append(f'@@ -{hunk * 10 + 1},{lines} +{hunk * 10 + 1},{lines} @@')
+        for line in range(lines):
+            diff += [f'-old value {line} of {path}', f'+new value {line} of {path}']
+    return diff
+
+
+def binary_diff(path: str) -> List[str]:
+    return [f'diff --git a/{path} b/{path}', f'Binary files a/{path} and b/{path} differ']
+
+
+class SummarizeDiffTest(unittest.TestCase):
+    def test_small_diff_is_complete(self):
+        digest = summarize_diff(file_diff('.zshrc'))
+        self.assertIn('M .zshrc (+3 -3)', digest)
+        self.assertIn('+new value 2 of .zshrc', digest)
+        self.assertNotIn('more', digest)
+
+    def test_many_files_stay_within_budget(self):
+        lines = []
+        for index in range(400):
+            directory = f'.config/app{index % 40}/nested/deeper'
+            lines += file_diff(f'{directory}/settings-{index}.conf', hunks=1 + index % 4)
+            if index % 10 == 0:
+                lines += binary_diff(f'{directory}/icon-{index}.png')
+        for budget in (12000, 4000, 1500):
+            with self.subTest(budget=budget):
+                digest = summarize_diff(lines, budget=budget)
+                self.assertLessEqual(len(digest), budget)
+                self.assertRegex(digest.splitlines()[-1], r'^\.\.\. \d+ more file\(s\)')
+
+    def test_long_notes_stay_within_budget(self):
+        lines = []
+        for index in range(300):
+            lines += binary_diff(f'.local/share/{"x" * 400}/asset-{index}.bin')
+        digest = summarize_diff(lines, budget=3000)
+        self.assertLessEqual(len(digest), 3000)
+
+
+if __name__ == '__main__':
+    unittest.main()
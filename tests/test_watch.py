@@ -0,0 +1,80 @@
+"""Tests for the watch daemon's dirty-item bookkeeping"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import subprocess
+from pathlib import Path
+
+from dotupdate import DotfileSync, InotifyWatcher, WatchState
+
+ITEM = '.config/app'
+
+
+class WatchStateTest(unittest.TestCase):
+    def test_unwatched_items_stay_dirty(self):
+        state = WatchState([ITEM, '.zshrc'])
+        state.set_unwatched({ITEM})
+        state.clean([ITEM, '.zshrc'], state.generation)
+        self.assertEqual(state.dirty, {ITEM})
+        state.set_unwatched(set())
+        state.clean([ITEM], state.generation)
+        self.assertEqual(state.dirty, set())
+
+
+class WatcherTest(unittest.TestCase):
+    def setUp(self):
+        tmp = Path(tempfile.mkdtemp(prefix='dotupdate-test-'))
+        self.addCleanup(shutil.rmtree, tmp)
+        self.home = tmp / 'home'
+        self.repo = tmp / 'repo'
+        (self.repo / ITEM).mkdir(parents=True)
+        self.home.mkdir()
+        subprocess.run(['git', 'init', '-q'], cwd=self.repo, check=True)
+        (self.repo / ITEM / 'a.conf').write_text('a = 1\n')
+        self.dotfiles = DotfileSync(self.home, self.repo)
+
+    def watcher(self, state: WatchState) -> InotifyWatcher:
+        try:
+            watcher = InotifyWatcher(self.dotfiles, state)
+        except (AttributeError, OSError):
+            self.skipTest('inotify is not available')
+        self.addCleanup(os.close, watcher.fd)
+        os.set_blocking(watcher.fd, False)
+        watcher.watch_items([ITEM])
+        return watcher
+
+    @staticmethod
+    def drain(watcher: InotifyWatcher):
+        while True:
+            try:
+                data = os.read(watcher.fd, 64 * 1024)
+            except BlockingIOError:
+                return
+            watcher.process(data)
+
+    def test_item_under_missing_parent_is_watched_once_created(self):
+        state = WatchState([ITEM])
+        watcher = self.watcher(state)
+        state.clean([ITEM], state.generation)
+
+        (self.home / ITEM).mkdir(parents=True)
+        self.drain(watcher)
+        self.assertIn(ITEM, state.dirty)
+        state.clean([ITEM], state.generation)
+
+        (self.home / ITEM / 'a.conf').write_text('a = home\n')
+        self.drain(watcher)
+        self.assertIn(ITEM, state.dirty)
+
+    def test_only_content_verified_status_is_reported(self):
+        shutil.copytree(self.repo / '.config', self.home / '.config')
+        self.assertEqual(self.dotfiles.fast_status(ITEM)[0], 'in_sync')
+        self.assertEqual(self.dotfiles._confirmed_clean, set())
+        self.assertEqual(self.dotfiles.plan_item(ITEM).status, 'in_sync')
+        self.assertEqual(self.dotfiles._confirmed_clean, {ITEM})
+
+
+if __name__ == '__main__':
+    unittest.main()